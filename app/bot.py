@@ -4,6 +4,8 @@ from aiogram.enums import ParseMode
 from app.config import settings
 from app.handlers import register_all_handlers
 from app.middlewares import register_all_middlewares
+from app.middlewares.api_throttle_middleware import api_throttle_middleware
+from app.states.storage import create_storage
 
 def create_bot():
     """Bot va Dispatcher yaratish"""
@@ -12,7 +14,10 @@ def create_bot():
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
     
-    dp = Dispatcher()
+    # Barcha chiquvchi so'rovlar Telegram limitlari bo'yicha
+    bot.session.middleware(api_throttle_middleware)
+    
+    dp = Dispatcher(storage=create_storage())
     
     # Middlewarelarni ro'yxatga olish
     register_all_middlewares(dp)
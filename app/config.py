@@ -23,7 +23,124 @@ class Settings(BaseSettings):
     private_channel_link: str = "https://t.me/your_private_channel"  # Private channel link
 
     bot_username: str = "your_bot_username"  # Bot username
-    
+
+    # Ma'lumotlar bazasi
+    db_pool_min_size: int = 1  # Doim ochiq ulanishlar
+    db_pool_max_size: int = 10  # Maksimal ulanishlar
+    db_statement_cache_size: int = 100  # Har bir ulanishdagi prepared statement keshi (statements.STATEMENTS dan katta bo'lsin)
+    db_max_inactive_connection_lifetime: float = 300.0  # Bo'sh ulanish yopilguncha (soniya)
+    db_command_timeout: float = 60.0  # Bitta so'rov uchun standart timeout (soniya)
+    db_acquire_timeout: float = 10.0  # Pool dan ulanish kutish chegarasi (soniya)
+    db_coalesce_reads: bool = True  # Bir xil parallel SELECT lar bitta so'rovni kutadi
+    database_read_url: str = ""  # Read-only replika (hisobotlar, eksport), bo'sh bo'lsa asosiy baza
+    db_read_pool_min_size: int = 1  # Read-only pool dagi doim ochiq ulanishlar
+    db_read_pool_max_size: int = 5  # Read-only pool dagi maksimal ulanishlar
+    db_read_pool_retry_interval: float = 30.0  # Ochilmagan read-only pool ni qayta yaratish oralig'i (soniya)
+
+    # Foydalanuvchilar keshi
+    user_cache_size: int = 10000  # Maksimal yozuvlar soni
+    user_cache_ttl: int = 300  # Soniyalarda
+
+    # last_activity yozish buferi
+    activity_flush_interval: float = 5.0  # Soniyalarda
+    activity_buffer_max_size: int = 50000  # Shundan oshsa darhol yoziladi
+
+    # Kino ko'rishlari navbati
+    view_flush_size: int = 500  # Bitta paketdagi maksimal ko'rishlar
+    view_flush_interval: float = 2.0  # Soniyalarda
+    view_queue_max_size: int = 10000  # Navbat to'lsa yuboruvchi kutadi
+    view_spill_path: str = "logs/pending_views.jsonl"  # To'xtashda yozilmay qolganlar
+    view_max_write_attempts: int = 5  # Ulanish/ma'lumot xatosi bo'lmasa, shundan keyin paket navbatdan chiqariladi
+    view_max_retry_delay: float = 60.0  # Baza mavjud bo'lmaganda qayta urinishlar orasidagi maksimal kutish (soniya)
+    view_dead_letter_path: str = "logs/failed_views.jsonl"  # Yozib bo'lmagan paketlar (qo'lda tekshirish uchun)
+
+    # Kanal obunasini tekshirish
+    subscription_check_concurrency: int = 5  # Bot uchun parallel get_chat_member soni
+    subscription_positive_ttl: int = 300  # Obuna bo'lganlar keshi (soniya)
+    subscription_negative_ttl: int = 10  # Obuna bo'lmaganlar keshi (soniya)
+    membership_flush_interval: float = 2.0  # chat_member o'zgarishlarini yozish oralig'i (soniya)
+    membership_buffer_max_size: int = 10000  # Shundan oshsa darhol yoziladi
+    membership_trust_ttl: float = 86400.0  # DB dagi a'zolik shuncha vaqt Telegram so'ralmasdan ishoniladi (soniya)
+
+    # Obunalarni fon rejimida qayta tekshirish
+    reconcile_interval: float = 600.0  # O'tishlar orasidagi tanaffus (soniya)
+    reconcile_active_days: int = 7  # Shu kunlar ichida faol bo'lganlar tekshiriladi
+    reconcile_batch_size: int = 100  # Bitta paketdagi foydalanuvchilar
+    reconcile_concurrency: int = 5  # Bir vaqtdagi get_chat_member so'rovlari
+    reconcile_rate: float = 10.0  # Soniyasiga get_chat_member (foydalanuvchi tekshiruvlariga joy qoladi)
+    reconcile_lease_ttl: float = 300.0  # Tekshiruvchi jarayon lease i (har paketdan keyin uzaytiriladi, soniya)
+
+    # Kino kodlari indeksi
+    movie_index_refresh_interval: int = 30  # Yangi kinolarni olish (soniya)
+    movie_index_full_reload_interval: int = 600  # To'liq qayta yuklash (soniya)
+
+    # Kino qidiruvi
+    search_popularity_weight: float = 0.05  # pg_trgm reytingida ln(1 + ko'rishlar) ulushi (o'xshashlik 0..1 ga qo'shiladi)
+    movie_search_index: bool = True  # pg_trgm bo'lmasa nomlar bo'yicha xotiradagi indeksda qidirish
+    movies_page_size: int = 10  # Mashhur/yangi kinolar va qidiruv natijalarining bir sahifasi
+    search_max_results: int = 100  # Sahifalash uchun saqlanadigan qidiruv natijalari
+
+    # Faol kanallar keshi
+    channel_registry_refresh_interval: int = 60  # Davriy qayta yuklash (soniya)
+
+    # Kunlik statistika yig'indilari
+    analytics_rollup_interval: int = 60  # movie_views dan yig'ish oralig'i (soniya)
+    analytics_rollup_batch_size: int = 50000  # Bitta tranzaksiyadagi ko'rishlar
+    platform_stats_refresh_interval: int = 60  # Platforma statistikasini qayta hisoblash (soniya)
+
+    # Ma'lumotlar eksporti
+    export_dir: str = "exports"  # Eksport fayllari papkasi
+    export_batch_size: int = 5000  # Cursor dan bir marta o'qiladigan qatorlar
+    export_compress: bool = True  # gzip bilan siqish
+    export_progress_interval: float = 3.0  # Adminga jarayon haqida xabar (soniya)
+    export_max_upload_size: int = 50 * 1024 * 1024  # Telegram orqali yuboriladigan maksimal hajm
+    restore_batch_size: int = 10000  # Tiklashda bitta COPY dagi qatorlar
+    restore_statement_timeout: float = 3600.0  # Tiklashdagi bitta so'rov uchun timeout (soniya)
+    restore_max_download_size: int = 20 * 1024 * 1024  # Bot API orqali yuklab olinadigan maksimal fayl
+
+    # Ommaviy xabar yuborish
+    broadcast_rate: float = 25.0  # Soniyasiga yuboriladigan xabarlar (Telegram limiti ~30)
+    broadcast_concurrency: int = 20  # Bir vaqtda kutilayotgan so'rovlar
+    broadcast_batch_size: int = 200  # Bitta paketdagi foydalanuvchilar (shundan keyin holat saqlanadi)
+    broadcast_heartbeat_timeout: float = 120.0  # Shundan keyin to'xtab qolgan vazifa qayta olinadi (soniya, heartbeat har timeout/4 da)
+    broadcast_progress_interval: float = 10.0  # Adminga jarayon haqida xabar (soniya)
+    broadcast_max_retries: int = 5  # DB xatolaridan keyin vazifa ichida qayta urinishlar
+    broadcast_retry_base_delay: float = 2.0  # Birinchi qayta urinishgacha kutish (soniya, har safar 2 baravar)
+    broadcast_sweep_interval: float = 60.0  # To'xtab qolgan vazifalarni qidirish oralig'i (soniya)
+
+    # Telegram API so'rovlari (jarayon bo'yicha)
+    api_global_rate: float = 30.0  # Soniyasiga yuboriladigan xabarlar (barcha chatlar)
+    api_chat_rate: float = 1.0  # Bitta shaxsiy chatga soniyasiga
+    api_chat_burst: int = 3  # Bitta chatga ketma-ket ruxsat etilgan xabarlar
+    api_group_rate: float = 20 / 60  # Guruh va kanallarga (20 ta/daqiqa)
+    api_max_retries: int = 3  # Tarmoq va 5xx xatolarida qayta urinishlar
+    api_retry_base_delay: float = 0.5  # Birinchi qayta urinishgacha kutish (soniya, jitter bilan)
+    api_max_retry_after: float = 30.0  # Bundan uzoq RetryAfter kutilmaydi, xato qaytariladi
+
+    # Ishga tushirish rejimi
+    run_mode: str = "polling"  # polling yoki webhook
+    webhook_url: str = ""  # Tashqi manzil (https://bot.example.com), bo'sh bo'lsa o'rnatilmaydi
+    webhook_path: str = "/webhook"  # Update lar qabul qilinadigan yo'l
+    webhook_secret: str = ""  # X-Telegram-Bot-Api-Secret-Token qiymati
+    webhook_max_connections: int = 40  # Telegram bir vaqtda ochadigan ulanishlar
+    webhook_workers: int = 1  # Bir portdagi worker jarayonlar soni (> 1 bo'lsa fsm_storage=postgres kerak)
+    webhook_shutdown_timeout: float = 30.0  # To'xtashda update larni kutish (soniya)
+    webapp_host: str = "0.0.0.0"  # aiohttp server manzili
+    webapp_port: int = 8080  # aiohttp server porti
+
+    # FSM holatlari
+    fsm_storage: str = "memory"  # memory yoki postgres (jarayonlar orasida umumiy)
+    fsm_state_ttl: int = 86400  # Oxirgi yozuvdan keyin holat yashash muddati (soniya)
+    fsm_memory_max_size: int = 100000  # memory storage dagi maksimal holatlar
+    fsm_purge_interval: int = 300  # postgres storage tozalash oralig'i (soniya)
+
+    # Supervisor rejimi (update lar chat_id bo'yicha workerlarga taqsimlanadi)
+    shard_workers: int = 0  # Worker jarayonlar soni, 0 - o'chirilgan
+    shard_queue_size: int = 1000  # Har bir worker navbati (to'lsa supervisor kutadi)
+    shard_max_in_flight: int = 100  # Worker bir vaqtda ishlaydigan update lar
+    shard_metrics_interval: float = 10.0  # Ko'rsatkichlarni yuborish (soniya)
+    shard_metrics_token: str = ""  # /metrics uchun Bearer token, bo'sh bo'lsa faqat localhost dan
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
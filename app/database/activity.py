@@ -0,0 +1,110 @@
+"""
+Foydalanuvchi faoliyatini (last_activity) yig'ib, paketlab yozish
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from app.config import settings
+from .connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityBuffer:
+    """last_activity yangilanishlarini xotirada jamlovchi bufer"""
+
+    # Foydalanuvchi botga yozgan bo'lsa, bloklash ham bekor bo'lgan.
+    # Vaqt UTC da (timestamptz) uzatiladi va baza sessiya vaqt zonasiga o'tkazadi -
+    # CURRENT_TIMESTAMP default qiymatlari bilan bir xil soatda solishtiriladi
+    FLUSH_QUERY = """
+    UPDATE users AS u
+    SET last_activity = a.last_activity,
+        blocked_at = NULL
+    FROM unnest($1::bigint[], $2::timestamptz[]) AS a(tg_id, last_activity)
+    WHERE u.tg_id = a.tg_id
+      AND (u.last_activity IS NULL OR u.last_activity < a.last_activity)
+    """
+
+    def __init__(self, flush_interval: float = 5.0, max_pending: int = 50000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[int, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+
+    def touch(self, tg_id: int) -> None:
+        """Foydalanuvchi faolligini qayd etish (DB ga darhol yozilmaydi)"""
+        self._pending[tg_id] = datetime.now(timezone.utc)
+
+        # Bufer to'lib ketsa, navbatdagi flush ni kutmasdan yozish
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    @property
+    def pending_count(self) -> int:
+        """Yozilishini kutayotgan foydalanuvchilar soni"""
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        """Jamlangan yangilanishlarni bitta UPDATE bilan yozish"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            batch, self._pending = self._pending, {}
+            tg_ids = list(batch.keys())
+            timestamps = list(batch.values())
+
+            try:
+                db = get_db_connection()
+                await db.execute(self.FLUSH_QUERY, tg_ids, timestamps)
+                logger.debug(f"Activity flush: {len(tg_ids)} users")
+                return len(tg_ids)
+
+            except Exception as e:
+                logger.error(f"Activity flush error: {e}")
+
+                # Yozilmagan yangilanishlarni qaytarish (yangilarini ustun qo'yib)
+                for tg_id, ts in batch.items():
+                    if tg_id not in self._pending:
+                        self._pending[tg_id] = ts
+                return 0
+
+    async def _run(self) -> None:
+        """Davriy flush sikli"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        """Fon vazifasini ishga tushirish"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Fon vazifasini to'xtatish va qolganlarini yozish"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        await self.flush()
+
+
+# Global activity buffer instance
+activity_buffer = ActivityBuffer(
+    flush_interval=settings.activity_flush_interval,
+    max_pending=settings.activity_buffer_max_size
+)
@@ -0,0 +1,146 @@
+"""
+Ko'rishlar statistikasining kunlik yig'indilari (movie_views_daily, user_views_daily)
+
+movie_views jadvalidagi yangi yozuvlar id bo'yicha watermark dan boshlab
+vaqti-vaqti bilan yig'indilarga qo'shiladi. Admin hisobotlari xom
+ko'rishlarni emas, shu jadvallarni o'qiydi.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from app.config import settings
+from .connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsRollup:
+    """movie_views -> kunlik yig'indilar fon vazifasi"""
+
+    # Bir nechta jarayon bo'lsa, faqat bittasi yig'adi
+    LOCK_KEY = 7310001
+
+    STATE_QUERY = "SELECT last_view_id FROM analytics_rollup_state WHERE name = 'movie_views'"
+
+    SAVE_STATE_QUERY = "UPDATE analytics_rollup_state SET last_view_id = $1, updated_at = CURRENT_TIMESTAMP WHERE name = 'movie_views'"
+
+    # (kun, kino) bo'yicha ko'rishlar; noyob tomoshabin - o'sha kuni shu kinoni
+    # birinchi marta ko'rgan foydalanuvchi (oldingi yozuvlarda uchramagan)
+    MOVIE_ROLLUP_QUERY = """
+    WITH new_views AS (
+        SELECT user_id, movie_id, viewed_at::date AS day
+        FROM movie_views
+        WHERE id > $1 AND id <= $2
+    ),
+    first_viewers AS (
+        SELECT DISTINCT n.day, n.movie_id, n.user_id
+        FROM new_views n
+        WHERE NOT EXISTS (
+            SELECT 1 FROM movie_views p
+            WHERE p.user_id = n.user_id
+              AND p.movie_id = n.movie_id
+              AND p.id <= $1
+              AND p.viewed_at >= n.day
+              AND p.viewed_at < n.day + 1
+        )
+    )
+    INSERT INTO movie_views_daily (day, movie_id, views, unique_viewers)
+    SELECT v.day, v.movie_id, v.views, COALESCE(f.viewers, 0)
+    FROM (
+        SELECT day, movie_id, COUNT(*) AS views FROM new_views GROUP BY day, movie_id
+    ) v
+    LEFT JOIN (
+        SELECT day, movie_id, COUNT(*) AS viewers FROM first_viewers GROUP BY day, movie_id
+    ) f USING (day, movie_id)
+    ON CONFLICT (day, movie_id) DO UPDATE
+    SET views = movie_views_daily.views + EXCLUDED.views,
+        unique_viewers = movie_views_daily.unique_viewers + EXCLUDED.unique_viewers
+    """
+
+    USER_ROLLUP_QUERY = """
+    INSERT INTO user_views_daily (day, user_id, views, last_viewed_at)
+    SELECT viewed_at::date, user_id, COUNT(*), MAX(viewed_at)
+    FROM movie_views
+    WHERE id > $1 AND id <= $2
+    GROUP BY viewed_at::date, user_id
+    ON CONFLICT (day, user_id) DO UPDATE
+    SET views = user_views_daily.views + EXCLUDED.views,
+        last_viewed_at = GREATEST(user_views_daily.last_viewed_at, EXCLUDED.last_viewed_at)
+    """
+
+    def __init__(self, interval: float = 60.0, batch_size: int = 50000):
+        self.interval = interval
+        self.batch_size = batch_size
+        # Oldingi siklda ko'rilgan MAX(id). Undan kichik id lar allaqachon
+        # commit qilingan deb hisoblanadi (parallel yozuvchilar tartibsiz
+        # commit qilsa ham yozuv tashlab ketilmaydi)
+        self._safe_upper: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _rollup_batch(self, upper_limit: int) -> int:
+        """Bitta paketni yig'ish; qayta ishlangan oxirgi id ni qaytaradi"""
+        db = get_db_connection()
+        async with db.get_connection() as conn:
+            async with conn.transaction():
+                locked = await conn.fetchval("SELECT pg_try_advisory_xact_lock($1)", self.LOCK_KEY)
+                if not locked:
+                    return -1
+
+                watermark = await conn.fetchval(self.STATE_QUERY) or 0
+                upper = min(upper_limit, watermark + self.batch_size)
+                if upper <= watermark:
+                    return watermark
+
+                await conn.execute(self.MOVIE_ROLLUP_QUERY, watermark, upper)
+                await conn.execute(self.USER_ROLLUP_QUERY, watermark, upper)
+                await conn.execute(self.SAVE_STATE_QUERY, upper)
+                return upper
+
+    async def run_once(self) -> None:
+        """Xavfsiz chegaragacha bo'lgan barcha yangi ko'rishlarni yig'ish"""
+        db = get_db_connection()
+        current_max = await db.fetchval("SELECT COALESCE(MAX(id), 0) FROM movie_views")
+        upper_limit, self._safe_upper = self._safe_upper, current_max
+
+        if upper_limit is None:
+            return
+
+        while True:
+            processed = await self._rollup_batch(upper_limit)
+            if processed < 0 or processed >= upper_limit:
+                break
+
+        logger.debug(f"Analytics rollup: watermark {processed}")
+
+    async def _run(self) -> None:
+        """Davriy yig'ish sikli"""
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Analytics rollup error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Fon vazifasini ishga tushirish"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Fon vazifasini to'xtatish"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global analytics rollup instance
+analytics_rollup = AnalyticsRollup(
+    interval=settings.analytics_rollup_interval,
+    batch_size=settings.analytics_rollup_batch_size
+)
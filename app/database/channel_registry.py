@@ -0,0 +1,124 @@
+"""
+Faol kanallar ro'yxati keshi (versiyalangan)
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from .connection import get_db_connection
+from .models import Channel
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelRegistry:
+    """
+    Faol kanallar ro'yxatini xotirada saqlash
+
+    Admin o'zgarishlarida invalidate() chaqiriladi (versiya oshadi),
+    xavfsizlik uchun esa ro'yxat davriy ravishda qayta yuklanadi.
+    """
+
+    def __init__(self, refresh_interval: float = 60.0):
+        self.refresh_interval = refresh_interval
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._channels: Optional[List[Channel]] = None
+        self._loaded_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _is_fresh(self) -> bool:
+        # Fon yangilanishi ishlamay qolsa, ro'yxat 2 interval o'tgach eskirgan hisoblanadi
+        return (
+            self._channels is not None
+            and time.monotonic() - self._loaded_at < self.refresh_interval * 2
+        )
+
+    async def _load(self) -> List[Channel]:
+        """Ro'yxatni DB dan yuklash (invalidate bilan poyga bo'lmasligi uchun versiya tekshiriladi)"""
+        version = self.version
+
+        db = get_db_connection()
+        records = await db.fetch_prepared('active_channels')
+        channels = [Channel.from_record(record) for record in records]
+
+        # Yuklash davomida invalidate bo'lmagan bo'lsagina saqlash
+        if version == self.version:
+            self._channels = channels
+            self._loaded_at = time.monotonic()
+
+        return channels
+
+    async def get_active_channels(self) -> List[Channel]:
+        """Faol kanallar ro'yxati"""
+        if self._is_fresh():
+            self.hits += 1
+            return list(self._channels)
+
+        self.misses += 1
+
+        # Bir vaqtda kelgan so'rovlar bitta yuklashni kutadi
+        async with self.lock:
+            if self._is_fresh():
+                return list(self._channels)
+            return list(await self._load())
+
+    def invalidate(self) -> None:
+        """Keshni bekor qilish (kanal qo'shildi/o'zgardi/o'chirildi)"""
+        self.version += 1
+        self._channels = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Kesh statistikasi"""
+        total = self.hits + self.misses
+        return {
+            "version": self.version,
+            "channels": len(self._channels) if self._channels is not None else None,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._channels is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0
+        }
+
+    async def _run(self) -> None:
+        """Davriy qayta yuklash (xavfsizlik uchun)"""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                async with self.lock:
+                    await self._load()
+                logger.debug(f"Channel registry refreshed: {self.stats()}")
+            except Exception as e:
+                logger.error(f"Channel registry refresh error: {e}")
+
+    def start(self) -> None:
+        """Fon yangilanishini boshlash"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Fon yangilanishini to'xtatish"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global channel registry instance
+channel_registry = ChannelRegistry(
+    refresh_interval=settings.channel_registry_refresh_interval
+)
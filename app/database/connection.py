@@ -4,43 +4,188 @@ PostgreSQL ulanish va connection pool boshqaruvi
 
 import asyncio
 import asyncpg
+import time
 from typing import Optional, Dict, Any
 import logging
 from contextlib import asynccontextmanager
+from functools import partial
 
 from app.config import settings
+from .statements import STATEMENTS
 
 logger = logging.getLogger(__name__)
 
+# Read-only pool ga ulanib bo'lmasa, so'rov asosiy pool ga o'tkaziladi
+READ_FALLBACK_ERRORS = (
+    OSError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.InterfaceError,
+)
+
+
+class PoolMetrics:
+    """Connection pool ko'rsatkichlari (kutish vaqti, band ulanishlar, timeout lar)"""
+    
+    # Kutish vaqti gistogrammasi chegaralari (millisekund)
+    WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+    
+    def __init__(self):
+        self.acquired = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * (len(self.WAIT_BUCKETS_MS) + 1)
+        self.in_use = 0
+        self.in_use_high_water = 0
+        self.waiting = 0
+        self.waiting_high_water = 0
+        self.timeouts = 0
+        self.exhausted = 0  # So'ralganda barcha ulanishlar band edi (navbatda kutildi)
+    
+    def on_request(self, max_size: int) -> None:
+        if self.in_use + self.waiting >= max_size:
+            self.exhausted += 1
+        self.waiting += 1
+        self.waiting_high_water = max(self.waiting_high_water, self.waiting)
+    
+    def on_timeout(self) -> None:
+        self.waiting -= 1
+        self.timeouts += 1
+    
+    def on_abandoned(self) -> None:
+        self.waiting -= 1
+    
+    def on_acquired(self, wait: float) -> None:
+        self.waiting -= 1
+        self.acquired += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        
+        wait_ms = wait * 1000
+        for index, bound in enumerate(self.WAIT_BUCKETS_MS):
+            if wait_ms <= bound:
+                self.wait_buckets[index] += 1
+                break
+        else:
+            self.wait_buckets[-1] += 1
+        
+        self.in_use += 1
+        self.in_use_high_water = max(self.in_use_high_water, self.in_use)
+    
+    def on_released(self) -> None:
+        self.in_use -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        labels = [f"<={bound}ms" for bound in self.WAIT_BUCKETS_MS] + [f">{self.WAIT_BUCKETS_MS[-1]}ms"]
+        return {
+            "acquired": self.acquired,
+            "wait_avg_ms": round(self.wait_total / self.acquired * 1000, 2) if self.acquired else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 2),
+            "wait_histogram": dict(zip(labels, self.wait_buckets)),
+            "in_use": self.in_use,
+            "in_use_high_water": self.in_use_high_water,
+            "waiting": self.waiting,
+            "waiting_high_water": self.waiting_high_water,
+            "timeouts": self.timeouts,
+            "exhausted": self.exhausted
+        }
+
 
 class DatabaseConnection:
-    """PostgreSQL ma'lumotlar bazasi ulanish sinfi"""
+    """PostgreSQL ma'lumotlar bazasi ulanish sinfi
+    
+    database_read_url berilgan bo'lsa, analytics=True so'rovlar (hisobotlar,
+    eksport) alohida read-only pool ga yuboriladi, qolganlari asosiy pool da
+    qoladi. Read-only baza ishlamasa, so'rovlar asosiy pool ga qaytadi.
+    """
     
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
+        self.read_pool: Optional[asyncpg.Pool] = None
         self._is_connected = False
+        self.metrics = PoolMetrics()
+        self.read_metrics = PoolMetrics()
+        self.read_fallbacks = 0
+        # Ishga tushishda ochilmagan read-only pool ni qayta yaratish
+        self._read_pool_task: Optional[asyncio.Task] = None
+        self._read_pool_failed_at: Optional[float] = None
+        # Bajarilayotgan SELECT lar: (metod, so'rov, argumentlar) -> vazifa
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self.coalesced_queries = 0
+    
+    async def _create_pool(self, dsn: str, min_size: int, max_size: int) -> asyncpg.Pool:
+        return await asyncpg.create_pool(
+            dsn,
+            min_size=min_size,
+            max_size=max_size,
+            command_timeout=settings.db_command_timeout,
+            statement_cache_size=settings.db_statement_cache_size,
+            max_inactive_connection_lifetime=settings.db_max_inactive_connection_lifetime,
+            server_settings={
+                'jit': 'off'  # Performance uchun
+            }
+        )
     
     async def connect(self) -> None:
         """Ma'lumotlar bazasiga ulanish va connection pool yaratish"""
         try:
-            self.pool = await asyncpg.create_pool(
+            self.pool = await self._create_pool(
                 settings.database_url,
-                min_size=1,
-                max_size=10,
-                command_timeout=60,
-                server_settings={
-                    'jit': 'off'  # Performance uchun
-                }
+                settings.db_pool_min_size,
+                settings.db_pool_max_size
             )
             self._is_connected = True
             logger.info("✅ PostgreSQL connection pool yaratildi")
             
+            if 0 < settings.db_statement_cache_size < len(STATEMENTS):
+                logger.warning(f"⚠️ DB_STATEMENT_CACHE_SIZE={settings.db_statement_cache_size} "
+                               f"registrdagi {len(STATEMENTS)} ta so'rovdan kichik - ular keshdan siqib chiqariladi")
+            
         except Exception as e:
             logger.error(f"❌ Ma'lumotlar bazasiga ulanishda xatolik: {e}")
             raise
+        
+        if settings.database_read_url:
+            await self._connect_read_pool()
+    
+    async def _connect_read_pool(self) -> None:
+        """Read-only pool yaratish (ulanib bo'lmasa hisobotlar asosiy pool orqali ishlayveradi)"""
+        try:
+            self.read_pool = await self._create_pool(
+                settings.database_read_url,
+                settings.db_read_pool_min_size,
+                settings.db_read_pool_max_size
+            )
+            self._read_pool_failed_at = None
+            logger.info("✅ PostgreSQL read-only pool yaratildi")
+        except Exception as e:
+            self._read_pool_failed_at = time.monotonic()
+            logger.warning(f"⚠️ Read-only bazaga ulanib bo'lmadi, asosiy pool ishlatiladi: {e}")
+    
+    def _retry_read_pool(self) -> None:
+        """Read-only pool ni fon rejimida qayta yaratish (db_read_pool_retry_interval da bir marta)"""
+        if self._read_pool_task is not None and not self._read_pool_task.done():
+            return
+        if (self._read_pool_failed_at is not None
+                and time.monotonic() - self._read_pool_failed_at < settings.db_read_pool_retry_interval):
+            return
+        self._read_pool_task = asyncio.create_task(self._connect_read_pool())
     
     async def disconnect(self) -> None:
         """Ma'lumotlar bazasi ulanishini yopish"""
+        if self._read_pool_task is not None:
+            self._read_pool_task.cancel()
+            try:
+                await self._read_pool_task
+            except asyncio.CancelledError:
+                pass
+            self._read_pool_task = None
+        
+        if self.read_pool:
+            await self.read_pool.close()
+            self.read_pool = None
+            logger.info("✅ PostgreSQL read-only pool yopildi")
+        
         if self.pool:
             await self.pool.close()
             self._is_connected = False
@@ -51,18 +196,66 @@ class DatabaseConnection:
         """Ulanish holatini tekshirish"""
         return self._is_connected and self.pool is not None
     
+    async def _acquire(self, pool: asyncpg.Pool, metrics: PoolMetrics) -> asyncpg.Connection:
+        """Pool dan ulanish olish (kutish vaqti metrics ga yoziladi)"""
+        metrics.on_request(pool.get_max_size())
+        
+        started = time.perf_counter()
+        try:
+            connection = await pool.acquire(timeout=settings.db_acquire_timeout)
+        except asyncio.TimeoutError:
+            metrics.on_timeout()
+            logger.error(f"❌ Pool dan ulanish {settings.db_acquire_timeout}s ichida olinmadi (max_size={pool.get_max_size()})")
+            raise
+        except BaseException:
+            # Kutish bekor qilindi yoki ulanishda xatolik
+            metrics.on_abandoned()
+            raise
+        
+        metrics.on_acquired(time.perf_counter() - started)
+        return connection
+    
     @asynccontextmanager
-    async def get_connection(self):
-        """Connection context manager"""
+    async def get_connection(self, analytics: bool = False):
+        """Connection context manager
+        
+        analytics=True - og'ir o'qish so'rovlari uchun read-only pool (bo'lsa).
+        Read-only pool da timeout bo'lsa asosiy pool ga o'tilmaydi, aks holda
+        og'ir hisobotlar foydalanuvchi so'rovlarini siqib chiqaradi. Pool
+        ishga tushishda ochilmagan bo'lsa, u fonda qayta yaratiladi.
+        """
         if not self.is_connected:
             raise RuntimeError("Ma'lumotlar bazasi ulanmagan!")
         
-        async with self.pool.acquire() as connection:
+        pool, metrics = self.pool, self.metrics
+        connection = None
+        
+        if analytics and self.read_pool is not None:
             try:
-                yield connection
-            except Exception as e:
-                logger.error(f"Database operation error: {e}")
+                connection = await self._acquire(self.read_pool, self.read_metrics)
+                pool, metrics = self.read_pool, self.read_metrics
+            except asyncio.TimeoutError:
+                # Python 3.11+ da TimeoutError - OSError ning voris sinfi
                 raise
+            except READ_FALLBACK_ERRORS as e:
+                self.read_fallbacks += 1
+                logger.warning(f"⚠️ Read-only baza javob bermadi, asosiy pool ishlatiladi: {e}")
+        elif analytics and settings.database_read_url:
+            # Read-only pool ishga tushishda ochilmagan - asosiy pool, fonda qayta urinish
+            self.read_fallbacks += 1
+            self._retry_read_pool()
+        
+        if connection is None:
+            connection = await self._acquire(pool, metrics)
+        
+        try:
+            yield connection
+        except Exception as e:
+            logger.error(f"Database operation error: {e}")
+            raise
+        finally:
+            metrics.on_released()
+            await pool.release(connection)
     
     async def execute(self, query: str, *args) -> str:
         """SQL so'rovni bajarish (INSERT, UPDATE, DELETE)"""
@@ -75,9 +268,9 @@ class DatabaseConnection:
                 logger.error(f"Execute error: {e}")
                 raise
     
-    async def fetch(self, query: str, *args) -> list:
+    async def _fetch(self, query: str, *args, analytics: bool = False) -> list:
         """SQL so'rovdan ko'p natija olish (SELECT)"""
-        async with self.get_connection() as conn:
+        async with self.get_connection(analytics) as conn:
             try:
                 result = await conn.fetch(query, *args)
                 logger.debug(f"Fetch query: {query[:100]}... | Results: {len(result)}")
@@ -86,9 +279,9 @@ class DatabaseConnection:
                 logger.error(f"Fetch error: {e}")
                 raise
     
-    async def fetchrow(self, query: str, *args) -> Optional[asyncpg.Record]:
+    async def _fetchrow(self, query: str, *args, analytics: bool = False) -> Optional[asyncpg.Record]:
         """SQL so'rovdan bitta natija olish"""
-        async with self.get_connection() as conn:
+        async with self.get_connection(analytics) as conn:
             try:
                 result = await conn.fetchrow(query, *args)
                 logger.debug(f"Fetchrow query: {query[:100]}...")
@@ -97,9 +290,9 @@ class DatabaseConnection:
                 logger.error(f"Fetchrow error: {e}")
                 raise
     
-    async def fetchval(self, query: str, *args):
+    async def _fetchval(self, query: str, *args, analytics: bool = False):
         """SQL so'rovdan bitta qiymat olish"""
-        async with self.get_connection() as conn:
+        async with self.get_connection(analytics) as conn:
             try:
                 result = await conn.fetchval(query, *args)
                 logger.debug(f"Fetchval query: {query[:100]}...")
@@ -108,6 +301,86 @@ class DatabaseConnection:
                 logger.error(f"Fetchval error: {e}")
                 raise
     
+    async def _run_prepared(self, method: str, name: str, args: tuple, analytics: bool = False):
+        """Nomlangan so'rovni ulanishning statement keshi orqali bajarish
+        
+        Sxema o'zgarib keshdagi statement eskirsa, asyncpg uni o'zi qayta tayyorlaydi.
+        """
+        async with self.get_connection(analytics) as conn:
+            return await getattr(conn, method)(STATEMENTS[name], *args)
+    
+    async def _fetch_prepared(self, name: str, *args, analytics: bool = False) -> list:
+        return await self._run_prepared("fetch", name, args, analytics)
+    
+    async def _fetchrow_prepared(self, name: str, *args, analytics: bool = False) -> Optional[asyncpg.Record]:
+        return await self._run_prepared("fetchrow", name, args, analytics)
+    
+    async def _fetchval_prepared(self, name: str, *args, analytics: bool = False):
+        return await self._run_prepared("fetchval", name, args, analytics)
+    
+    async def _coalesce(self, func, query: str, args: tuple, sql: Optional[str] = None, analytics: bool = False):
+        """Bir xil SELECT lar bir vaqtda kelsa, bitta so'rov natijasini bo'lishish
+        
+        Natija so'rov tugagandan keyin saqlanmaydi - eskirgan ma'lumot bo'lmaydi.
+        Nomlangan statement lar uchun `query` - nomi, `sql` - matni.
+        """
+        run = partial(func, analytics=analytics)
+        if not settings.db_coalesce_reads or (sql or query).lstrip()[:6].upper() != "SELECT":
+            return await run(query, *args)
+        
+        key = (func.__name__, analytics, query, args)
+        try:
+            task = self._inflight.get(key)
+        except TypeError:
+            # Ro'yxat argumentlar hash lanmaydi - to'g'ridan-to'g'ri bajarish
+            return await run(query, *args)
+        
+        if task is not None:
+            self.coalesced_queries += 1
+            result = await asyncio.shield(task)
+            return list(result) if isinstance(result, list) else result
+        
+        task = asyncio.ensure_future(run(query, *args))
+        self._inflight[key] = task
+        task.add_done_callback(partial(self._release_inflight, key))
+        
+        # Chaqiruvchi bekor qilinsa ham, kutayotgan boshqalar uchun so'rov davom etadi
+        return await asyncio.shield(task)
+    
+    def _release_inflight(self, key: tuple, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Hech kim kutmagan xatolik ogohlantirishsiz yopiladi
+    
+    async def fetch(self, query: str, *args, analytics: bool = False) -> list:
+        """SQL so'rovdan ko'p natija olish (SELECT)"""
+        return await self._coalesce(self._fetch, query, args, analytics=analytics)
+    
+    async def fetchrow(self, query: str, *args, analytics: bool = False) -> Optional[asyncpg.Record]:
+        """SQL so'rovdan bitta natija olish"""
+        return await self._coalesce(self._fetchrow, query, args, analytics=analytics)
+    
+    async def fetchval(self, query: str, *args, analytics: bool = False):
+        """SQL so'rovdan bitta qiymat olish"""
+        return await self._coalesce(self._fetchval, query, args, analytics=analytics)
+    
+    async def fetch_prepared(self, name: str, *args, analytics: bool = False) -> list:
+        """Nomlangan statement dan ko'p natija olish (statements.STATEMENTS)"""
+        return await self._coalesce(self._fetch_prepared, name, args, STATEMENTS[name], analytics)
+    
+    async def fetchrow_prepared(self, name: str, *args, analytics: bool = False) -> Optional[asyncpg.Record]:
+        """Nomlangan statement dan bitta natija olish"""
+        return await self._coalesce(self._fetchrow_prepared, name, args, STATEMENTS[name], analytics)
+    
+    async def fetchval_prepared(self, name: str, *args, analytics: bool = False):
+        """Nomlangan statement dan bitta qiymat olish"""
+        return await self._coalesce(self._fetchval_prepared, name, args, STATEMENTS[name], analytics)
+    
+    async def execute_prepared(self, name: str, *args) -> str:
+        """Nomlangan statement ni bajarish (INSERT, UPDATE, DELETE) - status qaytaradi"""
+        return await self._run_prepared("execute", name, args)
+    
     async def executemany(self, query: str, args_list: list) -> None:
         """Ko'p so'rovlarni bir vaqtda bajarish"""
         async with self.get_connection() as conn:
@@ -149,10 +422,50 @@ async def init_db() -> None:
     else:
         logger.error("❌ Ma'lumotlar bazasi health check muvaffaqiyatsiz")
         raise RuntimeError("Database health check failed")
+    
+    # Kino kodlari indeksini yuklash
+    from .movie_index import movie_index
+    await movie_index.start()
+    
+    # Faol kanallar keshi
+    from .channel_registry import channel_registry
+    channel_registry.start()
+    
+    # Fon yozuvchilarini ishga tushirish
+    from .activity import activity_buffer
+    from .membership import membership_writer
+    from .view_writer import view_writer
+    activity_buffer.start()
+    membership_writer.start()
+    view_writer.start()
+    
+    # Statistika yig'indilari va platforma statistikasi nusxasi
+    from .analytics import analytics_rollup
+    from .stats_snapshot import platform_stats
+    analytics_rollup.start()
+    platform_stats.start()
 
 
 async def close_db() -> None:
     """Ma'lumotlar bazasini yopish"""
+    from .activity import activity_buffer
+    from .analytics import analytics_rollup
+    from .channel_registry import channel_registry
+    from .membership import membership_writer
+    from .movie_index import movie_index
+    from .stats_snapshot import platform_stats
+    from .view_writer import view_writer
+    
+    await platform_stats.stop()
+    await analytics_rollup.stop()
+    await movie_index.stop()
+    await channel_registry.stop()
+    
+    # Buferda qolgan yozuvlarni pool yopilishidan oldin yozish
+    await view_writer.stop()
+    await membership_writer.stop()
+    await activity_buffer.stop()
+    
     await db.disconnect()
 
 
@@ -189,5 +502,24 @@ async def get_pool_stats() -> Dict[str, Any]:
         "size": db.pool.get_size(),
         "idle_connections": db.pool.get_idle_size(),
         "max_size": db.pool.get_max_size(),
-        "min_size": db.pool.get_min_size()
-    }
\ No newline at end of file
+        "min_size": db.pool.get_min_size(),
+        "coalesced_queries": db.coalesced_queries,
+        "inflight_queries": len(db._inflight),
+        **db.metrics.stats(),
+        "read_pool": _read_pool_stats()
+    }
+
+
+def _read_pool_stats() -> Dict[str, Any]:
+    if not settings.database_read_url:
+        return {"status": "disabled"}
+    
+    stats = {"status": "connected" if db.read_pool else "fallback", "fallbacks": db.read_fallbacks}
+    if db.read_pool:
+        stats.update(
+            size=db.read_pool.get_size(),
+            idle_connections=db.read_pool.get_idle_size(),
+            max_size=db.read_pool.get_max_size(),
+            **db.read_metrics.stats()
+        )
+    return stats
\ No newline at end of file
@@ -45,12 +45,18 @@ class DatabaseCreator:
             full_name TEXT NOT NULL,
             is_admin BOOLEAN DEFAULT FALSE,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            blocked_at TIMESTAMP  -- Botni bloklagan (xabar yetkazilmadi), faollik bo'lsa tozalanadi
         );
         
+        -- Oldin yaratilgan bazalar uchun
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS blocked_at TIMESTAMP;
+        
         -- Index qo'shish tez qidirish uchun
         CREATE INDEX IF NOT EXISTS idx_users_tg_id ON users(tg_id);
         CREATE INDEX IF NOT EXISTS idx_users_is_admin ON users(is_admin);
+        -- Obunalarni qayta tekshirish: eng faollardan boshlab keyset
+        CREATE INDEX IF NOT EXISTS idx_users_last_activity ON users(last_activity DESC, id DESC);
         """
         
         await self.connection.execute(query)
@@ -74,11 +80,31 @@ class DatabaseCreator:
         CREATE INDEX IF NOT EXISTS idx_movie_code ON movie(code);
         CREATE INDEX IF NOT EXISTS idx_movie_title ON movie(title);
         CREATE INDEX IF NOT EXISTS idx_movie_view_count ON movie(view_count DESC);
+        -- Keyset sahifalash (mashhur va yangi kinolar)
+        CREATE INDEX IF NOT EXISTS idx_movie_popular ON movie(view_count DESC, id DESC);
+        CREATE INDEX IF NOT EXISTS idx_movie_recent ON movie(created_at DESC, id DESC);
         """
         
         await self.connection.execute(query)
         print("✅ Movie jadvali yaratildi")
     
+    async def create_movie_search_indexes(self) -> None:
+        """Kino qidiruvi uchun trigram (pg_trgm) GIN indekslari"""
+        try:
+            await self.connection.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except asyncpg.PostgresError as e:
+            # Kengaytma serverda yo'q yoki huquq yetmaydi - qidiruv ILIKE bilan ishlaydi
+            print(f"⚠️  pg_trgm kengaytmasi yoqilmadi, qidiruv indekssiz ishlaydi: {e}")
+            return
+        
+        query = """
+        CREATE INDEX IF NOT EXISTS idx_movie_title_trgm ON movie USING GIN (title gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_movie_description_trgm ON movie USING GIN (description gin_trgm_ops);
+        """
+        
+        await self.connection.execute(query)
+        print("✅ Kino qidiruvi indekslari yaratildi")
+    
     async def create_channel_table(self) -> None:
         """Channel jadvalini yaratish"""
         query = """
@@ -109,9 +135,13 @@ class DatabaseCreator:
             user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
             channel_id INTEGER REFERENCES channel(id) ON DELETE CASCADE,
             joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            verified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- Oxirgi marta Telegram tasdiqlagan vaqt
             UNIQUE(user_id, channel_id)
         );
         
+        -- Oldin yaratilgan bazalar uchun
+        ALTER TABLE joineduserannel ADD COLUMN IF NOT EXISTS verified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+        
         -- Index qo'shish
         CREATE INDEX IF NOT EXISTS idx_joined_user_id ON joineduserannel(user_id);
         CREATE INDEX IF NOT EXISTS idx_joined_channel_id ON joineduserannel(channel_id);
@@ -134,11 +164,111 @@ class DatabaseCreator:
         CREATE INDEX IF NOT EXISTS idx_views_user_id ON movie_views(user_id);
         CREATE INDEX IF NOT EXISTS idx_views_movie_id ON movie_views(movie_id);
         CREATE INDEX IF NOT EXISTS idx_views_date ON movie_views(viewed_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_views_user_movie ON movie_views(user_id, movie_id, viewed_at);
         """
         
         await self.connection.execute(query)
         print("✅ MovieViews jadvali yaratildi")
     
+    async def create_analytics_tables(self) -> None:
+        """Kunlik statistika yig'indilari jadvallarini yaratish"""
+        query = """
+        CREATE TABLE IF NOT EXISTS movie_views_daily (
+            day DATE NOT NULL,
+            movie_id INTEGER REFERENCES movie(id) ON DELETE CASCADE,
+            views INTEGER NOT NULL DEFAULT 0,
+            unique_viewers INTEGER NOT NULL DEFAULT 0,  -- Shu kuni ko'rgan noyob foydalanuvchilar
+            PRIMARY KEY (day, movie_id)
+        );
+        
+        CREATE TABLE IF NOT EXISTS user_views_daily (
+            day DATE NOT NULL,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            views INTEGER NOT NULL DEFAULT 0,
+            last_viewed_at TIMESTAMP,
+            PRIMARY KEY (day, user_id)
+        );
+        
+        -- movie_views dagi qaysi id gacha yig'ilgani
+        CREATE TABLE IF NOT EXISTS analytics_rollup_state (
+            name TEXT PRIMARY KEY,
+            last_view_id BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        INSERT INTO analytics_rollup_state (name) VALUES ('movie_views') ON CONFLICT DO NOTHING;
+        
+        -- Index qo'shish
+        CREATE INDEX IF NOT EXISTS idx_movie_views_daily_movie ON movie_views_daily(movie_id, day);
+        CREATE INDEX IF NOT EXISTS idx_user_views_daily_user ON user_views_daily(user_id, day);
+        """
+        
+        await self.connection.execute(query)
+        print("✅ Analytics jadvallari yaratildi")
+    
+    async def create_fsm_storage_table(self) -> None:
+        """FSM holatlari jadvalini yaratish (FSM_STORAGE=postgres uchun)"""
+        query = """
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            key TEXT PRIMARY KEY,  -- fsm:<bot_id>:<chat_id>:<user_id>:<destiny>
+            state TEXT,
+            data JSONB NOT NULL DEFAULT '{}',
+            expires_at TIMESTAMP NOT NULL
+        );
+        
+        -- Index qo'shish (muddati o'tganlarni tozalash uchun)
+        CREATE INDEX IF NOT EXISTS idx_fsm_storage_expires_at ON fsm_storage(expires_at);
+        """
+        
+        await self.connection.execute(query)
+        print("✅ FSM storage jadvali yaratildi")
+    
+    async def create_broadcast_jobs_table(self) -> None:
+        """Xabar yuborish vazifalari jadvalini yaratish"""
+        query = """
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            id SERIAL PRIMARY KEY,
+            admin_id BIGINT NOT NULL,  -- Vazifani yaratgan admin (tg_id)
+            from_chat_id BIGINT NOT NULL,  -- Nusxalanadigan xabar
+            message_id INTEGER NOT NULL,
+            target TEXT NOT NULL DEFAULT 'all',
+            status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'completed', 'cancelled')),
+            last_user_id INTEGER NOT NULL DEFAULT 0,  -- users.id bo'yicha qayerga yetgani
+            total INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            status_message_id INTEGER,  -- Admin chatidagi jarayon xabari
+            heartbeat_at TIMESTAMP,  -- Ishlayotgan jarayon belgisi
+            claimed_by TEXT,  -- Vazifani egallagan jarayon (har bir egallashda yangi)
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        );
+        
+        -- Oldin yaratilgan bazalar uchun
+        ALTER TABLE broadcast_jobs ADD COLUMN IF NOT EXISTS claimed_by TEXT;
+        
+        -- Index qo'shish
+        CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status ON broadcast_jobs(status);
+        """
+        
+        await self.connection.execute(query)
+        print("✅ Broadcast jobs jadvali yaratildi")
+    
+    async def create_job_leases_table(self) -> None:
+        """Fon vazifalari lease jadvalini yaratish (bir nechta jarayondan bittasi bajaradi)"""
+        query = """
+        CREATE TABLE IF NOT EXISTS job_leases (
+            name TEXT PRIMARY KEY,  -- Vazifa nomi
+            holder TEXT NOT NULL,  -- Egallagan jarayon
+            expires_at TIMESTAMP NOT NULL  -- Shundan keyin boshqa jarayon olishi mumkin
+        );
+        """
+        
+        await self.connection.execute(query)
+        print("✅ Job leases jadvali yaratildi")
+    
     async def create_admin_users(self) -> None:
         """Admin foydalanuvchilarni yaratish"""
         if not settings.admin_ids:
@@ -195,9 +325,14 @@ class DatabaseCreator:
         try:
             await self.create_users_table()
             await self.create_movie_table()
+            await self.create_movie_search_indexes()
             await self.create_channel_table()
             await self.create_joined_user_channel_table()
             await self.create_movie_views_table()
+            await self.create_analytics_tables()
+            await self.create_fsm_storage_table()
+            await self.create_broadcast_jobs_table()
+            await self.create_job_leases_table()
             
             print("\n📋 Admin foydalanuvchilarni yaratish...")
             await self.create_admin_users()
@@ -223,7 +358,7 @@ class DatabaseCreator:
         await self.connect()
         
         try:
-            tables = ['movie_views', 'joineduserannel', 'channel', 'movie', 'users']
+            tables = ['job_leases', 'broadcast_jobs', 'fsm_storage', 'analytics_rollup_state', 'user_views_daily', 'movie_views_daily', 'movie_views', 'joineduserannel', 'channel', 'movie', 'users']
             
             for table in tables:
                 await self.connection.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
@@ -0,0 +1,219 @@
+"""
+Ma'lumotlar bazasini oqimli eksport qilish (NDJSON, gzip)
+
+Har bir jadval server tomonidagi cursor orqali paket-paket o'qiladi va
+darhol faylga yoziladi - xotira sarfi jadval hajmiga bog'liq emas.
+
+Fayl formati (har qatorda bitta JSON):
+    {"format": "kinobot-export", "version": 1, "created_at": "...", "tables": [...]}
+    {"table": "users", "columns": [...], "types": [...]}
+    [1, 123456789, "Ali", false, "2024-01-01T10:00:00", ...]
+    ...
+    {"table": "users", "rows": 1234}
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+from .connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT = "kinobot-export"
+EXPORT_VERSION = 1
+
+# Jadvallar tartibi muhim: tiklashda avval bog'lanilgan jadvallar yuklanadi.
+# Kunlik yig'indilar eksport qilinmaydi - ular movie_views dan qayta yig'iladi.
+EXPORT_TABLES = ("users", "movie", "channel", "joineduserannel", "movie_views")
+
+ProgressCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return str(value)
+
+
+def _dump(value: Any) -> str:
+    return json.dumps(value, default=_json_default, ensure_ascii=False, separators=(',', ':'))
+
+
+class DataExporter:
+    """Barcha jadvallarni bitta izchil snapshot dan faylga yozish"""
+
+    ESTIMATE_QUERY = "SELECT relname, reltuples::bigint AS rows FROM pg_class WHERE relname = ANY($1::text[])"
+
+    def __init__(self, export_dir: str = "exports", batch_size: int = 5000,
+                 compress: bool = True, progress_interval: float = 3.0):
+        self.export_dir = export_dir
+        self.batch_size = batch_size
+        self.compress = compress
+        self.progress_interval = progress_interval
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    @property
+    def is_running(self) -> bool:
+        return self.lock.locked()
+
+    def _new_path(self) -> str:
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        extension = "ndjson.gz" if self.compress else "ndjson"
+        return os.path.join(self.export_dir, f"backup_{timestamp}.{extension}")
+
+    def _open(self, path: str):
+        if self.compress:
+            return gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+        return open(path, 'w', encoding='utf-8')
+
+    async def _report(self, progress: Optional[ProgressCallback], state: Dict[str, Any]) -> None:
+        if progress is None:
+            return
+        try:
+            await progress({**state, "completed": dict(state['completed'])})
+        except Exception as e:
+            # Xabarni yangilab bo'lmasa ham eksport davom etadi
+            logger.warning(f"Export progress callback error: {e}")
+
+    async def _export_table(self, conn, file, table: str, state: Dict[str, Any],
+                            progress: Optional[ProgressCallback]) -> int:
+        """Bitta jadvalni cursor orqali yozish; yozilgan qatorlar sonini qaytaradi"""
+        statement = await conn.prepare(f"SELECT * FROM {table} ORDER BY id")
+        attributes = statement.get_attributes()
+
+        header = {
+            "table": table,
+            "columns": [attribute.name for attribute in attributes],
+            "types": [attribute.type.name for attribute in attributes]
+        }
+        await asyncio.to_thread(file.write, _dump(header) + "\n")
+
+        rows = 0
+        next_report = time.monotonic() + self.progress_interval
+        cursor = await statement.cursor()
+
+        while True:
+            records = await cursor.fetch(self.batch_size)
+            if not records:
+                break
+
+            chunk = "".join(_dump(list(record.values())) + "\n" for record in records)
+            await asyncio.to_thread(file.write, chunk)
+
+            rows += len(records)
+            state['table_rows'] = rows
+            state['total_rows'] += len(records)
+
+            if time.monotonic() >= next_report:
+                next_report = time.monotonic() + self.progress_interval
+                await self._report(progress, state)
+
+        await asyncio.to_thread(file.write, _dump({"table": table, "rows": rows}) + "\n")
+        return rows
+
+    async def export(self, progress: Optional[ProgressCallback] = None,
+                     tables: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Eksport faylini yaratish
+
+        Args:
+            progress: Jarayon haqida xabar beruvchi funksiya (progress_interval da bir marta)
+            tables: Eksport qilinadigan jadvallar (standart - EXPORT_TABLES)
+
+        Returns:
+            Dict: path, tables (jadval -> qatorlar), total_records, export_date, size_bytes
+        """
+        tables = list(tables or EXPORT_TABLES)
+
+        async with self.lock:
+            os.makedirs(self.export_dir, exist_ok=True)
+            path = self._new_path()
+            export_date = datetime.now()
+
+            state = {
+                "table": None,
+                "table_rows": 0,
+                "table_estimate": None,
+                "total_rows": 0,
+                "completed": {},
+                "started_at": time.monotonic()
+            }
+
+            db = get_db_connection()
+            file = await asyncio.to_thread(self._open, path)
+            try:
+                async with db.get_connection(analytics=True) as conn:
+                    # Barcha jadvallar bir xil holatda o'qiladi
+                    async with conn.transaction(isolation='repeatable_read', readonly=True):
+                        estimates = {
+                            record['relname']: record['rows']
+                            for record in await conn.fetch(self.ESTIMATE_QUERY, tables)
+                        }
+
+                        await asyncio.to_thread(file.write, _dump({
+                            "format": EXPORT_FORMAT,
+                            "version": EXPORT_VERSION,
+                            "created_at": export_date,
+                            "tables": tables
+                        }) + "\n")
+
+                        for table in tables:
+                            estimate = estimates.get(table)
+                            state.update(
+                                table=table,
+                                table_rows=0,
+                                table_estimate=estimate if estimate and estimate > 0 else None
+                            )
+                            await self._report(progress, state)
+
+                            rows = await self._export_table(conn, file, table, state, progress)
+                            state['completed'][table] = rows
+            except BaseException:
+                await asyncio.to_thread(file.close)
+                await asyncio.to_thread(self._remove, path)
+                raise
+
+            await asyncio.to_thread(file.close)
+
+            result = {
+                "path": path,
+                "tables": dict(state['completed']),
+                "total_records": state['total_rows'],
+                "export_date": export_date.isoformat(),
+                "size_bytes": os.path.getsize(path),
+                "duration": round(time.monotonic() - state['started_at'], 1)
+            }
+            logger.info(f"✅ Eksport tayyor: {path} ({result['total_records']} yozuv)")
+            return result
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Global data exporter instance
+data_exporter = DataExporter(
+    export_dir=settings.export_dir,
+    batch_size=settings.export_batch_size,
+    compress=settings.export_compress,
+    progress_interval=settings.export_progress_interval
+)
@@ -0,0 +1,186 @@
+"""
+Kanal a'zoligi o'zgarishlarini (chat_member update lar) paketlab yozish
+
+Bot majburiy kanalda admin bo'lsa, Telegram har bir obuna/chiqishni
+chat_member update sifatida yuboradi. Oxirgi holat (tg_id, kanal) bo'yicha
+xotirada jamlanadi va joineduserannel ga bitta tranzaksiyada yoziladi.
+"""
+
+import asyncio
+import logging
+from typing import Dict, Optional, Set
+
+from app.config import settings
+from .connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+class MembershipWriter:
+    """joineduserannel uchun a'zolik hodisalari buferi"""
+
+    # Botda ro'yxatdan o'tmagan foydalanuvchilar va ro'yxatda yo'q kanallar tashlab ketiladi
+    UPSERT_QUERY = """
+    INSERT INTO joineduserannel (user_id, channel_id)
+    SELECT u.id, c.id
+    FROM unnest($1::bigint[], $2::bigint[]) AS m(tg_id, chat_id)
+    JOIN users u ON u.tg_id = m.tg_id
+    JOIN channel c ON c.channel_id = m.chat_id
+    ON CONFLICT (user_id, channel_id) DO UPDATE SET verified_at = CURRENT_TIMESTAMP
+    """
+
+    DELETE_QUERY = """
+    DELETE FROM joineduserannel AS j
+    USING unnest($1::bigint[], $2::bigint[]) AS m(tg_id, chat_id), users u, channel c
+    WHERE u.tg_id = m.tg_id
+      AND c.channel_id = m.chat_id
+      AND j.user_id = u.id
+      AND j.channel_id = c.id
+    """
+
+    def __init__(self, flush_interval: float = 2.0, max_pending: int = 10000,
+                 trust_ttl: float = 86400.0):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # Shundan eski tasdiqlangan yozuvlar bo'yicha Telegram qayta so'raladi
+        self.trust_ttl = trust_ttl
+        self.joins = 0
+        self.leaves = 0
+        # tg_id -> {kanal chat_id -> a'zomi}
+        self._pending: Dict[int, Dict[int, bool]] = {}
+        self._pending_count = 0
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def flush_lock(self) -> asyncio.Lock:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        return self._flush_lock
+
+    @property
+    def wakeup(self) -> asyncio.Event:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+    @property
+    def pending_count(self) -> int:
+        """Yozilishini kutayotgan o'zgarishlar soni"""
+        return self._pending_count
+
+    def record(self, tg_id: int, chat_id: int, is_member: bool) -> None:
+        """A'zolik holatini qayd etish (DB ga darhol yozilmaydi)"""
+        changes = self._pending.setdefault(tg_id, {})
+        if chat_id not in changes:
+            self._pending_count += 1
+        changes[chat_id] = is_member
+
+        if is_member:
+            self.joins += 1
+        else:
+            self.leaves += 1
+
+        if self._pending_count >= self.max_pending:
+            self.wakeup.set()
+
+    def pending_status(self, tg_id: int, chat_id: int) -> Optional[bool]:
+        """Hali yozilmagan oxirgi holat (bo'lmasa None)"""
+        return self._pending.get(tg_id, {}).get(chat_id)
+
+    async def joined_chat_ids(self, tg_id: int) -> Set[int]:
+        """Foydalanuvchi a'zo bo'lgan kanallar (Telegram chat_id) - DB va hali yozilmagan o'zgarishlar"""
+        db = get_db_connection()
+        records = await db.fetch_prepared('user_joined_chat_ids', tg_id, self.trust_ttl)
+        joined = {record['channel_id'] for record in records}
+
+        for chat_id, is_member in self._pending.get(tg_id, {}).items():
+            if is_member:
+                joined.add(chat_id)
+            else:
+                joined.discard(chat_id)
+        return joined
+
+    async def flush(self) -> int:
+        """Jamlangan o'zgarishlarni bitta tranzaksiyada yozish"""
+        async with self.flush_lock:
+            if not self._pending:
+                return 0
+
+            batch, self._pending = self._pending, {}
+            self._pending_count = 0
+
+            joined = ([], [])
+            left = ([], [])
+            for tg_id, changes in batch.items():
+                for chat_id, is_member in changes.items():
+                    target = joined if is_member else left
+                    target[0].append(tg_id)
+                    target[1].append(chat_id)
+
+            try:
+                db = get_db_connection()
+                async with db.get_connection() as conn:
+                    async with conn.transaction():
+                        if left[0]:
+                            await conn.execute(self.DELETE_QUERY, *left)
+                        if joined[0]:
+                            await conn.execute(self.UPSERT_QUERY, *joined)
+                logger.debug(f"Membership flush: +{len(joined[0])} / -{len(left[0])}")
+                return len(joined[0]) + len(left[0])
+
+            except Exception as e:
+                logger.error(f"Membership flush error: {e}")
+
+                # Yozilmagan o'zgarishlarni qaytarish (yangilarini ustun qo'yib)
+                for tg_id, changes in batch.items():
+                    current = self._pending.setdefault(tg_id, {})
+                    for chat_id, is_member in changes.items():
+                        if chat_id not in current:
+                            current[chat_id] = is_member
+                            self._pending_count += 1
+                return 0
+
+    async def _run(self) -> None:
+        """Davriy flush sikli"""
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self.wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        """Fon vazifasini ishga tushirish"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Fon vazifasini to'xtatish va qolganlarini yozish"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "joins": self.joins,
+            "leaves": self.leaves,
+            "pending": self._pending_count
+        }
+
+
+# Global membership writer instance
+membership_writer = MembershipWriter(
+    flush_interval=settings.membership_flush_interval,
+    max_pending=settings.membership_buffer_max_size,
+    trust_ttl=settings.membership_trust_ttl
+)
@@ -3,7 +3,7 @@ SQLAlchemy modellari (ma'lumotlar strukturasi)
 """
 
 from datetime import datetime
-from typing import Optional, List, Union
+from typing import Optional, List, Set, Union
 from dataclasses import dataclass
 from enum import Enum
 
@@ -262,7 +262,12 @@ class UserChannelInfo:
     """Foydalanuvchi va kanal ma'lumotlari"""
     user: User
     channels: List[Channel]
-    joined_channels: List[int]  # joined channel IDs
+    joined_channels: Set[int]  # joined channel IDs
+    
+    def __post_init__(self):
+        # O(1) tekshirish uchun set ga aylantirish
+        if not isinstance(self.joined_channels, set):
+            self.joined_channels = set(self.joined_channels)
     
     def get_unjoined_channels(self) -> List[Channel]:
         """Obuna bo'lmagan kanallar ro'yxati"""
@@ -270,8 +275,7 @@ class UserChannelInfo:
     
     def is_subscribed_to_all(self) -> bool:
         """Barcha kanallarga obuna bo'lgan yoki yo'qligini tekshirish"""
-        active_channels = [ch for ch in self.channels if ch.is_active()]
-        return len(self.get_unjoined_channels()) == 0
+        return all(ch.id in self.joined_channels for ch in self.channels)
 
 
 @dataclass
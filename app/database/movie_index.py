@@ -0,0 +1,172 @@
+"""
+Kino kodlari indeksi (code -> Movie) - jarayon xotirasida
+"""
+
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional
+
+from app.config import settings
+from .cache import TTLCache
+from .connection import get_db_connection
+from .models import Movie
+from .search_index import MovieSearchIndex
+
+logger = logging.getLogger(__name__)
+
+
+class MovieCodeIndex:
+    """
+    Katalogning xotiradagi nusxasi
+
+    Ishga tushishda to'liq yuklanadi, keyin id watermark bo'yicha yangi
+    kinolar qo'shib boriladi. Boshqa jarayonlardagi tahrir/o'chirishlarni
+    olish uchun vaqti-vaqti bilan to'liq qayta yuklanadi.
+    """
+
+    def __init__(self, refresh_interval: float = 30.0, full_reload_interval: float = 600.0,
+                 negative_ttl: float = 30.0, search_index: bool = True):
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self._by_code: Dict[str, Movie] = {}
+        self._by_id: Dict[int, Movie] = {}
+        self._watermark_id = 0
+        self._loaded = False
+        self._task: Optional[asyncio.Task] = None
+        # Mavjud bo'lmagan kodlar (spam kodlar DB ni qayta-qayta urmasligi uchun)
+        self._missing = TTLCache(maxsize=10000, ttl=negative_ttl)
+        # Nomlar bo'yicha qidiruv - faqat pg_trgm bo'lmagan bazalar uchun start() da yaratiladi
+        self.search_index_enabled = search_index
+        self.search: Optional[MovieSearchIndex] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def get_by_code(self, code: str) -> Optional[Movie]:
+        """Kod bo'yicha kino (faqat xotiradan)"""
+        return self._by_code.get(code)
+
+    def get_by_id(self, movie_id: int) -> Optional[Movie]:
+        """ID bo'yicha kino (faqat xotiradan)"""
+        return self._by_id.get(movie_id)
+
+    def is_known_missing(self, code: str) -> bool:
+        """Kod yaqinda DB da ham topilmaganmi"""
+        return self._missing.get(code) is not None
+
+    def mark_missing(self, code: str) -> None:
+        self._missing.set(code, True)
+
+    def add(self, movie: Movie) -> None:
+        """Kinoni indeksga qo'shish yoki yangilash"""
+        old = self._by_id.get(movie.id)
+        if old and old.code != movie.code:
+            self._by_code.pop(old.code, None)
+
+        self._by_id[movie.id] = movie
+        self._by_code[movie.code] = movie
+        self._missing.invalidate(movie.code)
+        self._watermark_id = max(self._watermark_id, movie.id)
+        if self.search is not None:
+            self.search.add(movie)
+
+    def remove(self, movie_id: int) -> None:
+        """Kinoni indeksdan olib tashlash"""
+        movie = self._by_id.pop(movie_id, None)
+        if movie:
+            self._by_code.pop(movie.code, None)
+        if self.search is not None:
+            self.search.remove(movie_id)
+
+    def apply_view_counts(self, views_per_movie: Dict[int, int]) -> None:
+        """Yozilgan ko'rishlarni indeksdagi view_count ga qo'shish"""
+        for movie_id, views in views_per_movie.items():
+            movie = self._by_id.get(movie_id)
+            if movie:
+                movie.view_count += views
+
+    def _replace_all(self, movies: Iterable[Movie]) -> None:
+        by_id = {movie.id: movie for movie in movies}
+        self._by_id = by_id
+        self._by_code = {movie.code: movie for movie in by_id.values()}
+        self._watermark_id = max(by_id.keys(), default=0)
+        if self.search is not None:
+            self.search.sync(by_id.values())
+        self._loaded = True
+
+    async def load(self) -> None:
+        """Butun katalogni yuklash"""
+        db = get_db_connection()
+        records = await db.fetch("SELECT * FROM movie ORDER BY id")
+        self._replace_all(Movie.from_record(record) for record in records)
+        logger.info(f"✅ Kino indeksi yuklandi: {len(self._by_id)} ta kino")
+
+    async def refresh(self) -> int:
+        """Watermark dan keyingi yangi kinolarni qo'shish"""
+        db = get_db_connection()
+        records = await db.fetch(
+            "SELECT * FROM movie WHERE id > $1 ORDER BY id",
+            self._watermark_id
+        )
+        for record in records:
+            self.add(Movie.from_record(record))
+        return len(records)
+
+    async def _run(self) -> None:
+        """Davriy yangilash sikli"""
+        loop = asyncio.get_running_loop()
+        next_full_reload = loop.time() + self.full_reload_interval
+
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                if loop.time() >= next_full_reload:
+                    await self.load()
+                    next_full_reload = loop.time() + self.full_reload_interval
+                else:
+                    await self.refresh()
+            except Exception as e:
+                logger.error(f"Movie index refresh error: {e}")
+
+    async def _needs_search_index(self) -> bool:
+        """Xotiradagi qidiruv indeksi kerakmi (pg_trgm bo'lsa qidiruv SQL da)"""
+        if not self.search_index_enabled:
+            return False
+
+        from .queries import DatabaseQueries
+        try:
+            return not await DatabaseQueries().has_trigram_search()
+        except Exception as e:
+            logger.warning(f"pg_trgm tekshirilmadi, qidiruv indeksi quriladi: {e}")
+            return True
+
+    async def start(self) -> None:
+        """Indeksni yuklash va fon yangilanishini boshlash"""
+        if self.search is None and await self._needs_search_index():
+            self.search = MovieSearchIndex()
+        await self.load()
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Fon yangilanishini to'xtatish"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global movie index instance
+movie_index = MovieCodeIndex(
+    refresh_interval=settings.movie_index_refresh_interval,
+    full_reload_interval=settings.movie_index_full_reload_interval,
+    search_index=settings.movie_search_index
+)
@@ -7,15 +7,37 @@ from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any, Tuple
 import asyncpg
 
+from app.config import settings
+from .activity import activity_buffer
+from .cache import user_cache
+from .channel_registry import channel_registry
 from .connection import get_db_connection
+from .movie_index import movie_index
+from .stats_snapshot import platform_stats
+from .view_writer import view_writer
 from .models import User, Movie, Channel, JoinedUserChannel, MovieView, UserChannelInfo, MovieStats
 
 logger = logging.getLogger(__name__)
 
 
+# Keyset sahifalash: birinchi sahifa kursori (barcha kalitlardan katta)
+FIRST_PAGE_CURSORS = {
+    "popular": (2**31 - 1, 2**31 - 1),
+    "recent": (datetime.max, 2**31 - 1),
+}
+
+
+def escape_like(text: str) -> str:
+    """LIKE/ILIKE namunasidagi maxsus belgilarni (%, _, \\) ekranlash"""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
 class DatabaseQueries:
     """Ma'lumotlar bazasi so'rovlari sinfi"""
     
+    # pg_trgm mavjudligi (birinchi qidiruvda aniqlanadi)
+    _trigram_search: Optional[bool] = None
+    
     def __init__(self):
         self.db = get_db_connection()
     
@@ -23,39 +45,35 @@ class DatabaseQueries:
     
     async def create_user(self, tg_id: int, full_name: str, is_admin: bool = False) -> User:
         """Yangi foydalanuvchi yaratish"""
-        query = """
-        INSERT INTO users (tg_id, full_name, is_admin)
-        VALUES ($1, $2, $3)
-        ON CONFLICT (tg_id) 
-        DO UPDATE SET 
-            full_name = EXCLUDED.full_name,
-            last_activity = CURRENT_TIMESTAMP
-        RETURNING *
-        """
+        record = await self.db.fetchrow_prepared('create_user', tg_id, full_name, is_admin)
+        user = User.from_record(record)
         
-        record = await self.db.fetchrow(query, tg_id, full_name, is_admin)
-        return User.from_record(record)
+        # Keshni yangi ma'lumot bilan yangilash
+        user_cache.set(tg_id, user)
+        return user
     
     async def get_user_by_tg_id(self, tg_id: int) -> Optional[User]:
-        """Telegram ID bo'yicha foydalanuvchini topish"""
-        query = "SELECT * FROM users WHERE tg_id = $1"
-        record = await self.db.fetchrow(query, tg_id)
-        return User.from_record(record) if record else None
+        """Telegram ID bo'yicha foydalanuvchini topish (kesh orqali)"""
+        user = user_cache.get(tg_id)
+        if user is not None:
+            return user
+        
+        record = await self.db.fetchrow_prepared('user_by_tg_id', tg_id)
+        if not record:
+            return None
+        
+        user = User.from_record(record)
+        user_cache.set(tg_id, user)
+        return user
     
     async def get_user_by_id(self, user_id: int) -> Optional[User]:
         """ID bo'yicha foydalanuvchini topish"""
-        query = "SELECT * FROM users WHERE id = $1"
-        record = await self.db.fetchrow(query, user_id)
+        record = await self.db.fetchrow_prepared('user_by_id', user_id)
         return User.from_record(record) if record else None
     
     async def update_user_activity(self, tg_id: int) -> None:
-        """Foydalanuvchi faoliyatini yangilash"""
-        query = """
-        UPDATE users 
-        SET last_activity = CURRENT_TIMESTAMP 
-        WHERE tg_id = $1
-        """
-        await self.db.execute(query, tg_id)
+        """Foydalanuvchi faoliyatini yangilash (bufer orqali, paketlab yoziladi)"""
+        activity_buffer.touch(tg_id)
     
     async def get_all_users(self, limit: int = 100, offset: int = 0) -> List[User]:
         """Barcha foydalanuvchilar ro'yxati"""
@@ -81,8 +99,24 @@ class DatabaseQueries:
         WHERE tg_id = $1
         """
         result = await self.db.execute(query, tg_id, is_admin)
+        
+        # Admin huquqi o'zgardi - keshdagi yozuv eskirdi
+        user_cache.invalidate(tg_id)
         return "UPDATE 1" in result
     
+    async def check_user_admin(self, tg_id: int) -> bool:
+        """
+        Admin huquqini keshsiz tekshirish
+        
+        user_cache jarayon ichida - boshqa jarayonda (shard/webhook worker)
+        huquqi olingan admin keshda user_cache_ttl gacha admin bo'lib qoladi.
+        Shuning uchun keshdagi "admin" javobi DB dan tasdiqlanadi.
+        """
+        is_admin = bool(await self.db.fetchval_prepared('user_is_admin', tg_id))
+        if not is_admin:
+            user_cache.invalidate(tg_id)
+        return is_admin
+    
     async def get_users_count(self) -> int:
         """Jami foydalanuvchilar soni"""
         query = "SELECT COUNT(*) FROM users"
@@ -98,51 +132,120 @@ class DatabaseQueries:
         RETURNING *
         """
         record = await self.db.fetchrow(query, file_id, code, title, description, private_message_id)
-        return Movie.from_record(record)
+        movie = Movie.from_record(record)
+        
+        # Indeksga darhol qo'shish
+        movie_index.add(movie)
+        return movie
         
     async def get_movie_by_code(self, code: str) -> Optional[Movie]:
-        """Kod bo'yicha kino topish"""
-        query = "SELECT * FROM movie WHERE code = $1"
-        record = await self.db.fetchrow(query, code)
-        return Movie.from_record(record) if record else None
+        """Kod bo'yicha kino topish (xotiradagi indeks orqali)"""
+        movie = movie_index.get_by_code(code)
+        if movie is not None:
+            return movie
+        
+        # Yaqinda topilmagan kod - DB ga qayta murojaat qilmaslik
+        if movie_index.is_known_missing(code):
+            return None
+        
+        # Boshqa jarayonda hozirgina qo'shilgan bo'lishi mumkin
+        record = await self.db.fetchrow_prepared('movie_by_code', code)
+        if not record:
+            movie_index.mark_missing(code)
+            return None
+        
+        movie = Movie.from_record(record)
+        movie_index.add(movie)
+        return movie
     
     async def get_movie_by_id(self, movie_id: int) -> Optional[Movie]:
         """ID bo'yicha kino topish"""
-        query = "SELECT * FROM movie WHERE id = $1"
-        record = await self.db.fetchrow(query, movie_id)
-        return Movie.from_record(record) if record else None
+        movie = movie_index.get_by_id(movie_id)
+        if movie is not None:
+            return movie
+        
+        record = await self.db.fetchrow_prepared('movie_by_id', movie_id)
+        if not record:
+            return None
+        
+        movie = Movie.from_record(record)
+        movie_index.add(movie)
+        return movie
     
-    async def search_movies(self, search_term: str, limit: int = 10) -> List[Movie]:
-        """Kino qidirish (nom bo'yicha)"""
-        query = """
-        SELECT * FROM movie 
-        WHERE title ILIKE $1 
-        ORDER BY view_count DESC 
-        LIMIT $2
+    async def has_trigram_search(self) -> bool:
+        """pg_trgm kengaytmasi o'rnatilganmi (jarayon davomida bir marta tekshiriladi)"""
+        if DatabaseQueries._trigram_search is None:
+            DatabaseQueries._trigram_search = await self.db.fetchval(
+                "SELECT EXISTS(SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"
+            )
+        return DatabaseQueries._trigram_search
+    
+    async def search_movies(self, search_term: str, limit: int = 10, year: Optional[int] = None,
+                            min_views: Optional[int] = None, max_views: Optional[int] = None) -> List[Movie]:
         """
-        records = await self.db.fetch(query, f"%{search_term}%", limit)
+        Kino qidirish (nom va tavsif bo'yicha)
+        
+        pg_trgm bo'lsa GIN indeks orqali, imlo xatolariga chidamli va
+        o'xshashlik + mashhurlik bo'yicha tartiblangan. Aks holda nomlar
+        xotiradagi indeksda (prefiks, kirill/lotin, xatolarga chidamli),
+        u o'chirilgan bo'lsa ILIKE. Filtrlar (yil, ko'rishlar) SQL da qo'llanadi.
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return []
+        
+        pattern = f"%{escape_like(search_term)}%"
+        if await self.has_trigram_search():
+            records = await self.db.fetch_prepared(
+                'search_movies_ranked', search_term, pattern, limit,
+                year, min_views, max_views, settings.search_popularity_weight
+            )
+        elif movie_index.search is not None and movie_index.is_loaded:
+            return movie_index.search.search(search_term, limit, year, min_views, max_views)
+        else:
+            records = await self.db.fetch_prepared('search_movies', pattern, limit, year, min_views, max_views)
         return [Movie.from_record(record) for record in records]
     
     async def get_popular_movies(self, limit: int = 10) -> List[Movie]:
         """Mashhur kinolar ro'yxati"""
-        query = """
-        SELECT * FROM movie 
-        ORDER BY view_count DESC 
-        LIMIT $1
-        """
-        records = await self.db.fetch(query, limit)
+        records = await self.db.fetch_prepared('popular_movies', limit)
         return [Movie.from_record(record) for record in records]
     
     async def get_recent_movies(self, limit: int = 10) -> List[Movie]:
         """Yangi qo'shilgan kinolar"""
-        query = """
-        SELECT * FROM movie 
-        ORDER BY created_at DESC 
-        LIMIT $1
-        """
-        records = await self.db.fetch(query, limit)
+        records = await self.db.fetch_prepared('recent_movies', limit)
         return [Movie.from_record(record) for record in records]
     
+    @staticmethod
+    def page_cursor(order: str, movie: Movie) -> Tuple[Any, int]:
+        """Sahifa chetidagi kinoning keyset kaliti"""
+        if order == "popular":
+            return movie.view_count, movie.id
+        return movie.created_at, movie.id
+    
+    async def get_movies_page(self, order: str, limit: int = 10, cursor: Optional[Tuple[Any, int]] = None,
+                              before: bool = False) -> Tuple[List[Movie], bool]:
+        """
+        Mashhur (view_count, id) yoki yangi (created_at, id) kinolar sahifasi
+        
+        cursor - keyingi sahifa uchun oldingi sahifaning oxirgi kinosi kaliti,
+        before=True bo'lsa birinchisi (orqaga). OFFSET ishlatilmaydi - chuqur
+        sahifalar ham birinchisi kabi indeksdan o'qiladi.
+        Qaytaradi: (kinolar, shu yo'nalishda yana sahifa bormi)
+        """
+        if order not in FIRST_PAGE_CURSORS:
+            raise ValueError(f"Noma'lum tartib: {order}")
+        if cursor is None:
+            cursor = FIRST_PAGE_CURSORS[order]
+            before = False
+        
+        name = f"{order}_movies_{'before' if before else 'after'}"
+        records = await self.db.fetch_prepared(name, *cursor, limit + 1)
+        movies = [Movie.from_record(record) for record in records[:limit]]
+        if before:
+            movies.reverse()
+        return movies, len(records) > limit
+    
     async def update_movie(self, movie_id: int, **kwargs) -> bool:
         """Kino ma'lumotlarini yangilash"""
         if not kwargs:
@@ -150,16 +253,22 @@ class DatabaseQueries:
         
         # Dinamik UPDATE query yaratish
         set_clause = ", ".join([f"{key} = ${i+2}" for i, key in enumerate(kwargs.keys())])
-        query = f"UPDATE movie SET {set_clause} WHERE id = $1"
+        query = f"UPDATE movie SET {set_clause} WHERE id = $1 RETURNING *"
         
         values = [movie_id] + list(kwargs.values())
-        result = await self.db.execute(query, *values)
-        return "UPDATE 1" in result
+        record = await self.db.fetchrow(query, *values)
+        if not record:
+            return False
+        
+        # Indeksdagi nusxani yangilash
+        movie_index.add(Movie.from_record(record))
+        return True
     
     async def delete_movie(self, movie_id: int) -> bool:
         """Kinoni o'chirish"""
         query = "DELETE FROM movie WHERE id = $1"
         result = await self.db.execute(query, movie_id)
+        movie_index.remove(movie_id)
         return "DELETE 1" in result
     
     async def increment_movie_views(self, movie_id: int) -> None:
@@ -187,6 +296,7 @@ class DatabaseQueries:
         RETURNING *
         """
         record = await self.db.fetchrow(query, channel_id, title, channel_link, channel_username, status)
+        channel_registry.invalidate()
         return Channel.from_record(record)
     
     async def get_all_channels(self) -> List[Channel]:
@@ -196,10 +306,8 @@ class DatabaseQueries:
         return [Channel.from_record(record) for record in records]
     
     async def get_active_channels(self) -> List[Channel]:
-        """Faol kanallar ro'yxati"""
-        query = "SELECT * FROM channel WHERE status = 'aktiv' ORDER BY created_at DESC"
-        records = await self.db.fetch(query)
-        return [Channel.from_record(record) for record in records]
+        """Faol kanallar ro'yxati (xotiradagi registry orqali)"""
+        return await channel_registry.get_active_channels()
     
     async def get_channel_by_id(self, id: int) -> Optional[Channel]:
         """ID bo'yicha kanal topish"""
@@ -231,12 +339,14 @@ class DatabaseQueries:
         WHERE id = $1
         """
         result = await self.db.execute(query, channel_id, status)
+        channel_registry.invalidate()
         return "UPDATE 1" in result
     
     async def delete_channel(self, channel_id: int) -> bool:
         """Kanalni o'chirish"""
         query = "DELETE FROM channel WHERE id = $1"
         result = await self.db.execute(query, channel_id)
+        channel_registry.invalidate()
         return "DELETE 1" in result
     
     # ==================== SUBSCRIPTION QUERIES ====================
@@ -246,20 +356,12 @@ class DatabaseQueries:
         query = """
         INSERT INTO joineduserannel (user_id, channel_id)
         VALUES ($1, $2)
-        ON CONFLICT (user_id, channel_id) DO NOTHING
+        ON CONFLICT (user_id, channel_id)
+        DO UPDATE SET verified_at = CURRENT_TIMESTAMP
         RETURNING *
         """
         record = await self.db.fetchrow(query, user_id, channel_id)
-        if record:
-            return JoinedUserChannel.from_record(record)
-        
-        # Agar conflict bo'lsa, mavjud recordni qaytarish
-        existing_query = """
-        SELECT * FROM joineduserannel 
-        WHERE user_id = $1 AND channel_id = $2
-        """
-        existing_record = await self.db.fetchrow(existing_query, user_id, channel_id)
-        return JoinedUserChannel.from_record(existing_record)
+        return JoinedUserChannel.from_record(record)
     
     async def remove_user_from_channel(self, user_id: int, channel_id: int) -> bool:
         """Foydalanuvchini kanaldan chiqarish"""
@@ -279,16 +381,21 @@ class DatabaseQueries:
         records = await self.db.fetch(query, user_id)
         return [record['channel_id'] for record in records]
     
-    async def check_user_subscription(self, user_id: int) -> UserChannelInfo:
-        """Foydalanuvchi obuna holatini tekshirish"""
-        # Barcha faol kanallar
-        active_channels = await self.get_active_channels()
+    async def check_user_subscription(self, user_id: int, user: Optional[User] = None) -> UserChannelInfo:
+        """Foydalanuvchi obuna holatini tekshirish
+        
+        Faol kanallar va foydalanuvchining obunalari bitta so'rovda olinadi.
+        Chaqiruvchida foydalanuvchi allaqachon bo'lsa, uni `user` orqali uzating.
+        """
+        # Uzoq vaqt tasdiqlanmagan a'zolik hisobga olinmaydi (obunani qayta tekshirish kerak)
+        records = await self.db.fetch_prepared('user_subscription', user_id, settings.membership_trust_ttl)
         
-        # Foydalanuvchi obuna bo'lgan kanallar
-        joined_channel_ids = await self.get_user_channels(user_id)
+        active_channels = [Channel.from_record(record) for record in records]
+        joined_channel_ids = {record['id'] for record in records if record['is_joined']}
         
-        # Foydalanuvchi ma'lumotlari
-        user = await self.get_user_by_id(user_id)
+        # Foydalanuvchi ma'lumotlari (uzatilmagan bo'lsa)
+        if user is None:
+            user = await self.get_user_by_id(user_id)
         
         return UserChannelInfo(
             user=user,
@@ -320,30 +427,17 @@ class DatabaseQueries:
     # ==================== MOVIE VIEWS QUERIES ====================
     
     async def add_movie_view(self, user_id: int, movie_id: int) -> MovieView:
-        """Kino ko'rishni qayd etish"""
-        query = """
-        INSERT INTO movie_views (user_id, movie_id)
-        VALUES ($1, $2)
-        RETURNING *
-        """
-        record = await self.db.fetchrow(query, user_id, movie_id)
-        
-        # Ko'rish sonini ham oshirish
-        await self.increment_movie_views(movie_id)
+        """Kino ko'rishni qayd etish
         
-        return MovieView.from_record(record)
+        Ko'rish navbatga qo'yiladi; movie_views va view_count fon yozuvchisi
+        tomonidan paketlab yoziladi.
+        """
+        await view_writer.enqueue(user_id, movie_id)
+        return MovieView(user_id=user_id, movie_id=movie_id)
     
     async def get_user_movie_history(self, user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
         """Foydalanuvchi kino ko'rish tarixi"""
-        query = """
-        SELECT mv.*, m.title, m.code, m.description
-        FROM movie_views mv
-        JOIN movie m ON mv.movie_id = m.id
-        WHERE mv.user_id = $1
-        ORDER BY mv.viewed_at DESC
-        LIMIT $2
-        """
-        records = await self.db.fetch(query, user_id, limit)
+        records = await self.db.fetch_prepared('user_movie_history', user_id, limit)
         return [dict(record) for record in records]
     
     async def get_movie_viewers(self, movie_id: int, limit: int = 100) -> List[Dict[str, Any]]:
@@ -396,84 +490,31 @@ class DatabaseQueries:
     
     async def has_user_watched_movie(self, user_id: int, movie_id: int) -> bool:
         """Foydalanuvchi kinoni ko'rgan yoki yo'qligini tekshirish"""
-        query = """
-        SELECT EXISTS(
-            SELECT 1 FROM movie_views 
-            WHERE user_id = $1 AND movie_id = $2
-        )
-        """
-        return await self.db.fetchval(query, user_id, movie_id)
+        return await self.db.fetchval_prepared('has_user_watched_movie', user_id, movie_id)
     
     # ==================== ANALYTICS QUERIES ====================
     
     async def get_platform_statistics(self) -> Dict[str, Any]:
-        """Platforma statistikasi"""
-        stats_query = """
-        SELECT 
-            (SELECT COUNT(*) FROM users) as total_users,
-            (SELECT COUNT(*) FROM users WHERE is_admin = TRUE) as admin_count,
-            (SELECT COUNT(*) FROM movie) as total_movies,
-            (SELECT COUNT(*) FROM channel WHERE status = 'aktiv') as active_channels,
-            (SELECT COUNT(*) FROM movie_views) as total_views,
-            (SELECT COUNT(*) FROM users WHERE last_activity > NOW() - INTERVAL '24 hours') as active_users_24h,
-            (SELECT COUNT(*) FROM users WHERE created_at > NOW() - INTERVAL '7 days') as new_users_week
-        """
-        
-        result = await self.db.fetchrow(stats_query)
-        return dict(result)
+        """Platforma statistikasi (xotiradagi nusxadan, snapshot_at bilan)"""
+        return await platform_stats.get()
     
     async def get_top_movies(self, limit: int = 10, days: int = 30) -> List[Dict[str, Any]]:
-        """Top kinolar (ma'lum vaqt oralig'ida)"""
-        query = """
-        SELECT 
-            m.*,
-            COUNT(mv.id) as views_count,
-            COUNT(DISTINCT mv.user_id) as unique_viewers
-        FROM movie m
-        LEFT JOIN movie_views mv ON m.id = mv.movie_id 
-            AND mv.viewed_at > NOW() - INTERVAL '%s days'
-        GROUP BY m.id
-        ORDER BY views_count DESC, unique_viewers DESC
-        LIMIT $1
-        """ % days
-        
-        records = await self.db.fetch(query, limit)
+        """Top kinolar (ma'lum vaqt oralig'ida)
+        
+        movie_views_daily dan o'qiladi; unique_viewers - kunlik noyob
+        tomoshabinlar yig'indisi.
+        """
+        records = await self.db.fetch_prepared('top_movies', limit, days, analytics=True)
         return [dict(record) for record in records]
     
     async def get_active_users(self, days: int = 7, limit: int = 100) -> List[Dict[str, Any]]:
-        """Faol foydalanuvchilar"""
-        query = """
-        SELECT 
-            u.*,
-            COUNT(mv.id) as movies_watched,
-            MAX(mv.viewed_at) as last_movie_watch
-        FROM users u
-        LEFT JOIN movie_views mv ON u.id = mv.user_id 
-            AND mv.viewed_at > NOW() - INTERVAL '%s days'
-        WHERE u.last_activity > NOW() - INTERVAL '%s days'
-        GROUP BY u.id
-        ORDER BY movies_watched DESC, last_movie_watch DESC
-        LIMIT $1
-        """ % (days, days)
-        
-        records = await self.db.fetch(query, limit)
+        """Faol foydalanuvchilar (ko'rishlar user_views_daily dan)"""
+        records = await self.db.fetch_prepared('active_users', limit, days, analytics=True)
         return [dict(record) for record in records]
     
     async def get_daily_statistics(self, days: int = 7) -> List[Dict[str, Any]]:
-        """Kunlik statistika"""
-        query = """
-        SELECT 
-            DATE(viewed_at) as date,
-            COUNT(*) as total_views,
-            COUNT(DISTINCT user_id) as unique_users,
-            COUNT(DISTINCT movie_id) as unique_movies
-        FROM movie_views 
-        WHERE viewed_at > NOW() - INTERVAL '%s days'
-        GROUP BY DATE(viewed_at)
-        ORDER BY date DESC
-        """ % days
-        
-        records = await self.db.fetch(query)
+        """Kunlik statistika (oxirgi `days` kun, bugun ham kiradi)"""
+        records = await self.db.fetch_prepared('daily_statistics', days, analytics=True)
         return [dict(record) for record in records]
     
     # ==================== ADMIN QUERIES ====================
@@ -535,44 +576,12 @@ class DatabaseQueries:
     
     async def cleanup_old_views(self, days: int = 90) -> int:
         """Eski ko'rishlarni tozalash"""
-        query = """
-        DELETE FROM movie_views 
-        WHERE viewed_at < NOW() - INTERVAL '%s days'
-        """ % days
-        
-        result = await self.db.execute(query)
+        result = await self.db.execute_prepared('cleanup_old_views', days)
         # "DELETE X" formatidan sonni ajratib olish
         return int(result.split()[-1]) if result.startswith("DELETE") else 0
     
     # ==================== BACKUP & MAINTENANCE ====================
     
-    async def backup_data(self) -> Dict[str, Any]:
-        """Ma'lumotlarni backup qilish (JSON format)"""
-        backup_data = {}
-        
-        # Users
-        users = await self.get_all_users(limit=10000)
-        backup_data['users'] = [user.to_dict() for user in users]
-        
-        # Movies
-        movies_query = "SELECT * FROM movie ORDER BY id"
-        movies_records = await self.db.fetch(movies_query)
-        backup_data['movies'] = [dict(record) for record in movies_records]
-        
-        # Channels
-        channels = await self.get_all_channels()
-        backup_data['channels'] = [channel.to_dict() for channel in channels]
-        
-        # Subscriptions
-        subs_query = "SELECT * FROM joineduserannel ORDER BY id"
-        subs_records = await self.db.fetch(subs_query)
-        backup_data['subscriptions'] = [dict(record) for record in subs_records]
-        
-        backup_data['backup_date'] = datetime.now().isoformat()
-        backup_data['total_records'] = sum(len(v) for k, v in backup_data.items() if isinstance(v, list))
-        
-        return backup_data
-    
     async def get_database_size(self) -> Dict[str, int]:
         """Ma'lumotlar bazasi hajmini olish"""
         size_query = """
@@ -592,6 +601,6 @@ class DatabaseQueries:
         
         for table in tables:
             count_query = f"SELECT COUNT(*) FROM {table}"
-            sizes[table] = await self.db.fetchval(count_query)
+            sizes[table] = await self.db.fetchval(count_query, analytics=True)
         
         return sizes
\ No newline at end of file
@@ -0,0 +1,420 @@
+"""
+Eksport faylidan (export.py) ma'lumotlarni tiklash
+
+Har bir jadval avval COPY orqali vaqtinchalik staging jadvalga yuklanadi,
+keyin bitta tranzaksiyada asosiy jadval bilan birlashtiriladi:
+
+- mavjud yozuvlar tabiiy kalit bo'yicha yangilanadi (users.tg_id, movie.code, ...)
+- yangi yozuvlar iloji bo'lsa eski id bilan, band bo'lsa yangi id bilan qo'shiladi
+- bog'langan jadvallardagi user_id/movie_id/channel_id yangi id larga almashtiriladi
+- sequence lar MAX(id) ga to'g'rilanadi
+
+Bo'sh bazaga tiklanganda id lar o'zgarmaydi. Qayta tiklash xavfsiz - bir
+xil fayl ikki marta yuklansa yozuvlar ko'paymaydi.
+
+CLI:
+    python -m app.database.restore exports/backup_20240101_120000.ndjson.gz [--yes]
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import islice
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+from .analytics import AnalyticsRollup
+from .connection import get_db_connection
+from .export import EXPORT_FORMAT
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Jadval -> tabiiy kalit bo'yicha moslik, mavjud yozuvni yangilash ifodasi
+# (t - jadval, s - fayldagi qator) va boshqa jadvallarga havolalar (ustun -> jadval).
+# Mavjud foydalanuvchilarning is_admin i o'zgarmaydi - eski nusxa bekor qilingan
+# admin huquqini qaytarib bermasligi kerak.
+RESTORE_TABLES: Dict[str, Dict[str, Any]] = {
+    "users": {
+        "match": "t.tg_id = s.tg_id",
+        "merge": """
+            full_name = s.full_name,
+            created_at = LEAST(t.created_at, s.created_at),
+            last_activity = GREATEST(t.last_activity, s.last_activity)
+        """,
+        "refs": {}
+    },
+    "movie": {
+        "match": "t.code = s.code",
+        "merge": """
+            file_id = s.file_id,
+            title = s.title,
+            description = s.description,
+            private_message_id = s.private_message_id,
+            view_count = GREATEST(t.view_count, s.view_count)
+        """,
+        "refs": {}
+    },
+    "channel": {
+        # channel_id bo'sh kanallar havolasi bo'yicha
+        "match": "(t.channel_id = s.channel_id OR (t.channel_id IS NULL AND s.channel_id IS NULL AND t.channel_link = s.channel_link))",
+        "merge": """
+            title = s.title,
+            channel_link = s.channel_link,
+            channel_username = s.channel_username,
+            status = s.status
+        """,
+        "refs": {}
+    },
+    "joineduserannel": {
+        "match": "t.user_id = s.user_id AND t.channel_id = s.channel_id",
+        "merge": None,
+        "refs": {"user_id": "users", "channel_id": "channel"}
+    },
+    "movie_views": {
+        "match": "t.user_id = s.user_id AND t.movie_id = s.movie_id AND t.viewed_at = s.viewed_at",
+        "merge": None,
+        "refs": {"user_id": "users", "movie_id": "movie"}
+    },
+}
+
+# JSON dagi qiymatlarni COPY uchun Python turlariga o'tkazish (PostgreSQL tur nomi bo'yicha)
+CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    "timestamp": datetime.fromisoformat,
+    "timestamptz": datetime.fromisoformat,
+    "date": date.fromisoformat,
+    "numeric": Decimal,
+    "json": lambda value: json.dumps(value, ensure_ascii=False),
+    "jsonb": lambda value: json.dumps(value, ensure_ascii=False),
+}
+
+
+def _status_count(status: str) -> int:
+    # "INSERT 0 15" / "UPDATE 3"
+    return int(status.split()[-1]) if status else 0
+
+
+class DataRestorer:
+    """Eksport faylini staging jadvallar orqali bazaga yuklash"""
+
+    COLUMNS_QUERY = """
+    SELECT column_name FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = $1
+    ORDER BY ordinal_position
+    """
+
+    RESET_SEQUENCE_QUERY = "SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {table}"
+
+    # Tiklangan ko'rishlar kunlik yig'indilarga noldan qayta yig'iladi
+    RESET_ROLLUPS_QUERY = """
+    TRUNCATE movie_views_daily, user_views_daily;
+    UPDATE analytics_rollup_state SET last_view_id = 0, updated_at = CURRENT_TIMESTAMP;
+    """
+
+    def __init__(self, batch_size: int = 10000, statement_timeout: float = 3600.0,
+                 progress_interval: float = 3.0):
+        self.batch_size = batch_size
+        self.statement_timeout = statement_timeout
+        self.progress_interval = progress_interval
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    @property
+    def is_running(self) -> bool:
+        return self.lock.locked()
+
+    @staticmethod
+    def _open(path: str):
+        if path.endswith(".gz"):
+            return gzip.open(path, 'rt', encoding='utf-8')
+        return open(path, 'r', encoding='utf-8')
+
+    @staticmethod
+    def _read_lines(file, count: int) -> List[Any]:
+        return [json.loads(line) for line in islice(file, count) if line.strip()]
+
+    async def _report(self, progress: Optional[ProgressCallback], state: Dict[str, Any]) -> None:
+        if progress is None:
+            return
+        try:
+            await progress({**state, "completed": dict(state['completed'])})
+        except Exception as e:
+            logger.warning(f"Restore progress callback error: {e}")
+
+    async def _create_staging(self, conn, table: str, columns: List[str]) -> List[int]:
+        """Staging jadvalni yaratish; fayldagi qaysi ustunlar yuklanishini qaytaradi"""
+        target_columns = {record['column_name'] for record in await conn.fetch(self.COLUMNS_QUERY, table)}
+        if not target_columns:
+            raise ValueError(f"Bazada {table} jadvali yo'q")
+
+        await conn.execute(f"CREATE TEMP TABLE restore_{table} (LIKE {table}) ON COMMIT DROP")
+        # Sxemada yo'q ustunlar tashlab yuboriladi, yangilari standart qiymat oladi
+        return [index for index, column in enumerate(columns) if column in target_columns]
+
+    async def _copy_batch(self, conn, table: str, columns: List[str], rows: List[List[Any]]) -> None:
+        await conn.copy_records_to_table(
+            f"restore_{table}",
+            records=rows,
+            columns=columns,
+            timeout=self.statement_timeout
+        )
+
+    async def _merge(self, conn, table: str, columns: List[str]) -> Dict[str, int]:
+        """Staging dan asosiy jadvalga birlashtirish (tranzaksiya ichida)"""
+        spec = RESTORE_TABLES[table]
+        timeout = self.statement_timeout
+        staging = f"restore_{table}"
+        await conn.execute(f"ANALYZE {staging}", timeout=timeout)
+
+        # Havolalarni yangi id larga almashtirish; egasi topilmagan qatorlar tashlanadi
+        source = staging
+        if spec['refs']:
+            source = f"restore_{table}_src"
+            select = ", ".join(
+                f"m_{column}.new_id AS {column}" if column in spec['refs'] else f"s.{column}"
+                for column in columns
+            )
+            joins = " ".join(
+                f"JOIN restore_map_{spec['refs'][column]} m_{column} ON m_{column}.old_id = s.{column}"
+                for column in columns if column in spec['refs']
+            )
+            await conn.execute(
+                f"CREATE TEMP TABLE {source} ON COMMIT DROP AS SELECT {select} FROM {staging} s {joins}",
+                timeout=timeout
+            )
+            await conn.execute(f"ANALYZE {source}", timeout=timeout)
+
+        key_match = spec['match']
+        column_list = ", ".join(columns)
+        source_columns = ", ".join(f"s.{column}" for column in columns)
+        new_rows = f"NOT EXISTS (SELECT 1 FROM {table} t WHERE {key_match})"
+
+        updated = 0
+        if spec['merge']:
+            updated = _status_count(await conn.execute(
+                f"UPDATE {table} t SET {spec['merge']} FROM {source} s WHERE {key_match}",
+                timeout=timeout
+            ))
+
+        # 1) Yangi yozuvlar - eski id bo'sh bo'lsa o'sha id bilan
+        inserted = _status_count(await conn.execute(
+            f"""
+            INSERT INTO {table} ({column_list})
+            SELECT {source_columns} FROM {source} s
+            WHERE {new_rows}
+              AND NOT EXISTS (SELECT 1 FROM {table} t WHERE t.id = s.id)
+            """,
+            timeout=timeout
+        ))
+        await conn.execute(self.RESET_SEQUENCE_QUERY.format(table=table), timeout=timeout)
+
+        # 2) Qolgan yangi yozuvlar - id i band bo'lganlar, yangi id bilan
+        insert_columns = [column for column in columns if column != "id"]
+        inserted += _status_count(await conn.execute(
+            f"""
+            INSERT INTO {table} ({", ".join(insert_columns)})
+            SELECT {", ".join(f"s.{column}" for column in insert_columns)} FROM {source} s
+            WHERE {new_rows}
+            """,
+            timeout=timeout
+        ))
+        await conn.execute(self.RESET_SEQUENCE_QUERY.format(table=table), timeout=timeout)
+
+        # Boshqa jadvallar havola qiladigan jadvallar uchun eski id -> yangi id
+        if any(table in other['refs'].values() for other in RESTORE_TABLES.values()):
+            await conn.execute(
+                f"""
+                CREATE TEMP TABLE restore_map_{table} ON COMMIT DROP AS
+                SELECT DISTINCT ON (s.id) s.id AS old_id, t.id AS new_id
+                FROM {source} s JOIN {table} t ON {key_match}
+                ORDER BY s.id, t.id
+                """,
+                timeout=timeout
+            )
+            await conn.execute(f"CREATE INDEX ON restore_map_{table} (old_id)")
+            await conn.execute(f"ANALYZE restore_map_{table}", timeout=timeout)
+
+        return {"inserted": inserted, "updated": updated}
+
+    async def _restore_stream(self, conn, file, state: Dict[str, Any],
+                              progress: Optional[ProgressCallback]) -> None:
+        manifest = await asyncio.to_thread(self._read_lines, file, 1)
+        if not manifest or not isinstance(manifest[0], dict) or manifest[0].get("format") != EXPORT_FORMAT:
+            raise ValueError("Fayl eksport formatida emas")
+
+        table = None
+        columns: List[str] = []
+        keep: List[int] = []
+        converters: List[Optional[Callable[[Any], Any]]] = []
+        rows_loaded = 0
+        next_report = time.monotonic() + self.progress_interval
+
+        while True:
+            lines = await asyncio.to_thread(self._read_lines, file, self.batch_size)
+            if not lines:
+                break
+
+            batch: List[tuple] = []
+            for line in lines:
+                if isinstance(line, list):
+                    if table is None:
+                        raise ValueError("Jadval sarlavhasisiz qator")
+                    batch.append(tuple(
+                        line[i] if line[i] is None or converters[i] is None else converters[i](line[i])
+                        for i in keep
+                    ))
+                    rows_loaded += 1
+                    continue
+
+                # Oldingi jadvalning qatorlarini yuklab bo'lish
+                if batch:
+                    await self._copy_batch(conn, table, columns, batch)
+                    batch = []
+
+                if "columns" in line:
+                    table = line['table']
+                    if table not in RESTORE_TABLES:
+                        raise ValueError(f"Noma'lum jadval: {table}")
+                    keep = await self._create_staging(conn, table, line['columns'])
+                    columns = [line['columns'][i] for i in keep]
+                    converters = [None] * len(line['columns'])
+                    for i in keep:
+                        converters[i] = CONVERTERS.get(line['types'][i])
+                    rows_loaded = 0
+                    state.update(table=table, table_rows=0, phase="copy")
+                    await self._report(progress, state)
+                elif "rows" in line:
+                    if line['table'] != table or line['rows'] != rows_loaded:
+                        raise ValueError(f"{line['table']}: fayl to'liq emas ({rows_loaded}/{line['rows']})")
+                    state['phase'] = "merge"
+                    await self._report(progress, state)
+                    state['completed'][table] = {"rows": rows_loaded, **await self._merge(conn, table, columns)}
+                    table = None
+
+            if batch:
+                await self._copy_batch(conn, table, columns, batch)
+
+            state['table_rows'] = rows_loaded
+            state['total_rows'] += sum(isinstance(line, list) for line in lines)
+
+            if time.monotonic() >= next_report:
+                next_report = time.monotonic() + self.progress_interval
+                await self._report(progress, state)
+
+        if table is not None:
+            raise ValueError(f"{table}: fayl to'liq emas")
+
+    async def restore(self, path: str, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """
+        Eksport faylini bazaga yuklash (hammasi bitta tranzaksiyada)
+
+        Args:
+            path: .ndjson yoki .ndjson.gz fayl
+            progress: Jarayon haqida xabar beruvchi funksiya
+
+        Returns:
+            Dict: tables (jadval -> rows/inserted/updated), total_records, duration
+        """
+        async with self.lock:
+            state = {
+                "table": None,
+                "table_rows": 0,
+                "phase": None,
+                "total_rows": 0,
+                "completed": {},
+                "started_at": time.monotonic()
+            }
+
+            db = get_db_connection()
+            file = await asyncio.to_thread(self._open, path)
+            try:
+                async with db.get_connection() as conn:
+                    async with conn.transaction():
+                        # Yig'indilar noldan qayta yig'ilishi mumkin - rollup bilan parallel ishlamaslik uchun
+                        await conn.execute("SELECT pg_advisory_xact_lock($1)", AnalyticsRollup.LOCK_KEY)
+                        await self._restore_stream(conn, file, state, progress)
+
+                        if state['completed'].get("movie_views", {}).get("inserted"):
+                            await conn.execute(self.RESET_ROLLUPS_QUERY)
+            finally:
+                await asyncio.to_thread(file.close)
+
+            await self._refresh_caches()
+
+            result = {
+                "tables": dict(state['completed']),
+                "total_records": state['total_rows'],
+                "duration": round(time.monotonic() - state['started_at'], 1)
+            }
+            logger.info(f"✅ Tiklash tugadi: {path} ({result['total_records']} yozuv, {result['duration']} s)")
+            return result
+
+    @staticmethod
+    async def _refresh_caches() -> None:
+        """Jarayon ichidagi keshlarni yangi ma'lumotlarga moslash"""
+        from .cache import user_cache
+        from .channel_registry import channel_registry
+        from .movie_index import movie_index
+
+        user_cache.clear()
+        channel_registry.invalidate()
+        if movie_index.is_loaded:
+            await movie_index.load()
+
+
+# Global data restorer instance
+data_restorer = DataRestorer(
+    batch_size=settings.restore_batch_size,
+    statement_timeout=settings.restore_statement_timeout,
+    progress_interval=settings.export_progress_interval
+)
+
+
+async def main() -> None:
+    """CLI: faylni bazaga tiklash"""
+    if len(sys.argv) < 2 or not os.path.exists(sys.argv[1]):
+        print("❌ Foydalanish: python -m app.database.restore <fayl.ndjson.gz> [--yes]")
+        sys.exit(1)
+
+    path = sys.argv[1]
+    if "--yes" not in sys.argv[2:]:
+        confirm = input(f"⚠️  {path} faylidan ma'lumotlar tiklansinmi? (yes/no): ")
+        if confirm.lower() != 'yes':
+            print("❌ Operatsiya bekor qilindi")
+            return
+
+    async def print_progress(progress: Dict[str, Any]) -> None:
+        print(f"⏳ {progress['table']} ({progress['phase']}): {progress['table_rows']} qator, jami {progress['total_rows']}")
+
+    db = get_db_connection()
+    await db.connect()
+    try:
+        result = await data_restorer.restore(path, progress=print_progress)
+    finally:
+        await db.disconnect()
+
+    for table, counts in result['tables'].items():
+        print(f"✅ {table}: {counts['rows']} qator, {counts['inserted']} qo'shildi, {counts['updated']} yangilandi")
+    print(f"🎉 Tiklash tugadi: {result['total_records']} yozuv, {result['duration']} s")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n⏹️  Operatsiya foydalanuvchi tomonidan to'xtatildi")
+    except Exception as e:
+        print(f"\n💥 Kutilmagan xatolik: {e}")
+        sys.exit(1)
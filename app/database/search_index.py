@@ -0,0 +1,235 @@
+"""
+Kino nomlari bo'yicha xotiradagi qidiruv indeksi (pg_trgm bo'lmagan bazalar uchun)
+
+Nomlar bir xil ko'rinishga keltiriladi: kichik harf, kirill -> lotin
+(o'zbek alifbosi), tutuq belgilari olib tashlanadi - "Ўтган кунлар" va
+"O'tgan kunlar" bir xil topiladi. Har bir so'zning prefikslari -> kino id
+lari inverted indeksi prefiks qidiruvni beradi; so'zlar lug'ati ustidagi
+trigram indeksi esa imlo xatolarini. Natijalar view_count bo'yicha top-k.
+"""
+
+import heapq
+import re
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .models import Movie
+
+# O'zbek kirill -> lotin (o', g' tutuqsiz yoziladi, lotin tomonida ham olib tashlanadi)
+CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "ғ": "g", "д": "d", "е": "e", "ё": "yo",
+    "ж": "j", "з": "z", "и": "i", "й": "y", "к": "k", "қ": "q", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ў": "o",
+    "ф": "f", "х": "x", "ҳ": "h", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "",
+    "ы": "i", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+}
+APOSTROPHES = "'`ʻʼ‘’"
+
+TRANSLITERATION = str.maketrans({
+    **{ord(letter): latin for letter, latin in CYRILLIC_TO_LATIN.items()},
+    **{ord(mark): "" for mark in APOSTROPHES},
+})
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def normalize(text: str) -> str:
+    """Kichik harf, kirill -> lotin, tutuq belgilarisiz"""
+    return text.lower().translate(TRANSLITERATION)
+
+
+def tokenize(text: str) -> List[str]:
+    """Matnni qidiruv so'zlariga ajratish"""
+    return TOKEN_RE.findall(normalize(text))
+
+
+def trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MovieSearchIndex:
+    """
+    Nomlar bo'yicha inverted indeks
+
+    Kino obyektlari MovieCodeIndex bilan umumiy - view_writer qo'shgan
+    ko'rishlar reytingda darhol hisobga olinadi.
+    """
+
+    def __init__(self, min_prefix: int = 2, max_prefix: int = 12, fuzzy_threshold: float = 0.3,
+                 scan_threshold: int = 1000, ranking_ttl: float = 30.0):
+        self.min_prefix = min_prefix
+        self.max_prefix = max_prefix
+        self.fuzzy_threshold = fuzzy_threshold
+        # Nomzodlar shundan ko'p bo'lsa, saralash o'rniga mashhurlik tartibi bo'yicha yuriladi
+        self.scan_threshold = scan_threshold
+        self.ranking_ttl = ranking_ttl
+        self._ranking: Optional[List[int]] = None
+        self._ranked_at = 0.0
+        self._movies: Dict[int, Movie] = {}
+        self._movie_tokens: Dict[int, Tuple[str, ...]] = {}
+        # so'z prefiksi -> kino id lari
+        self._prefixes: Dict[str, Set[int]] = {}
+        # to'liq so'z -> kino id lari (lug'at)
+        self._tokens: Dict[str, Set[int]] = {}
+        # trigram -> lug'atdagi so'zlar
+        self._trigrams: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._movies)
+
+    def _index_token(self, token: str, movie_id: int) -> None:
+        ids = self._tokens.get(token)
+        if ids is None:
+            ids = self._tokens[token] = set()
+            for gram in trigrams(token):
+                self._trigrams.setdefault(gram, set()).add(token)
+        ids.add(movie_id)
+
+        for size in range(self.min_prefix, min(len(token), self.max_prefix) + 1):
+            self._prefixes.setdefault(token[:size], set()).add(movie_id)
+
+    def _unindex_token(self, token: str, movie_id: int) -> None:
+        ids = self._tokens.get(token)
+        if ids is not None:
+            ids.discard(movie_id)
+            if not ids:
+                del self._tokens[token]
+                for gram in trigrams(token):
+                    words = self._trigrams.get(gram)
+                    if words is not None:
+                        words.discard(token)
+                        if not words:
+                            del self._trigrams[gram]
+
+        for size in range(self.min_prefix, min(len(token), self.max_prefix) + 1):
+            ids = self._prefixes.get(token[:size])
+            if ids is not None:
+                ids.discard(movie_id)
+                if not ids:
+                    del self._prefixes[token[:size]]
+
+    def add(self, movie: Movie) -> None:
+        """Kinoni qo'shish yoki yangilash (nom o'zgarmagan bo'lsa qayta indekslanmaydi)"""
+        tokens = tuple(dict.fromkeys(tokenize(movie.title)))
+        old_tokens = self._movie_tokens.get(movie.id)
+        if movie.id not in self._movies:
+            self._ranking = None
+        self._movies[movie.id] = movie
+        if old_tokens == tokens:
+            return
+
+        for token in old_tokens or ():
+            self._unindex_token(token, movie.id)
+        for token in tokens:
+            self._index_token(token, movie.id)
+        self._movie_tokens[movie.id] = tokens
+
+    def remove(self, movie_id: int) -> None:
+        """Kinoni indeksdan olib tashlash"""
+        self._movies.pop(movie_id, None)
+        for token in self._movie_tokens.pop(movie_id, ()):
+            self._unindex_token(token, movie_id)
+
+    def sync(self, movies: Iterable[Movie]) -> None:
+        """To'liq qayta yuklangan katalog bilan moslash (faqat farqlar qayta indekslanadi)"""
+        current = {movie.id: movie for movie in movies}
+        for movie_id in [movie_id for movie_id in self._movies if movie_id not in current]:
+            self.remove(movie_id)
+        for movie in current.values():
+            self.add(movie)
+
+    def _prefix_matches(self, token: str) -> Set[int]:
+        """So'z shu prefiks bilan boshlanadigan kinolar"""
+        if len(token) <= self.max_prefix:
+            return self._prefixes.get(token, set())
+
+        # Indeksdagi eng uzun prefiks bo'yicha nomzodlar, keyin tekshirish
+        return {
+            movie_id for movie_id in self._prefixes.get(token[:self.max_prefix], ())
+            if any(word.startswith(token) for word in self._movie_tokens[movie_id])
+        }
+
+    def _fuzzy_matches(self, token: str) -> Set[int]:
+        """Imlo xatosi bilan yozilgan so'zga o'xshash so'zlar bo'lgan kinolar"""
+        grams = trigrams(token)
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for word in self._trigrams.get(gram, ()):
+                shared[word] = shared.get(word, 0) + 1
+
+        ids: Set[int] = set()
+        for word, count in shared.items():
+            # Trigram Jaccard o'xshashligi (pg_trgm similarity kabi), so'zda len + 1 trigram
+            if count / (len(grams) + len(word) + 1 - count) >= self.fuzzy_threshold:
+                ids |= self._tokens[word]
+        return ids
+
+    @staticmethod
+    def _intersect(sets: List[Set[int]]) -> Set[int]:
+        sets = sorted(sets, key=len)
+        result = sets[0]
+        for other in sets[1:]:
+            result = result & other
+            if not result:
+                break
+        return result
+
+    def search(self, term: str, limit: int = 10, year: Optional[int] = None,
+               min_views: Optional[int] = None, max_views: Optional[int] = None) -> List[Movie]:
+        """
+        Qidirish: avval barcha so'zlar prefiks bo'yicha, yetmasa imlo
+        xatolariga chidamli; har bir guruh ichida view_count bo'yicha top-k
+        """
+        tokens = [token for token in dict.fromkeys(tokenize(term)) if len(token) >= self.min_prefix]
+        if not tokens:
+            return []
+
+        def accept(movie: Movie) -> bool:
+            views = movie.view_count or 0
+            return ((year is None or movie.created_at.year == year)
+                    and (min_views is None or views >= min_views)
+                    and (max_views is None or views <= max_views))
+
+        prefix_sets = [self._prefix_matches(token) for token in tokens]
+        results = self._top(self._intersect(prefix_sets), limit, accept)
+        if len(results) >= limit:
+            return results
+
+        fuzzy_sets = [prefix | self._fuzzy_matches(token) for token, prefix in zip(tokens, prefix_sets)]
+        seen = {movie.id for movie in results}
+        candidates = self._intersect(fuzzy_sets) - seen
+        return results + self._top(candidates, limit - len(results), accept)
+
+    def _popularity_order(self) -> List[int]:
+        """Kino id lari view_count bo'yicha kamayish tartibida (ranking_ttl davomida qayta ishlatiladi)"""
+        now = time.monotonic()
+        if self._ranking is None or now - self._ranked_at > self.ranking_ttl:
+            self._ranking = sorted(self._movies, key=lambda movie_id: (self._movies[movie_id].view_count or 0, movie_id),
+                                   reverse=True)
+            self._ranked_at = now
+        return self._ranking
+
+    def _top(self, ids: Set[int], limit: int, accept: Callable[[Movie], bool]) -> List[Movie]:
+        key = lambda movie: (movie.view_count or 0, movie.id)  # noqa: E731
+        if len(ids) <= self.scan_threshold:
+            movies = (self._movies[movie_id] for movie_id in ids)
+            return heapq.nlargest(limit, filter(accept, movies), key=key)
+
+        # Ko'p nomzod: eng mashhurlardan boshlab birinchi limit tasi olinadi
+        picked = []
+        for movie_id in self._popularity_order():
+            if movie_id in ids:
+                movie = self._movies.get(movie_id)
+                if movie is not None and accept(movie):
+                    picked.append(movie)
+                    if len(picked) >= limit:
+                        break
+        return sorted(picked, key=key, reverse=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "movies": len(self._movies),
+            "tokens": len(self._tokens),
+            "prefixes": len(self._prefixes),
+            "trigrams": len(self._trigrams)
+        }
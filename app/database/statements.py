@@ -0,0 +1,187 @@
+"""
+Nomlangan so'rovlar registri
+
+Ko'p ishlatiladigan so'rovlar shu yerda bir marta e'lon qilinadi va
+DatabaseConnection.*_prepared metodlari orqali bajariladi. asyncpg har bir
+ulanishda so'rov matnini statement keshida (statement_cache_size) saqlaydi:
+birinchi ishlatilganda server da tayyorlanadi, keyin qayta ishlatiladi.
+Qiymatlar (shu jumladan kunlar soni) faqat parametr sifatida uzatiladi, shuning
+uchun so'rov matni o'zgarmaydi va keshdan chiqib ketmaydi.
+"""
+
+from typing import Dict
+
+
+STATEMENTS: Dict[str, str] = {
+    # Foydalanuvchilar
+    "create_user": """
+        INSERT INTO users (tg_id, full_name, is_admin)
+        VALUES ($1, $2, $3)
+        ON CONFLICT (tg_id)
+        DO UPDATE SET
+            full_name = EXCLUDED.full_name,
+            last_activity = CURRENT_TIMESTAMP
+        RETURNING *
+    """,
+    "user_by_tg_id": "SELECT * FROM users WHERE tg_id = $1",
+    "user_by_id": "SELECT * FROM users WHERE id = $1",
+    "user_is_admin": "SELECT is_admin FROM users WHERE tg_id = $1",
+
+    # Kinolar
+    "movie_by_code": "SELECT * FROM movie WHERE code = $1",
+    "movie_by_id": "SELECT * FROM movie WHERE id = $1",
+    # pg_trgm GIN indekslari bilan: $1 - so'z (xatolarga chidamli), $2 - ILIKE namunasi
+    "search_movies_ranked": """
+        SELECT m.*,
+            word_similarity($1, m.title)
+            + 0.3 * word_similarity($1, COALESCE(m.description, ''))
+            + $7::double precision * ln(1 + COALESCE(m.view_count, 0)) AS rank
+        FROM movie m
+        WHERE ($1 <% m.title OR $1 <% m.description OR m.title ILIKE $2 OR m.description ILIKE $2)
+          AND ($4::integer IS NULL OR (m.created_at >= make_date($4, 1, 1) AND m.created_at < make_date($4 + 1, 1, 1)))
+          AND ($5::integer IS NULL OR m.view_count >= $5)
+          AND ($6::integer IS NULL OR m.view_count <= $6)
+        ORDER BY rank DESC, m.view_count DESC
+        LIMIT $3
+    """,
+    # pg_trgm o'rnatilmagan bazalar uchun
+    "search_movies": """
+        SELECT * FROM movie
+        WHERE (title ILIKE $1 OR description ILIKE $1)
+          AND ($3::integer IS NULL OR (created_at >= make_date($3, 1, 1) AND created_at < make_date($3 + 1, 1, 1)))
+          AND ($4::integer IS NULL OR view_count >= $4)
+          AND ($5::integer IS NULL OR view_count <= $5)
+        ORDER BY view_count DESC
+        LIMIT $2
+    """,
+    "popular_movies": """
+        SELECT * FROM movie
+        ORDER BY view_count DESC
+        LIMIT $1
+    """,
+    "recent_movies": """
+        SELECT * FROM movie
+        ORDER BY created_at DESC
+        LIMIT $1
+    """,
+    # Keyset sahifalash: $1, $2 - kursor (oldingi sahifa chetidagi kino kaliti), $3 - limit
+    "popular_movies_after": """
+        SELECT * FROM movie
+        WHERE (view_count, id) < ($1, $2)
+        ORDER BY view_count DESC, id DESC
+        LIMIT $3
+    """,
+    "popular_movies_before": """
+        SELECT * FROM movie
+        WHERE (view_count, id) > ($1, $2)
+        ORDER BY view_count, id
+        LIMIT $3
+    """,
+    "recent_movies_after": """
+        SELECT * FROM movie
+        WHERE (created_at, id) < ($1, $2)
+        ORDER BY created_at DESC, id DESC
+        LIMIT $3
+    """,
+    "recent_movies_before": """
+        SELECT * FROM movie
+        WHERE (created_at, id) > ($1, $2)
+        ORDER BY created_at, id
+        LIMIT $3
+    """,
+
+    # Kanallar va obunalar
+    "active_channels": "SELECT * FROM channel WHERE status = 'aktiv' ORDER BY created_at DESC",
+    "user_subscription": """
+        SELECT c.*, (j.user_id IS NOT NULL) AS is_joined
+        FROM channel c
+        LEFT JOIN joineduserannel j
+            ON j.channel_id = c.id
+           AND j.user_id = $1
+           AND j.verified_at > NOW() - make_interval(secs => $2::double precision)
+        WHERE c.status = 'aktiv'
+        ORDER BY c.created_at DESC
+    """,
+    "user_joined_chat_ids": """
+        SELECT c.channel_id
+        FROM joineduserannel j
+        JOIN users u ON u.id = j.user_id
+        JOIN channel c ON c.id = j.channel_id
+        WHERE u.tg_id = $1
+          AND c.channel_id IS NOT NULL
+          AND j.verified_at > NOW() - make_interval(secs => $2::double precision)
+    """,
+
+    # Ko'rishlar
+    "user_movie_history": """
+        SELECT mv.*, m.title, m.code, m.description
+        FROM movie_views mv
+        JOIN movie m ON mv.movie_id = m.id
+        WHERE mv.user_id = $1
+        ORDER BY mv.viewed_at DESC
+        LIMIT $2
+    """,
+    "has_user_watched_movie": """
+        SELECT EXISTS(
+            SELECT 1 FROM movie_views
+            WHERE user_id = $1 AND movie_id = $2
+        )
+    """,
+    "cleanup_old_views": """
+        DELETE FROM movie_views
+        WHERE viewed_at < NOW() - make_interval(days => $1::integer)
+    """,
+
+    # Statistika (kunlik yig'indilardan)
+    "top_movies": """
+        SELECT
+            m.*,
+            COALESCE(d.views_count, 0) as views_count,
+            COALESCE(d.unique_viewers, 0) as unique_viewers
+        FROM movie m
+        LEFT JOIN (
+            SELECT movie_id, SUM(views) as views_count, SUM(unique_viewers) as unique_viewers
+            FROM movie_views_daily
+            WHERE day > CURRENT_DATE - $2::integer
+            GROUP BY movie_id
+        ) d ON d.movie_id = m.id
+        ORDER BY views_count DESC, unique_viewers DESC
+        LIMIT $1
+    """,
+    "active_users": """
+        SELECT
+            u.*,
+            COALESCE(d.movies_watched, 0) as movies_watched,
+            d.last_movie_watch
+        FROM users u
+        LEFT JOIN (
+            SELECT user_id, SUM(views) as movies_watched, MAX(last_viewed_at) as last_movie_watch
+            FROM user_views_daily
+            WHERE day > CURRENT_DATE - $2::integer
+            GROUP BY user_id
+        ) d ON d.user_id = u.id
+        WHERE u.last_activity > NOW() - make_interval(days => $2::integer)
+        ORDER BY movies_watched DESC, last_movie_watch DESC
+        LIMIT $1
+    """,
+    "daily_statistics": """
+        SELECT
+            m.day as date,
+            m.total_views,
+            COALESCE(u.unique_users, 0) as unique_users,
+            m.unique_movies
+        FROM (
+            SELECT day, SUM(views) as total_views, COUNT(*) as unique_movies
+            FROM movie_views_daily
+            WHERE day > CURRENT_DATE - $1::integer
+            GROUP BY day
+        ) m
+        LEFT JOIN (
+            SELECT day, COUNT(*) as unique_users
+            FROM user_views_daily
+            WHERE day > CURRENT_DATE - $1::integer
+            GROUP BY day
+        ) u ON u.day = m.day
+        ORDER BY date DESC
+    """,
+}
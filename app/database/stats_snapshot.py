@@ -0,0 +1,113 @@
+"""
+Platforma statistikasi nusxasi (fon rejimida yangilanadi)
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from .connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+class PlatformStatsSnapshot:
+    """
+    get_platform_statistics natijasini xotirada saqlash
+
+    Raqamlar har refresh_interval soniyada fonda hisoblanadi, foydalanuvchilarga
+    esa xotiradan beriladi (snapshot_at - qachon hisoblangani).
+    """
+
+    # Jami ko'rishlar: yig'ilgan kunlik jadval + hali yig'ilmagan yangi yozuvlar
+    STATS_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM users) as total_users,
+        (SELECT COUNT(*) FROM users WHERE is_admin = TRUE) as admin_count,
+        (SELECT COUNT(*) FROM movie) as total_movies,
+        (SELECT COUNT(*) FROM channel WHERE status = 'aktiv') as active_channels,
+        (SELECT COALESCE(SUM(views), 0) FROM movie_views_daily)
+            + (SELECT COUNT(*) FROM movie_views
+               WHERE id > (SELECT last_view_id FROM analytics_rollup_state WHERE name = 'movie_views')) as total_views,
+        (SELECT COUNT(*) FROM users WHERE last_activity > NOW() - INTERVAL '24 hours') as active_users_24h,
+        (SELECT COUNT(*) FROM users WHERE created_at > NOW() - INTERVAL '7 days') as new_users_week
+    """
+
+    def __init__(self, refresh_interval: float = 60.0):
+        self.refresh_interval = refresh_interval
+        self._stats: Optional[Dict[str, Any]] = None
+        self._refreshed_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _is_fresh(self) -> bool:
+        # Fon yangilanishi ishlamay qolsa, 2 interval o'tgach qayta hisoblanadi
+        return (
+            self._stats is not None
+            and time.monotonic() - self._refreshed_at < self.refresh_interval * 2
+        )
+
+    async def _load(self) -> Dict[str, Any]:
+        db = get_db_connection()
+        record = await db.fetchrow(self.STATS_QUERY, analytics=True)
+
+        stats = dict(record)
+        stats['snapshot_at'] = datetime.now()
+        self._stats = stats
+        self._refreshed_at = time.monotonic()
+        return dict(stats)
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Statistikani DB dan qayta hisoblash (admin majburan yangilashi ham)"""
+        async with self.lock:
+            return await self._load()
+
+    async def get(self) -> Dict[str, Any]:
+        """Statistika (xotiradan, eskirgan bo'lsa qayta hisoblanadi)"""
+        if self._is_fresh():
+            return dict(self._stats)
+
+        # Bir vaqtda kelgan so'rovlar bitta hisoblashni kutadi
+        async with self.lock:
+            if self._is_fresh():
+                return dict(self._stats)
+            return await self._load()
+
+    async def _run(self) -> None:
+        """Davriy yangilash sikli"""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Platform stats refresh error: {e}")
+
+    def start(self) -> None:
+        """Fon yangilanishini boshlash"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Fon yangilanishini to'xtatish"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global platform stats snapshot instance
+platform_stats = PlatformStatsSnapshot(
+    refresh_interval=settings.platform_stats_refresh_interval
+)
@@ -0,0 +1,281 @@
+"""
+Kino ko'rishlarini navbat orqali paketlab yozish (movie_views + view_count)
+"""
+
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+import asyncpg
+
+from app.config import settings
+from .connection import get_db_connection
+from .movie_index import movie_index
+
+logger = logging.getLogger(__name__)
+
+# (user_id, movie_id, viewed_at) - viewed_at UTC da, baza sessiya vaqt zonasiga o'tkazadi
+ViewEvent = Tuple[int, int, datetime]
+
+# Baza vaqtincha yetib bo'lmaydi - paket cheksiz qayta uriniladi
+TRANSIENT_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+    asyncpg.OperatorInterventionError,
+    asyncpg.InsufficientResourcesError,
+    asyncpg.TransactionRollbackError,
+)
+# Hodisaning o'zi buzuq - paket ikkiga bo'linib, buzuq hodisa ajratiladi
+DATA_ERRORS = (
+    asyncpg.DataError,
+    asyncpg.IntegrityConstraintViolationError,
+)
+
+
+class MovieViewWriter:
+    """Ko'rish hodisalari navbati va fon yozuvchisi"""
+
+    # Navbatda turgan paytda o'chirilgan kino/foydalanuvchilarning ko'rishlari
+    # JOIN orqali tashlab ketiladi (aks holda foreign key xatosi butun paketni
+    # to'xtatadi); view_count faqat haqiqatda yozilgan ko'rishlar bo'yicha oshadi
+    WRITE_QUERY = """
+    WITH inserted AS (
+        INSERT INTO movie_views (user_id, movie_id, viewed_at)
+        SELECT d.user_id, d.movie_id, d.viewed_at
+        FROM unnest($1::integer[], $2::integer[], $3::timestamptz[]) AS d(user_id, movie_id, viewed_at)
+        JOIN movie m ON m.id = d.movie_id
+        JOIN users u ON u.id = d.user_id
+        RETURNING movie_id
+    )
+    UPDATE movie AS m
+    SET view_count = m.view_count + d.views
+    FROM (SELECT movie_id, COUNT(*)::integer AS views FROM inserted GROUP BY movie_id) AS d
+    WHERE m.id = d.movie_id
+    RETURNING m.id, d.views
+    """
+
+    def __init__(self, flush_size: int = 500, flush_interval: float = 2.0,
+                 max_queue_size: int = 10000, spill_path: Optional[str] = None,
+                 max_attempts: int = 5, dead_letter_path: Optional[str] = None,
+                 max_retry_delay: float = 60.0):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.spill_path = spill_path
+        # Boshqa (ulanish yoki ma'lumotga aloqasiz) xatolarda shuncha urinishdan keyin
+        # paket dead_letter_path ga yoziladi va navbatdan chiqariladi
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path
+        # Ulanish xatolarida qayta urinishlar orasidagi maksimal kutish
+        self.max_retry_delay = max_retry_delay
+        self.dropped = 0
+        self.dead_lettered = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Navbatdan olingan, lekin hali yozilmagan hodisalar
+        self._buffer: List[ViewEvent] = []
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        return self._queue
+
+    @property
+    def pending_count(self) -> int:
+        """Yozilishini kutayotgan hodisalar soni"""
+        return self.queue.qsize() + len(self._buffer)
+
+    async def enqueue(self, user_id: int, movie_id: int) -> None:
+        """Ko'rish hodisasini navbatga qo'yish
+
+        Navbat to'lgan bo'lsa, yozuvchi joy bo'shatguncha kutiladi (backpressure).
+        """
+        await self.queue.put((user_id, movie_id, datetime.now(timezone.utc)))
+
+    async def _write_batch(self, batch: List[ViewEvent]) -> None:
+        """Paketni bitta so'rovda yozish"""
+        user_ids, movie_ids, viewed_at = (list(column) for column in zip(*batch))
+
+        db = get_db_connection()
+        records = await db.fetch(self.WRITE_QUERY, user_ids, movie_ids, viewed_at)
+        views_per_movie = {record['id']: record['views'] for record in records}
+
+        written = sum(views_per_movie.values())
+        if written < len(batch):
+            self.dropped += len(batch) - written
+            logger.warning(f"Movie views: {len(batch) - written} ta ko'rish o'chirilgan kino/foydalanuvchiga tegishli, tashlandi")
+
+        # Xotiradagi kino indeksidagi view_count ni ham yangilash
+        movie_index.apply_view_counts(views_per_movie)
+
+        logger.debug(f"Movie views flush: {written} views, {len(views_per_movie)} movies")
+
+    async def _write_checked(self, batch: List[ViewEvent]) -> None:
+        """Paketni yozish; ma'lumot xatosida paket ikkiga bo'linadi va buzuq hodisa ajratiladi
+
+        Xato bo'lsa yozilmagan qismlar _buffer boshiga qaytariladi (yozilganlari takrorlanmaydi).
+        """
+        parts = [batch]
+        part: List[ViewEvent] = []
+        try:
+            while parts:
+                part = parts.pop()
+                try:
+                    await self._write_batch(part)
+                except DATA_ERRORS as e:
+                    if len(part) == 1:
+                        self._dead_letter(part, e)
+                    else:
+                        middle = len(part) // 2
+                        parts += [part[middle:], part[:middle]]
+                part = []
+        except BaseException:
+            self._buffer = part + [event for rest in reversed(parts) for event in rest] + self._buffer
+            raise
+
+    async def flush(self) -> int:
+        """Navbatdagi barcha hodisalarni yozish"""
+        batch, self._buffer = self._buffer, []
+
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+
+        if not batch:
+            return 0
+
+        try:
+            await self._write_checked(batch)
+            return len(batch)
+        except Exception as e:
+            # Yozilmaganlari _buffer da - keyingi urinishda yoki stop() da faylga
+            logger.error(f"Movie views flush error: {e}")
+            return 0
+
+    async def _collect_batch(self) -> List[ViewEvent]:
+        """flush_size ta hodisa yoki flush_interval tugaguncha yig'ish"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+
+        # Hodisalar to'g'ridan-to'g'ri _buffer ga yig'iladi - bekor qilinsa ham yo'qolmaydi
+        while len(self._buffer) < self.flush_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                self._buffer.append(await asyncio.wait_for(self.queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+
+        batch, self._buffer = self._buffer, []
+        return batch
+
+    async def _run(self) -> None:
+        """Fon yozuvchi sikli"""
+        failures = 0
+        attempts = 0
+        while True:
+            batch = await self._collect_batch()
+            if not batch:
+                continue
+
+            try:
+                await self._write_checked(batch)
+                failures = attempts = 0
+                continue
+            except TRANSIENT_ERRORS as e:
+                # Baza qaytguncha kutiladi: navbat to'lsa enqueue kutadi (backpressure)
+                failures += 1
+                logger.warning(f"Movie views: baza mavjud emas ({failures}-urinish): {e}")
+            except Exception as e:
+                failures += 1
+                attempts += 1
+                logger.error(f"Movie views write error ({attempts}/{self.max_attempts}): {e}")
+                if attempts >= self.max_attempts:
+                    # Yozib bo'lmaydigan paket navbatni abadiy to'sib qo'ymasligi kerak
+                    # _collect_batch buferni bo'shatgan - undagi hammasi shu paketning yozilmagan qismi
+                    events, self._buffer = self._buffer, []
+                    self._dead_letter(events, e)
+                    attempts = 0
+
+            await asyncio.sleep(min(self.flush_interval * 2 ** (failures - 1), self.max_retry_delay))
+
+    @staticmethod
+    def _write_events(path: str, events: List[ViewEvent]) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            for user_id, movie_id, viewed_at in events:
+                f.write(json.dumps([user_id, movie_id, viewed_at.isoformat()]) + "\n")
+
+    def _spill(self, events: List[ViewEvent]) -> None:
+        """Yozib bo'lmagan hodisalarni faylga saqlash (keyingi ishga tushishda yuklanadi)"""
+        if not self.spill_path or not events:
+            return
+
+        self._write_events(self.spill_path, events)
+        logger.warning(f"⚠️ {len(events)} ta ko'rish {self.spill_path} fayliga saqlandi")
+
+    def _dead_letter(self, events: List[ViewEvent], error: Exception) -> None:
+        """Yozib bo'lmaydigan hodisalarni alohida faylga chiqarish (avtomatik qayta yuklanmaydi)"""
+        self.dead_lettered += len(events)
+        if self.dead_letter_path:
+            self._write_events(self.dead_letter_path, events)
+        logger.error(f"❌ {len(events)} ta ko'rish navbatdan chiqarildi ({error}): "
+                     f"{self.dead_letter_path or 'saqlanmadi'}")
+
+    def _load_spilled(self) -> None:
+        """Oldingi ishga tushishdan qolgan hodisalarni yuklash"""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+
+        with open(self.spill_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    user_id, movie_id, viewed_at = json.loads(line)
+                    # Eski fayllarda vaqt zonasiz mahalliy vaqt yozilgan
+                    viewed_at = datetime.fromisoformat(viewed_at).astimezone(timezone.utc)
+                    self._buffer.append((user_id, movie_id, viewed_at))
+
+        os.remove(self.spill_path)
+        logger.info(f"✅ {len(self._buffer)} ta saqlangan ko'rish qayta yuklandi")
+
+    def start(self) -> None:
+        """Fon yozuvchisini ishga tushirish"""
+        self._load_spilled()
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Yozuvchini to'xtatish va navbatni to'liq bo'shatish"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        await self.flush()
+
+        # Yozib bo'lmagan hodisalarni yo'qotmaslik
+        if self._buffer:
+            self._spill(self._buffer)
+            self._buffer = []
+
+
+# Global movie view writer instance
+view_writer = MovieViewWriter(
+    flush_size=settings.view_flush_size,
+    flush_interval=settings.view_flush_interval,
+    max_queue_size=settings.view_queue_max_size,
+    spill_path=settings.view_spill_path,
+    max_attempts=settings.view_max_write_attempts,
+    dead_letter_path=settings.view_dead_letter_path,
+    max_retry_delay=settings.view_max_retry_delay
+)
@@ -36,11 +36,15 @@ class AdminFilter(BaseFilter):
         
         # Ma'lumotlar bazasidan tekshirish
         try:
-            db_queries = DatabaseQueries()
-            user = await db_queries.get_user_by_tg_id(user_tg_id)
+            # AuthMiddleware yuklagan foydalanuvchidan foydalanish
+            user = kwargs.get('user_db')
+            if user is None:
+                db_queries = DatabaseQueries()
+                user = await db_queries.get_user_by_tg_id(user_tg_id)
             
+            # Keshdagi "admin" eskirgan bo'lishi mumkin - DB dan tasdiqlash
             if user and user.is_admin:
-                return True
+                return await DatabaseQueries().check_user_admin(user_tg_id)
             
         except Exception as e:
             print(f"Admin filter error: {e}")
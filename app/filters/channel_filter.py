@@ -21,14 +21,16 @@ class ChannelSubscriptionFilter(BaseFilter):
         try:
             db_queries = DatabaseQueries()
             
-            # Foydalanuvchini topish
-            user = await db_queries.get_user_by_tg_id(message.from_user.id)
+            # Foydalanuvchini topish (AuthMiddleware yuklagan bo'lsa, qayta so'ramaslik)
+            user = kwargs.get('user_db')
+            if user is None:
+                user = await db_queries.get_user_by_tg_id(message.from_user.id)
             
             if not user:
                 return False
             
             # Obuna holatini tekshirish
-            subscription_info = await db_queries.check_user_subscription(user.id)
+            subscription_info = await db_queries.check_user_subscription(user.id, user=user)
             
             # Barcha kanallarga obuna bo'lgan yoki yo'q
             is_subscribed_to_all = subscription_info.is_subscribed_to_all()
@@ -58,14 +60,16 @@ class NotSubscribedFilter(BaseFilter):
         try:
             db_queries = DatabaseQueries()
             
-            # Foydalanuvchini topish
-            user = await db_queries.get_user_by_tg_id(message.from_user.id)
+            # Foydalanuvchini topish (AuthMiddleware yuklagan bo'lsa, qayta so'ramaslik)
+            user = kwargs.get('user_db')
+            if user is None:
+                user = await db_queries.get_user_by_tg_id(message.from_user.id)
             
             if not user:
                 return False
             
             # Obuna holatini tekshirish
-            subscription_info = await db_queries.check_user_subscription(user.id)
+            subscription_info = await db_queries.check_user_subscription(user.id, user=user)
             
             # Obuna bo'lmagan kanalllar bor yoki yo'q
             unsubscribed_channels = subscription_info.get_unjoined_channels()
@@ -2,23 +2,40 @@
 Admin handlerlari
 """
 
+import os
+
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, ContentType
+from aiogram.types import Message, CallbackQuery, ContentType, FSInputFile
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command
 
 from app.database import DatabaseQueries
+from app.database.activity import activity_buffer
+from app.database.cache import user_cache
+from app.database.channel_registry import channel_registry
+from app.database.connection import get_pool_stats
+from app.database.export import data_exporter
+from app.database.restore import data_restorer
+from app.database.movie_index import movie_index
+from app.database.stats_snapshot import platform_stats
+from app.database.view_writer import view_writer
 from app.debug import debug_channel_access
 from app.keyboards.inline_keyboards import (
     get_admin_main_keyboard,
     get_admin_movie_keyboard,
     get_admin_channel_keyboard,
     get_admin_users_keyboard,
+    get_broadcast_keyboard,
+    get_broadcast_target_keyboard,
     get_confirmation_keyboard
 )
 from app.states.admin_states import AdminStates
 from app.filters.admin_filter import AdminFilter
-from app.utils.admin_utils import format_admin_stats, export_data_to_file
+from app.middlewares.api_throttle_middleware import api_throttle_middleware
+from app.utils.admin_utils import format_admin_stats, format_broadcast_progress, format_export_progress, format_restore_progress
+from app.utils.broadcast import broadcast_engine
+from app.utils.subscription_reconciler import subscription_reconciler
+from app.utils.channel_checker import subscription_service
 from app.config import settings
 
 router = Router()
@@ -44,6 +61,7 @@ async def admin_panel_handler(message: Message):
 • Kanallar: {stats['active_channels']}
 • Jami ko'rishlar: {stats['total_views']}
 • Bugun faol: {stats['active_users_24h']}
+🕒 Yangilangan: {stats['snapshot_at'].strftime('%H:%M:%S')}
 
 🎯 <b>Nima qilmoqchisiz?</b>
 """
@@ -80,6 +98,7 @@ async def admin_panel_handler(callback: CallbackQuery):
 • Kanallar: {stats['active_channels']}
 • Jami ko'rishlar: {stats['total_views']}
 • Bugun faol: {stats['active_users_24h']}
+🕒 Yangilangan: {stats['snapshot_at'].strftime('%H:%M:%S')}
 
 🎯 <b>Nima qilmoqchisiz?</b>
 """
@@ -735,35 +754,372 @@ async def admin_statistics_handler(callback: CallbackQuery):
 
 @router.callback_query(F.data == "export_data")
 async def export_data_handler(callback: CallbackQuery):
-    """Ma'lumotlarni eksport qilish"""
+    """Ma'lumotlarni eksport qilish (oqimli, jarayon haqida xabar beriladi)"""
+    
+    if data_exporter.is_running:
+        await callback.answer("⏳ Eksport allaqachon bajarilmoqda.", show_alert=True)
+        return
+    
     await callback.answer("📊 Ma'lumotlar tayyorlanmoqda...")
+    status_message = await callback.message.answer("📦 <b>Eksport boshlandi...</b>", parse_mode="HTML")
+    
+    async def report_progress(progress):
+        await status_message.edit_text(format_export_progress(progress), parse_mode="HTML")
     
     try:
-        db_queries = DatabaseQueries()
-        backup_data = await db_queries.backup_data()
-        
-        # Faylga saqlash
-        file_path = await export_data_to_file(backup_data)
-        
-        # Faylni yuborish
-        with open(file_path, 'rb') as file:
-            await callback.message.answer_document(
-                file,
-                caption=f"📊 <b>Ma'lumotlar eksporti</b>\n\n"
-                        f"📅 Sana: {backup_data['backup_date']}\n"
-                        f"📋 Jami yozuvlar: {backup_data['total_records']}",
+        result = await data_exporter.export(progress=report_progress)
+        
+        tables_text = "\n".join(f"• {table}: {rows}" for table, rows in result['tables'].items())
+        caption = (
+            f"📊 <b>Ma'lumotlar eksporti</b>\n\n"
+            f"📅 Sana: {result['export_date']}\n"
+            f"📋 Jami yozuvlar: {result['total_records']}\n"
+            f"{tables_text}\n"
+            f"⏱ {result['duration']} s, {result['size_bytes'] / 1024 / 1024:.1f} MB"
+        )
+        
+        await status_message.edit_text("✅ <b>Eksport tayyor.</b>", parse_mode="HTML")
+        
+        if result['size_bytes'] > settings.export_max_upload_size:
+            # Telegram orqali yuborib bo'lmaydi - fayl serverda qoladi
+            await callback.message.answer(
+                caption + f"\n\n⚠️ Fayl juda katta, serverda saqlandi:\n<code>{result['path']}</code>",
                 parse_mode="HTML"
             )
+            return
+        
+        await callback.message.answer_document(
+            FSInputFile(result['path']),
+            caption=caption,
+            parse_mode="HTML"
+        )
         
         # Vaqtinchalik faylni o'chirish
-        import os
-        os.remove(file_path)
+        os.remove(result['path'])
         
     except Exception as e:
         await callback.message.answer("❌ Eksport qilishda xatolik.")
         print(f"Export error: {e}")
 
 
+@router.callback_query(F.data == "restore_data")
+async def restore_data_request_handler(callback: CallbackQuery, state: FSMContext):
+    """Eksport faylidan tiklash so'rovi"""
+    await callback.answer()
+    await state.set_state(AdminStates.restore_file_upload)
+    
+    restore_text = f"""
+♻️ <b>Ma'lumotlarni tiklash</b>
+
+📎 Eksport faylini (<code>.ndjson.gz</code>) yuboring
+
+⚠️ <b>Eslatma:</b>
+• Mavjud yozuvlar o'chirilmaydi, fayldagilar bilan birlashtiriladi
+• Bot orqali maksimal {settings.restore_max_download_size // 1024 // 1024} MB
+• Kattaroq fayllar uchun: <code>python -m app.database.restore fayl</code>
+
+❌ Bekor qilish uchun /cancel yozing
+"""
+    
+    await callback.message.edit_text(restore_text, parse_mode="HTML")
+
+
+@router.message(AdminStates.restore_file_upload, F.content_type == ContentType.DOCUMENT)
+async def restore_file_handler(message: Message, state: FSMContext):
+    """Tiklash faylini qabul qilish"""
+    
+    document = message.document
+    if not document.file_name.endswith((".ndjson", ".ndjson.gz")):
+        await message.answer("❌ Faqat eksport fayli (.ndjson yoki .ndjson.gz) qabul qilinadi.")
+        return
+    
+    if document.file_size and document.file_size > settings.restore_max_download_size:
+        await message.answer(
+            "❌ Fayl bot orqali yuklab olish uchun juda katta.\n"
+            "Serverda <code>python -m app.database.restore fayl</code> buyrug'idan foydalaning.",
+            parse_mode="HTML"
+        )
+        return
+    
+    try:
+        os.makedirs(settings.export_dir, exist_ok=True)
+        file_path = os.path.join(settings.export_dir, f"restore_{message.from_user.id}_{os.path.basename(document.file_name)}")
+        await message.bot.download(document, destination=file_path)
+        
+        await state.update_data(restore_file=file_path)
+        await state.set_state(AdminStates.restore_confirmation)
+        
+        keyboard = get_confirmation_keyboard("confirm_restore", "cancel_restore")
+        await message.answer(
+            f"♻️ <b>{document.file_name}</b> ({document.file_size / 1024 / 1024:.1f} MB)\n\n"
+            f"Ma'lumotlar tiklansinmi?",
+            reply_markup=keyboard,
+            parse_mode="HTML"
+        )
+        
+    except Exception as e:
+        await message.answer("❌ Faylni yuklab olishda xatolik.")
+        print(f"Restore download error: {e}")
+
+
+@router.callback_query(F.data == "confirm_restore", AdminStates.restore_confirmation)
+async def confirm_restore_handler(callback: CallbackQuery, state: FSMContext):
+    """Tiklashni boshlash"""
+    
+    if data_restorer.is_running:
+        await callback.answer("⏳ Tiklash allaqachon bajarilmoqda.", show_alert=True)
+        return
+    
+    await callback.answer()
+    data = await state.get_data()
+    file_path = data['restore_file']
+    await state.clear()
+    
+    status_message = callback.message
+    await status_message.edit_text("♻️ <b>Tiklash boshlandi...</b>", parse_mode="HTML")
+    
+    async def report_progress(progress):
+        await status_message.edit_text(format_restore_progress(progress), parse_mode="HTML")
+    
+    try:
+        result = await data_restorer.restore(file_path, progress=report_progress)
+        
+        result_text = "✅ <b>Ma'lumotlar tiklandi</b>\n\n"
+        for table, counts in result['tables'].items():
+            result_text += f"• {table}: {counts['rows']} qator, {counts['inserted']} qo'shildi, {counts['updated']} yangilandi\n"
+        result_text += f"\n📋 Jami: {result['total_records']} yozuv, ⏱ {result['duration']} s"
+        
+        await status_message.edit_text(result_text, parse_mode="HTML")
+        
+    except ValueError as e:
+        await status_message.edit_text(f"❌ Fayl noto'g'ri: {e}\nHech narsa o'zgartirilmadi.")
+    except Exception as e:
+        await status_message.edit_text("❌ Tiklashda xatolik. Hech narsa o'zgartirilmadi.")
+        print(f"Restore error: {e}")
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+@router.callback_query(F.data == "cancel_restore")
+async def cancel_restore_handler(callback: CallbackQuery, state: FSMContext):
+    """Tiklashni bekor qilish"""
+    await callback.answer()
+    
+    data = await state.get_data()
+    file_path = data.get('restore_file')
+    if file_path and os.path.exists(file_path):
+        os.remove(file_path)
+    
+    await state.clear()
+    await callback.message.edit_text("❌ Tiklash bekor qilindi.")
+
+
+@router.callback_query(F.data == "broadcast_message", AdminFilter())
+async def broadcast_request_handler(callback: CallbackQuery, state: FSMContext):
+    """Ommaviy xabar yuborish so'rovi"""
+    await callback.answer()
+    await state.set_state(AdminStates.broadcast_message)
+    
+    broadcast_text = """
+📢 <b>Ommaviy xabar yuborish</b>
+
+✉️ Yuboriladigan xabarni jo'nating (matn, rasm, video va h.k.)
+
+💡 Xabar foydalanuvchilarga aynan shu ko'rinishda nusxalanadi
+
+❌ Bekor qilish uchun /cancel yozing
+"""
+    
+    await callback.message.edit_text(broadcast_text, parse_mode="HTML")
+
+
+@router.message(AdminStates.broadcast_message, ~F.text.startswith("/"))
+async def broadcast_message_handler(message: Message, state: FSMContext):
+    """Yuboriladigan xabarni qabul qilish"""
+    
+    await state.update_data(broadcast_chat_id=message.chat.id, broadcast_message_id=message.message_id)
+    await state.set_state(AdminStates.broadcast_target_selection)
+    
+    await message.answer(
+        "👥 <b>Xabar kimlarga yuborilsin?</b>",
+        reply_markup=get_broadcast_target_keyboard(),
+        parse_mode="HTML"
+    )
+
+
+@router.callback_query(F.data.startswith("broadcast_target:"), AdminStates.broadcast_target_selection, AdminFilter())
+async def broadcast_target_handler(callback: CallbackQuery, state: FSMContext):
+    """Qabul qiluvchilar guruhini tanlash"""
+    await callback.answer()
+    target = callback.data.split(":", 1)[1]
+    
+    try:
+        total = await broadcast_engine.count_targets(target)
+    except Exception as e:
+        await callback.message.edit_text("❌ Foydalanuvchilarni sanashda xatolik.")
+        print(f"Broadcast count error: {e}")
+        return
+    
+    await state.update_data(broadcast_target=target)
+    await state.set_state(AdminStates.broadcast_confirmation)
+    
+    keyboard = get_confirmation_keyboard("confirm_broadcast", "cancel_broadcast")
+    await callback.message.edit_text(
+        f"📢 Xabar <b>{total}</b> ta foydalanuvchiga yuboriladi.\n"
+        f"⏱ Taxminan {total / broadcast_engine.rate / 60:.0f} daqiqa\n\n"
+        f"Yuborilsinmi?",
+        reply_markup=keyboard,
+        parse_mode="HTML"
+    )
+
+
+@router.callback_query(F.data == "confirm_broadcast", AdminStates.broadcast_confirmation, AdminFilter())
+async def confirm_broadcast_handler(callback: CallbackQuery, state: FSMContext):
+    """Yuborishni boshlash (fon rejimida, holat bazada saqlanadi)"""
+    await callback.answer()
+    data = await state.get_data()
+    await state.clear()
+    
+    try:
+        job = await broadcast_engine.create_job(
+            admin_id=callback.from_user.id,
+            from_chat_id=data['broadcast_chat_id'],
+            message_id=data['broadcast_message_id'],
+            target=data['broadcast_target']
+        )
+        
+        await callback.message.edit_text(
+            format_broadcast_progress(job),
+            reply_markup=get_broadcast_keyboard(job['id']),
+            parse_mode="HTML"
+        )
+        await broadcast_engine.set_status_message(job['id'], callback.message.message_id)
+        broadcast_engine.launch(job['id'], callback.bot)
+        
+    except Exception as e:
+        await callback.message.edit_text("❌ Xabar yuborishni boshlashda xatolik.")
+        print(f"Broadcast start error: {e}")
+
+
+@router.callback_query(F.data == "cancel_broadcast")
+async def cancel_broadcast_handler(callback: CallbackQuery, state: FSMContext):
+    """Xabar yuborishni bekor qilish (boshlanishidan oldin)"""
+    await callback.answer()
+    await state.clear()
+    await callback.message.edit_text("❌ Xabar yuborish bekor qilindi.")
+
+
+@router.callback_query(F.data.startswith("broadcast_stop:"), AdminFilter())
+async def stop_broadcast_handler(callback: CallbackQuery):
+    """Yuborilayotgan xabarni to'xtatish"""
+    job_id = int(callback.data.split(":", 1)[1])
+    
+    try:
+        job = await broadcast_engine.cancel_job(job_id)
+    except Exception as e:
+        await callback.answer("❌ Xatolik yuz berdi.", show_alert=True)
+        print(f"Broadcast stop error: {e}")
+        return
+    
+    if job is None:
+        await callback.answer("Bu vazifa allaqachon tugagan.", show_alert=True)
+        return
+    
+    await callback.answer("⏹ To'xtatilmoqda...")
+    await callback.message.edit_text(format_broadcast_progress(job), parse_mode="HTML")
+
+
+@router.message(Command("cache_stats"))
+async def cache_stats_handler(message: Message):
+    """Keshlar va fon yozuvchilari holati"""
+    
+    users = user_cache.stats()
+    channels = channel_registry.stats()
+    subscriptions = subscription_service.stats()
+    pool = await get_pool_stats()
+    api = api_throttle_middleware.stats()
+    reconcile = subscription_reconciler.stats()
+    search = movie_index.search.stats() if movie_index.search is not None else None
+    search_line = f"\n🔎 <b>Qidiruv indeksi:</b> {search['tokens']} so'z, {search['prefixes']} prefiks" if search else ""
+    
+    stats_text = f"""
+🧠 <b>Kesh Statistikasi</b>
+
+👥 <b>Foydalanuvchilar:</b>
+• Hajm: {users['size']}/{users['max_size']}
+• Hit/Miss: {users['hits']}/{users['misses']} ({users['hit_ratio']:.1%})
+
+📺 <b>Faol kanallar:</b>
+• Versiya: {channels['version']}
+• Kanallar: {channels['channels']}
+• Hit/Miss: {channels['hits']}/{channels['misses']} ({channels['hit_ratio']:.1%})
+
+✅ <b>Obuna keshi:</b>
+• Obuna bo'lganlar: {subscriptions['positive']['size']} (hit {subscriptions['positive']['hits']})
+• Obuna bo'lmaganlar: {subscriptions['negative']['size']} (hit {subscriptions['negative']['hits']})
+• DB dan javob: {subscriptions['db_answers']}
+• chat_member: +{subscriptions['membership']['joins']} / -{subscriptions['membership']['leaves']}
+• Qayta tekshirish: {reconcile['passes']} marta, {reconcile['checked']} foydalanuvchi, +{reconcile['joins']} / -{reconcile['leaves']}
+
+🎬 <b>Kino indeksi:</b> {len(movie_index)} ta kino{search_line}
+
+⏳ <b>Yozilishini kutmoqda:</b>
+• Faollik: {activity_buffer.pending_count}
+• Ko'rishlar: {view_writer.pending_count}
+• A'zoliklar: {subscriptions['membership']['pending']}
+
+📡 <b>Telegram API:</b>
+• So'rovlar: {api['requests']} (kutganlar: {api['throttled']}, jami {api['throttle_wait']} s)
+• Ommaviy xabarlar navbati: {api['background_wait']} s
+• RetryAfter: {api['retry_after']} ({api['retry_after_wait']} s)
+• Qayta urinishlar: {api['network_retries']}, muvaffaqiyatsiz: {api['failed']}
+"""
+    
+    if pool['status'] == "connected":
+        stats_text += f"""
+🗄 <b>DB pool:</b>
+• Ulanishlar: {pool['size']}/{pool['max_size']} (band: {pool['in_use']}, eng ko'p: {pool['in_use_high_water']})
+• Kutish: o'rtacha {pool['wait_avg_ms']} ms, maks {pool['wait_max_ms']} ms
+• Pool to'la: {pool['exhausted']} marta (navbat eng ko'p: {pool['waiting_high_water']}), timeout: {pool['timeouts']}
+• Birlashtirilgan so'rovlar: {pool['coalesced_queries']}
+"""
+        
+        read_pool = pool['read_pool']
+        if read_pool['status'] == "connected":
+            stats_text += f"""
+📖 <b>Read-only pool:</b>
+• Ulanishlar: {read_pool['size']}/{read_pool['max_size']} (band: {read_pool['in_use']})
+• Kutish: o'rtacha {read_pool['wait_avg_ms']} ms, maks {read_pool['wait_max_ms']} ms
+• Asosiy pool ga qaytishlar: {read_pool['fallbacks']}
+"""
+        elif read_pool['status'] == "fallback":
+            stats_text += f"\n📖 <b>Read-only pool:</b> ulanmagan, hisobotlar asosiy pool da ({read_pool['fallbacks']} ta so'rov)\n"
+    
+    await message.answer(stats_text, parse_mode="HTML")
+
+
+@router.message(Command("refresh_stats"))
+async def refresh_stats_handler(message: Message):
+    """Platforma statistikasini majburan qayta hisoblash"""
+    
+    try:
+        stats = await platform_stats.refresh()
+        
+        await message.answer(
+            f"✅ Statistika yangilandi ({stats['snapshot_at'].strftime('%H:%M:%S')})\n\n"
+            f"👥 Foydalanuvchilar: {stats['total_users']}\n"
+            f"🎬 Kinolar: {stats['total_movies']}\n"
+            f"👁 Jami ko'rishlar: {stats['total_views']}\n"
+            f"🔥 Bugun faol: {stats['active_users_24h']}",
+            parse_mode="HTML"
+        )
+        
+    except Exception as e:
+        await message.answer("❌ Statistikani yangilashda xatolik.")
+        print(f"Refresh stats error: {e}")
+
+
 @router.message(Command("cancel"), AdminStates())
 async def cancel_admin_action_handler(message: Message, state: FSMContext):
     """Admin amallarini bekor qilish"""
@@ -7,8 +7,15 @@ from aiogram.types import Message, CallbackQuery, ChatMemberUpdated
 from aiogram.filters import ChatMemberUpdatedFilter
 
 from app.database import DatabaseQueries
+from app.database.channel_registry import channel_registry
+from app.database.membership import membership_writer
 from app.keyboards.inline_keyboards import get_subscription_keyboard, get_channels_list_keyboard
-from app.utils.channel_checker import check_user_channel_subscription, get_unsubscribed_channels_text
+from app.utils.channel_checker import (
+    check_user_channel_subscription,
+    get_unsubscribed_channels_text,
+    is_member_status,
+    subscription_service
+)
 
 router = Router()
 
@@ -32,7 +39,7 @@ async def channels_list_handler(message: Message):
         
         # Foydalanuvchi obuna holatini tekshirish
         user = await db_queries.get_user_by_tg_id(message.from_user.id)
-        subscription_info = await db_queries.check_user_subscription(user.id) if user else None
+        subscription_info = await db_queries.check_user_subscription(user.id, user=user) if user else None
         
         channels_text = "📺 <b>Majburiy Kanallar Ro'yxati</b>\n\n"
         
@@ -158,7 +165,7 @@ async def verify_subscription_handler(callback: CallbackQuery):
             await db_queries.add_user_to_channel(user.id, channel_id)
             
             # Barcha kanallarga obuna bo'lganligini tekshirish
-            subscription_info = await db_queries.check_user_subscription(user.id)
+            subscription_info = await db_queries.check_user_subscription(user.id, user=user)
             
             if subscription_info.is_subscribed_to_all():
                 success_text = f"""
@@ -260,7 +267,7 @@ async def join_all_channels_handler(callback: CallbackQuery):
             await callback.answer("❌ Foydalanuvchi topilmadi.", show_alert=True)
             return
         
-        subscription_info = await db_queries.check_user_subscription(user.id)
+        subscription_info = await db_queries.check_user_subscription(user.id, user=user)
         unsubscribed_channels = subscription_info.get_unjoined_channels()
         
         if not unsubscribed_channels:
@@ -330,7 +337,7 @@ async def verify_all_subscriptions_handler(callback: CallbackQuery):
             return
         
         # Hozirgi obuna holatini olish
-        subscription_info = await db_queries.check_user_subscription(user.id)
+        subscription_info = await db_queries.check_user_subscription(user.id, user=user)
         unsubscribed_channels = subscription_info.get_unjoined_channels()
         
         verified_channels = []
@@ -416,6 +423,26 @@ async def user_blocked_bot_handler(event: ChatMemberUpdated):
         print(f"User chat member update error: {e}")
 
 
+@router.chat_member(ChatMemberUpdatedFilter(member_status_changed=True))
+async def channel_member_update_handler(event: ChatMemberUpdated):
+    """Majburiy kanalga obuna bo'lish/chiqish (bot kanalda admin bo'lsa keladi)"""
+    
+    try:
+        active_channels = await channel_registry.get_active_channels()
+        if event.chat.id not in {channel.channel_id for channel in active_channels}:
+            return
+        
+        user_id = event.new_chat_member.user.id
+        is_member = is_member_status(event.new_chat_member)
+        
+        # Kesh darhol, DB esa paket bilan yangilanadi
+        subscription_service.remember(user_id, event.chat.id, is_member)
+        membership_writer.record(user_id, event.chat.id, is_member)
+        
+    except Exception as e:
+        print(f"Channel member update error: {e}")
+
+
 def register_channel_handlers(dp):
     """Channel handlerlarni ro'yxatga olish"""
     dp.include_router(router)
\ No newline at end of file
@@ -2,22 +2,24 @@
 Kino bilan bog'liq handlerlar
 """
 
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 
-from app.database import DatabaseQueries
+from app.database import DatabaseQueries, User
 from app.filters.movie_code_filter import MovieCodeFilter
 from app.filters.channel_filter import ChannelSubscriptionFilter
 from app.keyboards.inline_keyboards import get_movie_keyboard, get_movie_subscription_keyboard, get_subscription_keyboard, get_subscription_required_keyboard
 from app.utils.movie_manager import send_movie_to_user, check_movie_access
-from app.utils.channel_checker import check_user_channel_subscription, get_unsubscribed_channels_text
+from app.utils.channel_checker import get_unsubscribed_channels_text, subscription_service
 
 from app.config import settings
 router = Router()
 
 
 @router.message(MovieCodeFilter(), ChannelSubscriptionFilter())
-async def movie_request_handler(message: Message):
+async def movie_request_handler(message: Message, user_db: Optional[User] = None):
     """Kino kodini ishlov berish (obuna bo'lgan foydalanuvchilar uchun)"""
     
     movie_code = message.text.strip().upper()
@@ -39,8 +41,8 @@ async def movie_request_handler(message: Message):
             )
             return
         
-        # Foydalanuvchini aniqlash
-        user = await db_queries.get_user_by_tg_id(message.from_user.id)
+        # Foydalanuvchini aniqlash (middleware yuklagan obyekt)
+        user = user_db or await db_queries.get_user_by_tg_id(message.from_user.id)
         if not user:
             await message.answer("❌ Foydalanuvchi topilmadi. /start bosing.")
             return
@@ -54,7 +56,7 @@ async def movie_request_handler(message: Message):
 
 
 @router.message(MovieCodeFilter())
-async def movie_request_no_subscription_handler(message: Message):
+async def movie_request_no_subscription_handler(message: Message, user_db: Optional[User] = None):
     """Kino kodini ishlov berish (obuna bo'lmagan foydalanuvchilar uchun)"""
     
     movie_code = message.text.strip().upper()
@@ -71,22 +73,17 @@ async def movie_request_no_subscription_handler(message: Message):
             )
             return
         
-        # Foydalanuvchini aniqlash
-        user = await db_queries.get_user_by_tg_id(message.from_user.id)
+        # Foydalanuvchini aniqlash (middleware yuklagan obyekt)
+        user = user_db or await db_queries.get_user_by_tg_id(message.from_user.id)
         if not user:
             await message.answer("❌ Foydalanuvchi topilmadi. /start bosing.")
             return
         
-        # Obuna holatini tekshirish
+        # Obuna holatini tekshirish (barcha kanallar parallel)
         active_channels = await db_queries.get_active_channels()
-        unsubscribed_channels = []
-        for channel in active_channels:
-            if not await check_user_channel_subscription(
-                message.bot, 
-                message.from_user.id, 
-                channel.channel_id
-            ):
-                unsubscribed_channels.append(channel)
+        unsubscribed_channels = await subscription_service.get_unsubscribed_channels(
+            message.bot, message.from_user.id, active_channels
+        )
         
         if unsubscribed_channels:
             # Obuna bo'lmagan kanallar haqida xabar
@@ -134,7 +131,7 @@ async def watch_movie_handler(callback: CallbackQuery):
             return
         
         # Obuna holatini qayta tekshirish
-        subscription_info = await db_queries.check_user_subscription(user.id)
+        subscription_info = await db_queries.check_user_subscription(user.id, user=user)
         
         if not subscription_info.is_subscribed_to_all():
             unsubscribed_channels = subscription_info.get_unjoined_channels()
@@ -270,11 +267,10 @@ async def check_subscription_handler(callback: CallbackQuery):
         active_channels = await db_queries.get_active_channels()
         bot = callback.bot
 
-        unsubscribed_channels = []
-        for channel in active_channels:
-            print(await check_user_channel_subscription(bot, callback.from_user.id, channel.channel_id))
-            if not await check_user_channel_subscription(bot, callback.from_user.id, channel.channel_id):
-                unsubscribed_channels.append(channel)
+        # Foydalanuvchi hozirgina obuna bo'lgan bo'lishi mumkin - salbiy kesh ishlatilmaydi
+        unsubscribed_channels = await subscription_service.get_unsubscribed_channels(
+            bot, callback.from_user.id, active_channels, skip_negative_cache=True
+        )
         print(f"Unsubscribed channels: {[channel.title for channel in unsubscribed_channels]}")
         if unsubscribed_channels:
         # Obuna bo'lmagan kanallar bor
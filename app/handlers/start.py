@@ -6,9 +6,9 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command, CommandStart
 from aiogram.fsm.context import FSMContext
-from typing import List
+from typing import List, Optional
 
-from app.database import DatabaseQueries
+from app.database import DatabaseQueries, User
 from app.keyboards.inline_keyboards import (
     get_main_menu_keyboard,
     get_movie_subscription_keyboard,
@@ -16,26 +16,29 @@ from app.keyboards.inline_keyboards import (
 )
 from app.keyboards.reply_keyboards import get_main_reply_keyboard
 from app.states.user_states import UserStates
-from app.utils.channel_checker import check_user_channel_subscription
+from app.utils.channel_checker import subscription_service
 from app.utils.movie_manager import send_movie_to_user, send_movie_to_user_from_private
 
 router = Router()
 
 
 @router.message(CommandStart())
-async def start_handler(message: Message, state: FSMContext):
+async def start_handler(message: Message, state: FSMContext, user_db: Optional[User] = None):
     """Start komandasi handleri - kod bilan yoki kodsiz"""
     await state.clear()
     
     db_queries = DatabaseQueries()
     
     try:
-        # Foydalanuvchini ro'yxatdan o'tkazish yoki yangilash
-        user = await db_queries.create_user(
-            tg_id=message.from_user.id,
-            full_name=message.from_user.full_name or "Noma'lum",
-            is_admin=False
-        )
+        # AuthMiddleware foydalanuvchini allaqachon ro'yxatdan o'tkazgan
+        user = user_db
+        if user is None:
+            # Foydalanuvchini ro'yxatdan o'tkazish yoki yangilash
+            user = await db_queries.create_user(
+                tg_id=message.from_user.id,
+                full_name=message.from_user.full_name or "Noma'lum",
+                is_admin=False
+            )
         
         # Start parametrini tekshirish (kino kodi)
         start_param = message.text.split()
@@ -74,17 +77,11 @@ async def handle_movie_request_with_code(message: Message, user, movie_code: str
             )
             return
         
-        # Obuna holatini tekshirish
-        subscription_info = await db_queries.get_active_channels()
-        print(f"Subscription info: {subscription_info}")
-        
-        unsubscribed_channels = []
-        for channel in subscription_info:
-            is_subscribed = await check_user_channel_subscription(
-                message.bot, user.tg_id, channel.channel_id
-            )
-            if not is_subscribed:
-                unsubscribed_channels.append(channel)
+        # Obuna holatini tekshirish (barcha kanallar parallel)
+        active_channels = await db_queries.get_active_channels()
+        unsubscribed_channels = await subscription_service.get_unsubscribed_channels(
+            message.bot, user.tg_id, active_channels
+        )
         
         if unsubscribed_channels:
             # Obuna bo'lmagan kanallar bor
@@ -174,15 +171,9 @@ Bu bot orqali siz:
     #  get active channels
 
     active_channels = await db_queries.get_active_channels()
-    
-
-    unsubscribed_channels = []
-    for channel in active_channels:
-        is_subscribed = await check_user_channel_subscription(
-            message.bot, user.tg_id, channel.channel_id
-        )
-        if not is_subscribed:
-            unsubscribed_channels.append(channel)
+    unsubscribed_channels = await subscription_service.get_unsubscribed_channels(
+        message.bot, user.tg_id, active_channels
+    )
     
     if unsubscribed_channels:
         # Obuna bo'lmagan kanallar bor
@@ -203,7 +194,7 @@ Bu bot orqali siz:
 
 
 @router.callback_query(F.data.startswith("check_subscription_for_movie:"))
-async def check_subscription_for_movie_handler(callback: CallbackQuery):
+async def check_subscription_for_movie_handler(callback: CallbackQuery, user_db: Optional[User] = None):
         """Kino uchun obuna holatini tekshirish"""
         await callback.answer("🔄 Obuna holati tekshirilmoqda...")
         
@@ -214,7 +205,7 @@ async def check_subscription_for_movie_handler(callback: CallbackQuery):
         db_queries = DatabaseQueries()
         
         # Foydalanuvchini topish
-        user = await db_queries.get_user_by_tg_id(callback.from_user.id)
+        user = user_db or await db_queries.get_user_by_tg_id(callback.from_user.id)
         if not user:
             await callback.message.edit_text("❌ Foydalanuvchi topilmadi. /start bosing.")
             return
@@ -228,22 +219,17 @@ async def check_subscription_for_movie_handler(callback: CallbackQuery):
         # Obuna holatini tekshirish
         subscription_info = await db_queries.get_active_channels()
         
-        # Har bir kanalga real tekshirish (Telegram API orqali)
+        # Har bir kanalga real tekshirish (Telegram API orqali, parallel).
+        # Foydalanuvchi hozirgina obuna bo'lgan bo'lishi mumkin - salbiy kesh ishlatilmaydi
+        checked_channels = await subscription_service.check_channels(
+            callback.bot, callback.from_user.id, subscription_info,
+            skip_negative_cache=True
+        )
+        
         unsubscribed_channels = []
         verified_channels = []
         
-        for channel in subscription_info:
-           
-            # Agar channel_id mavjud bo'lsa, uni ishlatish
-            if channel.channel_id:
-                is_subscribed = await check_user_channel_subscription(
-                    callback.bot, callback.from_user.id, channel.channel_id
-                )
-            else:
-                is_subscribed = await check_user_channel_subscription(
-                    callback.bot, callback.from_user.id, channel.channel_username
-                )
-            
+        for channel, is_subscribed in checked_channels:
             if is_subscribed:
                 # Ma'lumotlar bazasini yangilash
                 await db_queries.add_user_to_channel(user.id, channel.id)
@@ -389,6 +375,8 @@ async def stats_handler(message: Message):
 • Faol kanallar: {stats['active_channels']}
 
 👑 <b>Adminlar:</b> {stats['admin_count']}
+
+🕒 <i>Yangilangan: {stats['snapshot_at'].strftime('%H:%M:%S')}</i>
 """
         
         await message.answer(stats_text, parse_mode="HTML")
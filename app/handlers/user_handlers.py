@@ -6,18 +6,38 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 
-from app.database import DatabaseQueries
+from typing import List
+
+from app.config import settings
+from app.database import DatabaseQueries, Movie
 from app.keyboards.inline_keyboards import (
-    get_movie_search_keyboard, 
     get_pagination_keyboard,
     get_movie_detail_keyboard
 )
 from app.states.user_states import UserStates
 from app.filters.channel_filter import ChannelSubscriptionFilter
+from app.utils.movie_manager import encode_page_callback, decode_page_callback, format_movie_list
 
 router = Router()
 
 
+def build_page_keyboard(order: str, page: int, movies: List[Movie], has_next: bool):
+    """Sahifa klaviaturasi: mashhur/yangi uchun keyset kursorlar, qidiruv uchun sahifa raqami"""
+    prev_data = next_data = None
+    
+    if order == "search" or page == 2:
+        # Qidiruv natijalari keshda; 1-sahifa doim boshidan o'qiladi
+        prev_data = encode_page_callback(order, page - 1) if page > 1 else None
+    elif page > 2:
+        prev_data = encode_page_callback(order, page - 1, DatabaseQueries.page_cursor(order, movies[0]), before=True)
+    
+    if has_next:
+        cursor = None if order == "search" else DatabaseQueries.page_cursor(order, movies[-1])
+        next_data = encode_page_callback(order, page + 1, cursor)
+    
+    return get_pagination_keyboard(page, movies, prev_data, next_data)
+
+
 @router.message(F.text == "🔍 Qidirish")
 async def search_request_handler(message: Message, state: FSMContext):
     """Qidirish so'rovi"""
@@ -46,8 +66,8 @@ async def search_movies_handler(message: Message, state: FSMContext):
     db_queries = DatabaseQueries()
     
     try:
-        # Kinolarni qidirish
-        movies = await db_queries.search_movies(search_query, limit=10)
+        # Kinolarni qidirish (keyingi sahifalar uchun natijalar FSM ma'lumotlarida saqlanadi)
+        movies = await db_queries.search_movies(search_query, limit=settings.search_max_results)
         
         if not movies:
             await message.answer(
@@ -57,15 +77,13 @@ async def search_movies_handler(message: Message, state: FSMContext):
             )
             return
         
-        # Natijalarni ko'rsatish
-        results_text = f"🔍 <b>'{search_query}' uchun natijalar:</b>\n\n"
-        
-        for i, movie in enumerate(movies, 1):
-            results_text += f"{i}. <b>{movie.title}</b>\n"
-            results_text += f"   📝 Kod: <code>{movie.code}</code>\n"
-            results_text += f"   👁 Ko'rishlar: {movie.view_count}\n\n"
+        # FSM storage orqali: FSM_STORAGE=postgres bo'lsa barcha jarayonlarga ko'rinadi
+        await state.update_data(search_query=search_query, search_ids=[movie.id for movie in movies])
         
-        keyboard = get_movie_search_keyboard(movies)
+        # Natijalarni ko'rsatish
+        page_movies = movies[:settings.movies_page_size]
+        results_text = format_movie_list(f"🔍 <b>'{search_query}' uchun natijalar:</b>", page_movies)
+        keyboard = build_page_keyboard("search", 1, page_movies, len(movies) > len(page_movies))
         
         await message.answer(
             results_text,
@@ -84,20 +102,14 @@ async def popular_movies_handler(message: Message):
     db_queries = DatabaseQueries()
     
     try:
-        movies = await db_queries.get_popular_movies(limit=10)
+        movies, has_next = await db_queries.get_movies_page("popular", limit=settings.movies_page_size)
         
         if not movies:
             await message.answer("❌ Hozircha kinolar mavjud emas.")
             return
         
-        popular_text = "📊 <b>Eng mashhur kinolar:</b>\n\n"
-        
-        for i, movie in enumerate(movies, 1):
-            popular_text += f"{i}. <b>{movie.title}</b>\n"
-            popular_text += f"   📝 Kod: <code>{movie.code}</code>\n"
-            popular_text += f"   👁 Ko'rishlar: {movie.view_count}\n\n"
-        
-        keyboard = get_movie_search_keyboard(movies)
+        popular_text = format_movie_list("📊 <b>Eng mashhur kinolar:</b>", movies)
+        keyboard = build_page_keyboard("popular", 1, movies, has_next)
         
         await message.answer(
             popular_text,
@@ -116,20 +128,14 @@ async def recent_movies_handler(message: Message):
     db_queries = DatabaseQueries()
     
     try:
-        movies = await db_queries.get_recent_movies(limit=10)
+        movies, has_next = await db_queries.get_movies_page("recent", limit=settings.movies_page_size)
         
         if not movies:
             await message.answer("❌ Hozircha kinolar mavjud emas.")
             return
         
-        recent_text = "🆕 <b>Yangi qo'shilgan kinolar:</b>\n\n"
-        
-        for i, movie in enumerate(movies, 1):
-            recent_text += f"{i}. <b>{movie.title}</b>\n"
-            recent_text += f"   📝 Kod: <code>{movie.code}</code>\n"
-            recent_text += f"   📅 Qo'shilgan: {movie.created_at.strftime('%Y-%m-%d')}\n\n"
-        
-        keyboard = get_movie_search_keyboard(movies)
+        recent_text = format_movie_list("🆕 <b>Yangi qo'shilgan kinolar:</b>", movies, show_date=True)
+        keyboard = build_page_keyboard("recent", 1, movies, has_next)
         
         await message.answer(
             recent_text,
@@ -233,51 +239,47 @@ async def user_history_handler(message: Message):
 
 
 @router.callback_query(F.data.startswith("page:"))
-async def pagination_handler(callback: CallbackQuery):
+async def pagination_handler(callback: CallbackQuery, state: FSMContext):
     """Sahifalash handleri"""
     await callback.answer()
     
     try:
-        page_data = callback.data.split(":")
-        page_type = page_data[1]  # popular, recent, search
-        page_num = int(page_data[2])
+        page_type, page_num, cursor, before = decode_page_callback(callback.data)  # popular, recent, search
+        page_size = settings.movies_page_size
+        start_idx = (page_num - 1) * page_size
         
         db_queries = DatabaseQueries()
         
-        # Sahifaga qarab kinolarni olish
-        if page_type == "popular":
-            movies = await db_queries.get_popular_movies(limit=10)
-        elif page_type == "recent":
-            movies = await db_queries.get_recent_movies(limit=10)
+        if page_type == "search":
+            # Natijalar birinchi qidiruvda FSM ma'lumotlariga yozilgan
+            data = await state.get_data()
+            search_ids = data.get("search_ids")
+            if not search_ids:
+                await callback.message.edit_text("⌛ Qidiruv natijalari eskirdi. Qaytadan qidiring.")
+                return
+            
+            ids = search_ids[start_idx:start_idx + page_size]
+            movies = [movie for movie in [await db_queries.get_movie_by_id(movie_id) for movie_id in ids] if movie]
+            has_next = len(search_ids) > start_idx + page_size
+            header = f"🔍 <b>'{data.get('search_query', '')}' uchun natijalar</b> (Sahifa {page_num}):"
+        elif page_type in ("popular", "recent"):
+            movies, has_more = await db_queries.get_movies_page(page_type, page_size, cursor, before)
+            # Orqaga qaytilganda keyingi sahifa bor (undan kelindi)
+            has_next = True if before else has_more
+            if page_type == "popular":
+                header = f"📊 <b>Mashhur kinolar</b> (Sahifa {page_num}):"
+            else:
+                header = f"🆕 <b>Yangi kinolar</b> (Sahifa {page_num}):"
         else:
-            # Search uchun query ni saqlab qolish kerak bo'ladi
             await callback.message.edit_text("❌ Sahifalash xatoligi.")
             return
         
-        # Sahifa ma'lumotlarini hisoblash
-        items_per_page = 5
-        start_idx = (page_num - 1) * items_per_page
-        end_idx = start_idx + items_per_page
-        page_movies = movies[start_idx:end_idx]
-        
-        if not page_movies:
+        if not movies:
             await callback.message.edit_text("❌ Bu sahifada kinolar mavjud emas.")
             return
         
-        # Matnni yangilash
-        if page_type == "popular":
-            text = f"📊 <b>Mashhur kinolar</b> (Sahifa {page_num}):\n\n"
-        else:
-            text = f"🆕 <b>Yangi kinolar</b> (Sahifa {page_num}):\n\n"
-        
-        for i, movie in enumerate(page_movies, start_idx + 1):
-            text += f"{i}. <b>{movie.title}</b>\n"
-            text += f"   📝 Kod: <code>{movie.code}</code>\n"
-            text += f"   👁 Ko'rishlar: {movie.view_count}\n\n"
-        
-        # Yangi klaviatura
-        total_pages = (len(movies) + items_per_page - 1) // items_per_page
-        keyboard = get_pagination_keyboard(page_type, page_num, total_pages, page_movies)
+        text = format_movie_list(header, movies, start_idx + 1, show_date=page_type == "recent")
+        keyboard = build_page_keyboard(page_type, page_num, movies, has_next)
         
         await callback.message.edit_text(
             text,
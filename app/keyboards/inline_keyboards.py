@@ -39,7 +39,10 @@ def get_admin_main_keyboard() -> InlineKeyboardMarkup:
             InlineKeyboardButton(text="👥 Foydalanuvchilar", callback_data="admin_users"),
             InlineKeyboardButton(text="📊 Statistika", callback_data="admin_statistics")
         ],
-        [InlineKeyboardButton(text="📤 Eksport", callback_data="export_data")],
+        [
+            InlineKeyboardButton(text="📤 Eksport", callback_data="export_data"),
+            InlineKeyboardButton(text="♻️ Tiklash", callback_data="restore_data")
+        ],
         [InlineKeyboardButton(text="🔙 Orqaga", callback_data="back_to_main")]
     ]
     
@@ -106,6 +109,31 @@ def get_admin_users_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+def get_broadcast_target_keyboard() -> InlineKeyboardMarkup:
+    """Xabar qabul qiluvchilarni tanlash"""
+    
+    buttons = [
+        [InlineKeyboardButton(text="👥 Barcha foydalanuvchilar", callback_data="broadcast_target:all")],
+        [
+            InlineKeyboardButton(text="🔥 7 kunda faol", callback_data="broadcast_target:active_7d"),
+            InlineKeyboardButton(text="📅 30 kunda faol", callback_data="broadcast_target:active_30d")
+        ],
+        [InlineKeyboardButton(text="❌ Bekor qilish", callback_data="cancel_broadcast")]
+    ]
+    
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def get_broadcast_keyboard(job_id: int) -> InlineKeyboardMarkup:
+    """Yuborilayotgan xabarni to'xtatish"""
+    
+    buttons = [
+        [InlineKeyboardButton(text="⏹ To'xtatish", callback_data=f"broadcast_stop:{job_id}")]
+    ]
+    
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
 def get_movie_search_keyboard(movies: List[Movie]) -> InlineKeyboardMarkup:
     """Kino qidirish natijalari klaviaturasi"""
     
@@ -219,39 +247,34 @@ def get_confirmation_keyboard(confirm_data: str, cancel_data: str) -> InlineKeyb
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def get_pagination_keyboard(page_type: str, current_page: int, total_pages: int, items: List) -> InlineKeyboardMarkup:
-    """Sahifalash klaviaturasi"""
+def get_pagination_keyboard(current_page: int, items: List, prev_data: Optional[str] = None,
+                            next_data: Optional[str] = None) -> InlineKeyboardMarkup:
+    """Sahifalash klaviaturasi (prev_data/next_data - qo'shni sahifalar callback_data si)"""
     
     buttons = []
     
-    # Elementlar tugmalari
+    # Kinolar tugmalari
     for item in items:
-        if hasattr(item, 'title'):  # Movie yoki Channel
-            buttons.append([InlineKeyboardButton(
-                text=f"🎬 {item.title}",
-                callback_data=f"item_detail:{item.id}"
-            )])
+        buttons.append([InlineKeyboardButton(
+            text=f"🎬 {item.title}",
+            callback_data=f"movie_detail:{item.id}"
+        )])
     
     # Sahifalash tugmalari
     nav_buttons = []
     
-    if current_page > 1:
-        nav_buttons.append(InlineKeyboardButton(
-            text="⬅️ Oldingi",
-            callback_data=f"page:{page_type}:{current_page-1}"
-        ))
-    
-    nav_buttons.append(InlineKeyboardButton(
-        text=f"{current_page}/{total_pages}",
-        callback_data="current_page"
-    ))
+    if prev_data:
+        nav_buttons.append(InlineKeyboardButton(text="⬅️ Oldingi", callback_data=prev_data))
     
-    if current_page < total_pages:
+    if prev_data or next_data:
         nav_buttons.append(InlineKeyboardButton(
-            text="➡️ Keyingi", 
-            callback_data=f"page:{page_type}:{current_page+1}"
+            text=f"📄 {current_page}",
+            callback_data="current_page"
         ))
     
+    if next_data:
+        nav_buttons.append(InlineKeyboardButton(text="➡️ Keyingi", callback_data=next_data))
+    
     if nav_buttons:
         buttons.append(nav_buttons)
     
@@ -7,6 +7,7 @@ from aiogram import Dispatcher
 from .auth_middleware import AuthMiddleware
 from .channel_middleware import ChannelSubscriptionMiddleware
 from .admin_middleware import AdminMiddleware
+from .api_throttle_middleware import ApiThrottleMiddleware
 
 
 def register_all_middlewares(dp: Dispatcher) -> None:
@@ -14,9 +15,9 @@ def register_all_middlewares(dp: Dispatcher) -> None:
     
     # Middleware tartibini saqlash muhim!
     
-    # 1. Auth middleware - har doim birinchi
-    dp.message.middleware(AuthMiddleware())
-    dp.callback_query.middleware(AuthMiddleware())
+    # 1. Auth middleware - har doim birinchi (outer: filtrlar ham user_db dan foydalanadi)
+    dp.message.outer_middleware(AuthMiddleware())
+    dp.callback_query.outer_middleware(AuthMiddleware())
     
     # 2. Admin middleware - admin handlerlar uchun
     dp.message.middleware(AdminMiddleware())
@@ -32,5 +33,6 @@ __all__ = [
     "register_all_middlewares",
     "AuthMiddleware",
     "ChannelSubscriptionMiddleware", 
-    "AdminMiddleware"
+    "AdminMiddleware",
+    "ApiThrottleMiddleware"
 ]
\ No newline at end of file
@@ -2,11 +2,11 @@
 Admin tekshirish middleware
 """
 
-from typing import Any, Awaitable, Callable, Dict
+from typing import Any, Awaitable, Callable, Dict, Optional
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, CallbackQuery
 
-from app.database import DatabaseQueries
+from app.database import DatabaseQueries, User
 from app.config import settings
 
 
@@ -27,7 +27,7 @@ class AdminMiddleware(BaseMiddleware):
             user = event.from_user
         
         if user and not user.is_bot:
-            admin_status = await self._check_admin_status(user.id)
+            admin_status = await self._check_admin_status(user.id, data.get('user_db'))
             
             # Admin ma'lumotlarini data ga qo'shish
             data['is_admin'] = admin_status['is_admin']
@@ -41,20 +41,22 @@ class AdminMiddleware(BaseMiddleware):
         
         return await handler(event, data)
     
-    async def _check_admin_status(self, user_tg_id: int) -> Dict[str, Any]:
+    async def _check_admin_status(self, user_tg_id: int, user: Optional[User] = None) -> Dict[str, Any]:
         """Admin holatini tekshirish"""
         
         db_queries = DatabaseQueries()
         
         try:
-            # Ma'lumotlar bazasidan tekshirish
-            user = await db_queries.get_user_by_tg_id(user_tg_id)
+            # AuthMiddleware yuklagan foydalanuvchi bo'lmasa, kesh/DB dan olish
+            if user is None:
+                user = await db_queries.get_user_by_tg_id(user_tg_id)
             
             is_admin = False
             is_super_admin = False
             admin_level = 0
             
-            if user and user.is_admin:
+            # Keshdagi "admin" eskirgan bo'lishi mumkin - DB dan tasdiqlash
+            if user and user.is_admin and await db_queries.check_user_admin(user_tg_id):
                 is_admin = True
                 admin_level = 1
             
@@ -0,0 +1,165 @@
+"""
+Chiquvchi Telegram API so'rovlari uchun tezlik cheklagich (Bot session middleware)
+
+Xabar yuboruvchi metodlar (send*, copyMessage, forwardMessage, editMessage*)
+umumiy va chat bo'yicha token bucket lardan o'tadi. RetryAfter kelsa o'sha chat
+(chat_id bo'lmasa barcha yuborishlar) ko'rsatilgan vaqtga to'xtatiladi va so'rov
+qayta yuboriladi; tarmoq va 5xx xatolarida so'rov tasodifiy kechikish (jitter)
+bilan takrorlanadi.
+
+background_lane o'rnatilgan kontekstdagi so'rovlar (ommaviy xabarlar) umumiy
+limitdan faqat foydalanuvchilarga javoblar kutmayotganda foydalanadi.
+"""
+
+import asyncio
+import logging
+import random
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+from app.config import settings
+from app.utils.rate_limiter import KeyedRateLimiter, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Telegram flood limitlari hisoblanadigan metodlar
+THROTTLED_PREFIXES = ("send", "copyMessage", "forwardMessage", "editMessage")
+UNTHROTTLED_METHODS = ("sendChatAction",)
+
+# Past ustuvorlikdagi so'rovlar belgisi (broadcast.deliver o'rnatadi)
+background_lane: ContextVar[bool] = ContextVar("background_lane", default=False)
+
+
+class ApiThrottleMiddleware(BaseRequestMiddleware):
+    """Bot orqali yuboriladigan barcha so'rovlarni Telegram limitlariga moslash"""
+
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: int = 3,
+                 group_rate: float = 20 / 60, max_retries: int = 3, retry_base_delay: float = 0.5,
+                 max_retry_after: float = 30.0):
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.max_retry_after = max_retry_after
+
+        self.global_bucket = TokenBucket(global_rate)
+        # Shaxsiy chatlar ~1 xabar/s, guruh va kanallar ~20 xabar/daqiqa
+        self.chats = KeyedRateLimiter(chat_rate, capacity=chat_burst)
+        self.groups = KeyedRateLimiter(group_rate, capacity=chat_burst)
+
+        # Metrikalar
+        self.requests = 0
+        self.throttled = 0
+        self.throttle_wait = 0.0
+        self.retry_after = 0
+        self.retry_after_wait = 0.0
+        self.network_retries = 0
+        self.failed = 0
+        self.background_wait = 0.0
+
+    @staticmethod
+    def is_throttled(method: TelegramMethod) -> bool:
+        name = method.__api_method__
+        return name.startswith(THROTTLED_PREFIXES) and name not in UNTHROTTLED_METHODS
+
+    def _chat_bucket(self, method: TelegramMethod) -> Optional[TokenBucket]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            # Inline xabarlar tahriri - faqat umumiy limit
+            return None
+        if isinstance(chat_id, int) and chat_id > 0:
+            return self.chats.bucket(chat_id)
+        return self.groups.bucket(chat_id)
+
+    async def _acquire_background(self) -> float:
+        """Umumiy limitdan token: navbatda foydalanuvchi so'rovlari bo'lsa ularga yo'l beriladi"""
+        waited = 0.0
+        while not self.global_bucket.try_acquire():
+            delay = max(self.global_bucket.delay(), 1 / self.global_bucket.rate)
+            await asyncio.sleep(delay)
+            waited += delay
+        self.background_wait += waited
+        return waited
+
+    async def _wait_turn(self, method: TelegramMethod) -> None:
+        chat_bucket = self._chat_bucket(method)
+        waited = await chat_bucket.acquire() if chat_bucket is not None else 0.0
+        if background_lane.get():
+            waited += await self._acquire_background()
+        else:
+            waited += await self.global_bucket.acquire()
+        if waited > 0:
+            self.throttled += 1
+            self.throttle_wait += waited
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        throttled = self.is_throttled(method)
+        self.requests += 1
+        attempt = 0
+
+        while True:
+            if throttled:
+                await self._wait_turn(method)
+
+            try:
+                return await make_request(bot, method)
+
+            except TelegramRetryAfter as e:
+                self.retry_after += 1
+                if e.retry_after > self.max_retry_after:
+                    self.failed += 1
+                    raise
+                chat_bucket = self._chat_bucket(method) if throttled else None
+                if chat_bucket is not None:
+                    # Bitta chat limiti - boshqa chatlarga yuborish to'xtamaydi
+                    chat_bucket.pause(e.retry_after)
+                elif throttled:
+                    self.global_bucket.pause(e.retry_after)
+                else:
+                    await asyncio.sleep(e.retry_after)
+                self.retry_after_wait += e.retry_after
+                logger.warning(f"Telegram flood control: {method.__api_method__}, {e.retry_after} s kutiladi")
+
+            except (TelegramNetworkError, TelegramServerError) as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    self.failed += 1
+                    raise
+                self.network_retries += 1
+                delay = self.retry_base_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                logger.warning(f"Telegram {method.__api_method__} xatosi ({e}), {delay:.1f} s dan keyin qayta")
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "throttle_wait": round(self.throttle_wait, 1),
+            "retry_after": self.retry_after,
+            "retry_after_wait": round(self.retry_after_wait, 1),
+            "network_retries": self.network_retries,
+            "failed": self.failed,
+            "background_wait": round(self.background_wait, 1),
+            "tracked_chats": len(self.chats) + len(self.groups)
+        }
+
+
+# Global API throttle middleware instance (jarayon bo'yicha)
+api_throttle_middleware = ApiThrottleMiddleware(
+    global_rate=settings.api_global_rate,
+    chat_rate=settings.api_chat_rate,
+    chat_burst=settings.api_chat_burst,
+    group_rate=settings.api_group_rate,
+    max_retries=settings.api_max_retries,
+    retry_base_delay=settings.api_retry_base_delay,
+    max_retry_after=settings.api_max_retry_after
+)
@@ -2,11 +2,11 @@
 Autentifikatsiya middleware
 """
 
-from typing import Any, Awaitable, Callable, Dict
+from typing import Any, Awaitable, Callable, Dict, Optional
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, CallbackQuery
 
-from app.database import DatabaseQueries
+from app.database import DatabaseQueries, User
 
 
 class AuthMiddleware(BaseMiddleware):
@@ -26,7 +26,8 @@ class AuthMiddleware(BaseMiddleware):
             user = event.from_user
         
         if user and not user.is_bot:
-            await self._process_user(user)
+            # DB dagi foydalanuvchi bir marta yuklanadi va butun zanjirga uzatiladi
+            data['user_db'] = await self._process_user(user)
             
             # User ma'lumotlarini data ga qo'shish
             data['user_id'] = user.id
@@ -35,7 +36,7 @@ class AuthMiddleware(BaseMiddleware):
         
         return await handler(event, data)
     
-    async def _process_user(self, user) -> None:
+    async def _process_user(self, user) -> Optional[User]:
         """Foydalanuvchini qayta ishlash"""
         db_queries = DatabaseQueries()
         
@@ -49,21 +50,25 @@ class AuthMiddleware(BaseMiddleware):
                 
                 # Ism o'zgargan bo'lsa yangilash
                 if existing_user.full_name != (user.full_name or "Noma'lum"):
-                    await db_queries.create_user(
+                    return await db_queries.create_user(
                         tg_id=user.id,
                         full_name=user.full_name or "Noma'lum",
                         is_admin=existing_user.is_admin
                     )
-            else:
-                # Yangi foydalanuvchi yaratish
-                await db_queries.create_user(
-                    tg_id=user.id,
-                    full_name=user.full_name or "Noma'lum",
-                    is_admin=False
-                )
                 
-                print(f"New user registered: {user.id} - {user.full_name}")
+                return existing_user
+            
+            # Yangi foydalanuvchi yaratish
+            new_user = await db_queries.create_user(
+                tg_id=user.id,
+                full_name=user.full_name or "Noma'lum",
+                is_admin=False
+            )
+            
+            print(f"New user registered: {user.id} - {user.full_name}")
+            return new_user
         
         except Exception as e:
             print(f"Auth middleware error: {e}")
-            # Xatolik bo'lsa ham handler ishlab ketsin
\ No newline at end of file
+            # Xatolik bo'lsa ham handler ishlab ketsin
+            return None
\ No newline at end of file
@@ -2,12 +2,12 @@
 Kanal obuna middleware
 """
 
-from typing import Any, Awaitable, Callable, Dict
+from typing import Any, Awaitable, Callable, Dict, Optional
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message
 import re
 
-from app.database import DatabaseQueries
+from app.database import DatabaseQueries, User
 
 
 class ChannelSubscriptionMiddleware(BaseMiddleware):
@@ -39,7 +39,9 @@ class ChannelSubscriptionMiddleware(BaseMiddleware):
             return await handler(event, data)
         
         # Foydalanuvchi obuna holatini tekshirish
-        subscription_status = await self._check_user_subscription(event.from_user.id)
+        subscription_status = await self._check_user_subscription(
+            event.from_user.id, data.get('user_db')
+        )
         
         # Subscription ma'lumotlarini data ga qo'shish
         data['is_subscribed_to_all'] = subscription_status['is_subscribed']
@@ -48,14 +50,15 @@ class ChannelSubscriptionMiddleware(BaseMiddleware):
         
         return await handler(event, data)
     
-    async def _check_user_subscription(self, user_tg_id: int) -> Dict[str, Any]:
+    async def _check_user_subscription(self, user_tg_id: int, user: Optional[User] = None) -> Dict[str, Any]:
         """Foydalanuvchi obuna holatini tekshirish"""
         
         db_queries = DatabaseQueries()
         
         try:
-            # Foydalanuvchini topish
-            user = await db_queries.get_user_by_tg_id(user_tg_id)
+            # Foydalanuvchini topish (AuthMiddleware yuklamagan bo'lsa)
+            if user is None:
+                user = await db_queries.get_user_by_tg_id(user_tg_id)
             
             if not user:
                 return {
@@ -65,7 +68,7 @@ class ChannelSubscriptionMiddleware(BaseMiddleware):
                 }
             
             # Obuna holatini tekshirish
-            subscription_info = await db_queries.check_user_subscription(user.id)
+            subscription_info = await db_queries.check_user_subscription(user.id, user=user)
             
             # Obuna bo'lmagan kanallar
             unsubscribed_channels = subscription_info.get_unjoined_channels()
@@ -0,0 +1,506 @@
+"""
+Supervisor rejimi - update larni chat_id bo'yicha worker jarayonlarga taqsimlash
+
+Supervisor update larni qabul qiladi (polling yoki webhook) va har birini
+hash(chat_id) % N bo'yicha bitta workerga yuboradi. Bitta chatning barcha
+update lari doim bitta workerga tushadi va u yerda ketma-ket ishlanadi,
+shuning uchun tartib va FSM holati buzilmaydi.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import multiprocessing
+import queue
+import secrets
+import signal
+import threading
+import time
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+Update = Dict[str, Any]
+Processor = Callable[[Update], Awaitable[None]]
+Cleanup = Callable[[], Awaitable[None]]
+ProcessorFactory = Callable[[int], Awaitable[Tuple[Processor, Cleanup]]]
+
+
+def extract_chat_id(update: Update) -> int:
+    """Update qaysi chatga tegishli (FSM kaliti bilan bir xil chat)"""
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+
+        user = event.get("from") or event.get("user")
+        if user:
+            return user["id"]
+
+    return update.get("update_id", 0)
+
+
+def shard_for(chat_id: int, shards: int) -> int:
+    """Chat qaysi workerga tegishli (int hash jarayonlar orasida barqaror)"""
+    return hash(chat_id) % shards
+
+
+class ShardMetrics:
+    """Bitta worker ko'rsatkichlari"""
+
+    def __init__(self):
+        self.processed = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def observe(self, elapsed: float, ok: bool) -> None:
+        self.processed += 1
+        if not ok:
+            self.errors += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+    def snapshot(self, in_flight: int = 0) -> Dict[str, Any]:
+        return {
+            "processed": self.processed,
+            "errors": self.errors,
+            "total_time": self.total_time,
+            "max_time": self.max_time,
+            "in_flight": in_flight
+        }
+
+    @staticmethod
+    def merge(snapshots: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+        """Workerlar ko'rsatkichlarini jamlash"""
+        processed = sum(s["processed"] for s in snapshots.values())
+        total_time = sum(s["total_time"] for s in snapshots.values())
+        return {
+            "workers": len(snapshots),
+            "processed": processed,
+            "errors": sum(s["errors"] for s in snapshots.values()),
+            "in_flight": sum(s["in_flight"] for s in snapshots.values()),
+            "avg_ms": round(total_time / processed * 1000, 2) if processed else 0.0,
+            "max_ms": round(max((s["max_time"] for s in snapshots.values()), default=0.0) * 1000, 2),
+            "per_worker": {index: s["processed"] for index, s in sorted(snapshots.items())}
+        }
+
+
+async def create_bot_processor(worker_index: int) -> Tuple[Processor, Cleanup]:
+    """Worker ichida bot, dispatcher va DB poolni tayyorlash"""
+    from aiogram.methods import TelegramMethod
+    from app.bot import create_bot
+    from app.database.connection import init_db, close_db
+    from app.utils.broadcast import broadcast_engine
+    from app.utils.subscription_reconciler import subscription_reconciler
+
+    await init_db()
+    bot, dp = create_bot()
+    await broadcast_engine.on_startup(bot)
+    await subscription_reconciler.on_startup(bot)
+
+    async def process(update: Update) -> None:
+        result = await dp.feed_raw_update(bot=bot, update=update)
+        if isinstance(result, TelegramMethod):
+            await dp.silent_call_request(bot=bot, result=result)
+
+    async def cleanup() -> None:
+        await subscription_reconciler.on_shutdown()
+        await broadcast_engine.on_shutdown()
+        await bot.session.close()
+        await close_db()
+
+    return process, cleanup
+
+
+class ShardWorker:
+    """Worker jarayoni ichidagi ishlov beruvchi"""
+
+    def __init__(self, index: int, inbox, outbox, factory: ProcessorFactory,
+                 max_in_flight: int = 100, metrics_interval: float = 10.0):
+        self.index = index
+        self.inbox = inbox
+        self.outbox = outbox
+        self.factory = factory
+        self.metrics_interval = metrics_interval
+        self.metrics = ShardMetrics()
+        # O'quvchi oqim bir vaqtda max_in_flight tadan ortiq update olmaydi
+        self._slots = threading.Semaphore(max_in_flight)
+        # chat_id -> shu chatning oxirgi update vazifasi
+        self._chains: Dict[int, asyncio.Task] = {}
+        self._process: Optional[Processor] = None
+        self._closed: Optional[asyncio.Event] = None
+
+    def _reader(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Navbatdan o'qib, update larni event loop ga uzatish (alohida oqimda)"""
+        parent = multiprocessing.parent_process()
+
+        while True:
+            self._slots.acquire()
+            try:
+                update = self.inbox.get(timeout=1.0)
+            except queue.Empty:
+                self._slots.release()
+                # Supervisor o'lib qolsa, worker ham to'xtaydi
+                if parent is not None and not parent.is_alive():
+                    break
+                continue
+
+            if update is None:
+                self._slots.release()
+                break
+
+            loop.call_soon_threadsafe(self._dispatch, update)
+
+        loop.call_soon_threadsafe(self._closed.set)
+
+    def _dispatch(self, update: Update) -> None:
+        """Update ni shu chatning oldingi update laridan keyin ishlash"""
+        chat_id = extract_chat_id(update)
+        previous = self._chains.get(chat_id)
+        task = asyncio.create_task(self._handle(previous, update))
+        self._chains[chat_id] = task
+        task.add_done_callback(partial(self._release_chain, chat_id))
+
+    def _release_chain(self, chat_id: int, task: asyncio.Task) -> None:
+        if self._chains.get(chat_id) is task:
+            del self._chains[chat_id]
+
+    async def _handle(self, previous: Optional[asyncio.Task], update: Update) -> None:
+        if previous is not None:
+            await asyncio.wait([previous])
+
+        started = time.perf_counter()
+        ok = True
+        try:
+            await self._process(update)
+        except Exception as e:
+            ok = False
+            logger.error(f"Shard {self.index} update error: {e}")
+        finally:
+            self.metrics.observe(time.perf_counter() - started, ok)
+            self._slots.release()
+
+    def _report(self) -> None:
+        self.outbox.put((self.index, self.metrics.snapshot(len(self._chains))))
+
+    async def _report_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            self._report()
+
+    async def run(self) -> None:
+        self._process, cleanup = await self.factory(self.index)
+        self._closed = asyncio.Event()
+
+        loop = asyncio.get_running_loop()
+        threading.Thread(target=self._reader, args=(loop,), daemon=True).start()
+
+        # Birinchi hisobot - worker tayyor
+        self._report()
+        reporter = asyncio.create_task(self._report_loop())
+
+        try:
+            await self._closed.wait()
+
+            # Ishlanayotgan update larni tugatish
+            while self._chains:
+                await asyncio.wait(list(self._chains.values()))
+        finally:
+            reporter.cancel()
+            self._report()
+            await cleanup()
+
+
+def run_shard_worker(index: int, inbox, outbox, factory: ProcessorFactory,
+                     max_in_flight: int, metrics_interval: float) -> None:
+    """Worker jarayoniga kirish nuqtasi"""
+    logging.basicConfig(level=getattr(logging, settings.log_level.upper(), logging.INFO))
+
+    # To'xtatishni supervisor boshqaradi (navbat orqali)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    worker = ShardWorker(index, inbox, outbox, factory, max_in_flight, metrics_interval)
+    asyncio.run(worker.run())
+
+
+class ShardSupervisor:
+    """Worker jarayonlarni boshqarish va update larni taqsimlash"""
+
+    def __init__(self, workers: int, factory: ProcessorFactory = create_bot_processor,
+                 queue_size: int = 1000, max_in_flight: int = 100,
+                 metrics_interval: float = 10.0):
+        self.workers = workers
+        self.factory = factory
+        self.max_in_flight = max_in_flight
+        self.metrics_interval = metrics_interval
+
+        ctx = multiprocessing.get_context("spawn")
+        self._ctx = ctx
+        self.inboxes = [ctx.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.outbox = ctx.Queue()
+        self.processes: List[multiprocessing.Process] = []
+        self.routed = [0] * workers
+        self.worker_metrics: Dict[int, Dict[str, Any]] = {}
+        self._locks: Optional[List[asyncio.Lock]] = None
+
+    @property
+    def locks(self) -> List[asyncio.Lock]:
+        if self._locks is None:
+            self._locks = [asyncio.Lock() for _ in range(self.workers)]
+        return self._locks
+
+    def start(self) -> None:
+        """Worker jarayonlarni ishga tushirish"""
+        for index in range(self.workers):
+            process = self._ctx.Process(
+                target=run_shard_worker,
+                args=(index, self.inboxes[index], self.outbox, self.factory,
+                      self.max_in_flight, self.metrics_interval),
+                name=f"shard-worker-{index}"
+            )
+            process.start()
+            self.processes.append(process)
+
+    async def wait_ready(self, timeout: float = 60.0) -> None:
+        """Barcha workerlar birinchi hisobotini yuborguncha kutish"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while len(self.worker_metrics) < self.workers:
+            if loop.time() > deadline:
+                raise TimeoutError(f"{self.workers - len(self.worker_metrics)} ta worker tayyor bo'lmadi")
+            self.collect_metrics()
+            await asyncio.sleep(0.05)
+
+    async def route(self, update: Update) -> None:
+        """Update ni o'z workeriga yuborish (navbat to'lsa kutiladi)"""
+        index = shard_for(extract_chat_id(update), self.workers)
+        inbox = self.inboxes[index]
+        lock = self.locks[index]
+
+        # Kutayotganlar bo'lsa, tartib buzilmasligi uchun navbatga turish
+        if not lock.locked():
+            try:
+                inbox.put_nowait(update)
+                self.routed[index] += 1
+                return
+            except queue.Full:
+                pass
+
+        async with lock:
+            while True:
+                try:
+                    inbox.put_nowait(update)
+                    break
+                except queue.Full:
+                    await asyncio.sleep(0.01)
+
+        self.routed[index] += 1
+
+    def collect_metrics(self) -> None:
+        """Workerlardan kelgan hisobotlarni olish"""
+        while True:
+            try:
+                index, snapshot = self.outbox.get_nowait()
+            except queue.Empty:
+                break
+            self.worker_metrics[index] = snapshot
+
+    def stats(self) -> Dict[str, Any]:
+        """Barcha workerlar bo'yicha jamlangan ko'rsatkichlar"""
+        self.collect_metrics()
+        merged = ShardMetrics.merge(self.worker_metrics)
+        merged["routed"] = list(self.routed)
+        merged["alive"] = sum(1 for process in self.processes if process.is_alive())
+        return merged
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Workerlarga to'xtash signalini yuborish va tugashini kutish"""
+        loop = asyncio.get_running_loop()
+
+        for index, inbox in enumerate(self.inboxes):
+            async with self.locks[index]:
+                await loop.run_in_executor(None, inbox.put, None)
+
+        deadline = loop.time() + timeout
+        for process in self.processes:
+            remaining = max(0.0, deadline - loop.time())
+            await loop.run_in_executor(None, process.join, remaining)
+            if process.is_alive():
+                logger.warning(f"⚠️ {process.name} {timeout}s ichida to'xtamadi, majburan to'xtatilmoqda")
+                process.kill()
+                process.join()
+
+        self.collect_metrics()
+
+
+def _allowed_updates() -> List[str]:
+    """Handlerlar ishlatadigan update turlari"""
+    from app.bot import create_bot
+
+    _, dp = create_bot()
+    return dp.resolve_used_update_types()
+
+
+async def _log_metrics(supervisor: ShardSupervisor) -> None:
+    while True:
+        await asyncio.sleep(supervisor.metrics_interval)
+        logger.info(f"📊 Shard metrics: {supervisor.stats()}")
+
+
+async def poll_updates(supervisor: ShardSupervisor, allowed_updates: List[str],
+                       polling_timeout: int = 30) -> None:
+    """getUpdates natijasini modelga aylantirmasdan workerlarga taqsimlash"""
+    from aiogram.client.telegram import PRODUCTION
+
+    url = PRODUCTION.api_url(token=settings.bot_token, method="getUpdates")
+    request_timeout = aiohttp.ClientTimeout(total=polling_timeout + 10)
+    offset = 0
+
+    async with aiohttp.ClientSession(timeout=request_timeout) as http:
+        try:
+            while True:
+                payload = {"offset": offset, "timeout": polling_timeout, "allowed_updates": allowed_updates}
+                try:
+                    async with http.post(url, json=payload) as response:
+                        data = await response.json()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.error(f"getUpdates error: {e}")
+                    await asyncio.sleep(1)
+                    continue
+
+                if not data.get("ok"):
+                    retry_after = data.get("parameters", {}).get("retry_after", 1)
+                    logger.error(f"getUpdates failed: {data.get('description')}")
+                    await asyncio.sleep(retry_after)
+                    continue
+
+                for update in data["result"]:
+                    await supervisor.route(update)
+                    offset = update["update_id"] + 1
+        finally:
+            # Taqsimlangan update larni Telegram da tasdiqlash
+            if offset:
+                try:
+                    await http.post(url, json={"offset": offset, "timeout": 0, "limit": 1})
+                except Exception as e:
+                    logger.error(f"getUpdates offset commit error: {e}")
+
+
+async def _run_polling(supervisor: ShardSupervisor) -> None:
+    allowed_updates = _allowed_updates()
+
+    supervisor.start()
+    await supervisor.wait_ready()
+    logger.info(f"✅ {supervisor.workers} ta shard worker tayyor (polling)")
+
+    polling = asyncio.create_task(poll_updates(supervisor, allowed_updates))
+    reporter = asyncio.create_task(_log_metrics(supervisor))
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, polling.cancel)
+
+    try:
+        await polling
+    except asyncio.CancelledError:
+        pass
+    finally:
+        reporter.cancel()
+        await supervisor.stop(settings.webhook_shutdown_timeout)
+        logger.info(f"📊 Shard metrics: {supervisor.stats()}")
+
+
+def metrics_allowed(request: web.Request) -> bool:
+    """/metrics: SHARD_METRICS_TOKEN bo'lsa Bearer token, aks holda faqat localhost"""
+    token = settings.shard_metrics_token
+    if token:
+        return secrets.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+
+    try:
+        return ipaddress.ip_address(request.remote or "").is_loopback
+    except ValueError:
+        return False
+
+
+def create_supervisor_app(supervisor: ShardSupervisor) -> web.Application:
+    """Webhook update larini qabul qilib workerlarga uzatuvchi aiohttp ilova"""
+    app = web.Application()
+    secret = settings.webhook_secret
+
+    async def handle_update(request: web.Request) -> web.Response:
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if secret and not secrets.compare_digest(token, secret):
+            return web.Response(body="Unauthorized", status=401)
+
+        await supervisor.route(await request.json())
+        return web.json_response({})
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        if not metrics_allowed(request):
+            return web.Response(body="Forbidden", status=403)
+        return web.json_response(supervisor.stats())
+
+    async def on_startup(app: web.Application) -> None:
+        supervisor.start()
+        await supervisor.wait_ready()
+        app["metrics_task"] = asyncio.create_task(_log_metrics(supervisor))
+
+        if settings.webhook_url:
+            from app.bot import create_bot
+
+            bot, dp = create_bot()
+            try:
+                await bot.set_webhook(
+                    url=settings.webhook_url.rstrip('/') + settings.webhook_path,
+                    secret_token=secret or None,
+                    allowed_updates=dp.resolve_used_update_types(),
+                    max_connections=settings.webhook_max_connections,
+                    drop_pending_updates=False
+                )
+            finally:
+                await bot.session.close()
+
+        logger.info(f"✅ {supervisor.workers} ta shard worker tayyor (webhook)")
+
+    async def on_shutdown(app: web.Application) -> None:
+        app["metrics_task"].cancel()
+        await supervisor.stop(settings.webhook_shutdown_timeout)
+        logger.info(f"📊 Shard metrics: {supervisor.stats()}")
+
+    app.router.add_post(settings.webhook_path, handle_update)
+    app.router.add_get("/metrics", handle_metrics)
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    return app
+
+
+def run_supervisor() -> None:
+    """Supervisor rejimini ishga tushirish (RUN_MODE ga qarab polling yoki webhook)"""
+    supervisor = ShardSupervisor(
+        workers=settings.shard_workers,
+        queue_size=settings.shard_queue_size,
+        max_in_flight=settings.shard_max_in_flight,
+        metrics_interval=settings.shard_metrics_interval
+    )
+
+    if settings.run_mode == "webhook":
+        web.run_app(
+            create_supervisor_app(supervisor),
+            host=settings.webapp_host,
+            port=settings.webapp_port,
+            shutdown_timeout=settings.webhook_shutdown_timeout,
+            print=None
+        )
+    else:
+        asyncio.run(_run_polling(supervisor))
@@ -0,0 +1,198 @@
+"""
+FSM holatlari uchun saqlash joylari (TTL bilan)
+
+- MemoryTTLStorage: jarayon xotirasida, hajmi va muddati cheklangan
+- PostgresStorage: mavjud asyncpg pool orqali, jarayonlar orasida umumiy
+
+Ikkalasida ham ma'lumotlar ixcham JSON ko'rinishida saqlanadi va oxirgi
+yozuvdan ttl soniya o'tgach holat o'z-o'zidan yo'qoladi.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from app.config import settings
+from app.database.cache import TTLCache
+from app.database.connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+def dump_data(data: Dict[str, Any]) -> str:
+    """Ma'lumotlarni ixcham JSON ga aylantirish"""
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+
+def load_data(raw: Optional[str]) -> Dict[str, Any]:
+    return json.loads(raw) if raw else {}
+
+
+class MemoryTTLStorage(BaseStorage):
+    """Xotiradagi FSM storage - muddati o'tgan va eng eski holatlar chiqarib tashlanadi"""
+
+    PURGE_EVERY = 1000  # Shuncha yozuvdan keyin muddati o'tganlar tozalanadi
+
+    def __init__(self, ttl: float = 86400.0, maxsize: int = 100000):
+        # StorageKey -> (state, data_json)
+        self._records = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._writes = 0
+
+    def _get(self, key: StorageKey) -> Tuple[Optional[str], str]:
+        return self._records.get(key) or (None, "")
+
+    def _put(self, key: StorageKey, state: Optional[str], raw_data: str) -> None:
+        if state is None and not raw_data:
+            self._records.invalidate(key)
+        else:
+            self._records.set(key, (state, raw_data))
+
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._records.purge_expired()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        _, raw_data = self._get(key)
+        self._put(key, _state_name(state), raw_data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._get(key)[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        state, _ = self._get(key)
+        self._put(key, state, dump_data(data) if data else "")
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return load_data(self._get(key)[1])
+
+    def stats(self) -> Dict[str, Any]:
+        return self._records.stats()
+
+    async def close(self) -> None:
+        self._records.clear()
+
+
+class PostgresStorage(BaseStorage):
+    """PostgreSQL dagi FSM storage (fsm_storage jadvali, create_tables.py)"""
+
+    GET_QUERY = "SELECT state, data::text FROM fsm_storage WHERE key = $1 AND expires_at > CURRENT_TIMESTAMP"
+
+    SET_STATE_QUERY = """
+    INSERT INTO fsm_storage (key, state, expires_at)
+    VALUES ($1, $2, CURRENT_TIMESTAMP + make_interval(secs => $3))
+    ON CONFLICT (key) DO UPDATE
+    SET state = EXCLUDED.state,
+        data = CASE WHEN fsm_storage.expires_at > CURRENT_TIMESTAMP THEN fsm_storage.data ELSE '{}' END,
+        expires_at = EXCLUDED.expires_at
+    """
+
+    SET_DATA_QUERY = """
+    INSERT INTO fsm_storage (key, data, expires_at)
+    VALUES ($1, $2::jsonb, CURRENT_TIMESTAMP + make_interval(secs => $3))
+    ON CONFLICT (key) DO UPDATE
+    SET data = EXCLUDED.data,
+        state = CASE WHEN fsm_storage.expires_at > CURRENT_TIMESTAMP THEN fsm_storage.state END,
+        expires_at = EXCLUDED.expires_at
+    """
+
+    # update_data bitta so'rovda: mavjud data bilan birlashtirish
+    UPDATE_DATA_QUERY = """
+    INSERT INTO fsm_storage (key, data, expires_at)
+    VALUES ($1, $2::jsonb, CURRENT_TIMESTAMP + make_interval(secs => $3))
+    ON CONFLICT (key) DO UPDATE
+    SET data = CASE WHEN fsm_storage.expires_at > CURRENT_TIMESTAMP
+                    THEN fsm_storage.data || EXCLUDED.data ELSE EXCLUDED.data END,
+        state = CASE WHEN fsm_storage.expires_at > CURRENT_TIMESTAMP THEN fsm_storage.state END,
+        expires_at = EXCLUDED.expires_at
+    RETURNING data::text
+    """
+
+    # Muddati o'tgan va bo'sh (state.clear() qilingan) yozuvlarni o'chirish
+    PURGE_QUERY = """
+    DELETE FROM fsm_storage
+    WHERE expires_at <= CURRENT_TIMESTAMP
+       OR (state IS NULL AND data = '{}'::jsonb)
+    """
+
+    def __init__(self, ttl: float = 86400.0, purge_interval: float = 300.0):
+        self.ttl = float(ttl)
+        self.purge_interval = purge_interval
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._next_purge = 0.0
+        self._purge_task: Optional[asyncio.Task] = None
+
+    def _key(self, key: StorageKey) -> str:
+        return self.key_builder.build(key)
+
+    def _maybe_purge(self) -> None:
+        """Vaqti kelgan bo'lsa, tozalashni fonda boshlash"""
+        now = time.monotonic()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + self.purge_interval
+
+        if self._purge_task is None or self._purge_task.done():
+            self._purge_task = asyncio.create_task(self.purge_expired())
+
+    async def purge_expired(self) -> int:
+        try:
+            result = await get_db_connection().execute(self.PURGE_QUERY)
+            return int(result.split()[-1])
+        except Exception as e:
+            logger.error(f"FSM storage purge error: {e}")
+            return 0
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await get_db_connection().execute(
+            self.SET_STATE_QUERY, self._key(key), _state_name(state), self.ttl
+        )
+        self._maybe_purge()
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await get_db_connection().fetchrow(self.GET_QUERY, self._key(key))
+        return record['state'] if record else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await get_db_connection().execute(
+            self.SET_DATA_QUERY, self._key(key), dump_data(data), self.ttl
+        )
+        self._maybe_purge()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await get_db_connection().fetchrow(self.GET_QUERY, self._key(key))
+        return load_data(record['data']) if record else {}
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        raw = await get_db_connection().fetchval(
+            self.UPDATE_DATA_QUERY, self._key(key), dump_data(data), self.ttl
+        )
+        self._maybe_purge()
+        return load_data(raw)
+
+    async def close(self) -> None:
+        if self._purge_task:
+            self._purge_task.cancel()
+            self._purge_task = None
+
+
+def create_storage() -> BaseStorage:
+    """Sozlamalar bo'yicha FSM storage tanlash"""
+    if settings.fsm_storage == "postgres":
+        return PostgresStorage(
+            ttl=settings.fsm_state_ttl,
+            purge_interval=settings.fsm_purge_interval
+        )
+
+    return MemoryTTLStorage(
+        ttl=settings.fsm_state_ttl,
+        maxsize=settings.fsm_memory_max_size
+    )
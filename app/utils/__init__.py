@@ -4,7 +4,7 @@ Utils package initialization
 
 from .channel_checker import check_user_channel_subscription, get_unsubscribed_channels_text
 from .movie_manager import send_movie_to_user, check_movie_access
-from .admin_utils import format_admin_stats, export_data_to_file
+from .admin_utils import format_admin_stats, format_export_progress, format_restore_progress, format_broadcast_progress
 from .statistics import get_platform_analytics, generate_daily_report
 
 __all__ = [
@@ -13,7 +13,9 @@ __all__ = [
     "send_movie_to_user",
     "check_movie_access", 
     "format_admin_stats",
-    "export_data_to_file",
+    "format_export_progress",
+    "format_restore_progress",
+    "format_broadcast_progress",
     "get_platform_analytics",
     "generate_daily_report"
 ]
\ No newline at end of file
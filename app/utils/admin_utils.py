@@ -2,14 +2,7 @@
 Admin yordamchi funksiyalar
 """
 
-import json
-import os
-import csv
-from datetime import datetime
-from typing import Dict, Any, List
-from io import StringIO
-
-from app.database.models import User, Movie, Channel
+from typing import Dict, Any
 
 
 def format_admin_stats(dashboard_data: Dict[str, Any]) -> str:
@@ -63,30 +56,83 @@ def format_admin_stats(dashboard_data: Dict[str, Any]) -> str:
     return admin_stats
 
 
-async def export_data_to_file(backup_data: Dict[str, Any], format_type: str = 'json') -> str:
+def format_export_progress(progress: Dict[str, Any]) -> str:
+    """
+    Eksport jarayonini formatlash
+    
+    Args:
+        progress: DataExporter dan kelgan holat
+    
+    Returns:
+        str: Adminga ko'rsatiladigan matn
+    """
+    
+    text = "📦 <b>Eksport qilinmoqda...</b>\n\n"
+    
+    for table, rows in progress['completed'].items():
+        text += f"✅ {table}: {rows}\n"
+    
+    if progress['table'] and progress['table'] not in progress['completed']:
+        estimate = progress['table_estimate']
+        if estimate:
+            percent = min(progress['table_rows'] / estimate, 1.0)
+            text += f"⏳ {progress['table']}: {progress['table_rows']} / ~{estimate} ({percent:.0%})\n"
+        else:
+            text += f"⏳ {progress['table']}: {progress['table_rows']}\n"
+    
+    text += f"\n📋 Jami yozuvlar: {progress['total_rows']}"
+    return text
+
+
+def format_restore_progress(progress: Dict[str, Any]) -> str:
     """
-    Ma'lumotlarni faylga eksport qilish
+    Tiklash jarayonini formatlash
     
     Args:
-        backup_data: Backup ma'lumotlari
-        format_type: Fayl formati (json, csv)
+        progress: DataRestorer dan kelgan holat
     
     Returns:
-        str: Fayl yo'li
+        str: Adminga ko'rsatiladigan matn
     """
     
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    
-    if format_type == 'json':
-        filename = f"backup_{timestamp}.json"
-        filepath = os.path.join("exports", filename)
-        
-        # Exports papkasini yaratish
-        os.makedirs("exports", exist_ok=True)
-        
-        # JSON faylga yozish
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(backup_data, f, ensure_ascii=False, indent=4)
-        return filepath
-    
-    
\ No newline at end of file
+    text = "♻️ <b>Ma'lumotlar tiklanmoqda...</b>\n\n"
+    
+    for table, counts in progress['completed'].items():
+        text += f"✅ {table}: {counts['inserted']} qo'shildi, {counts['updated']} yangilandi\n"
+    
+    if progress['table'] and progress['table'] not in progress['completed']:
+        phase = "birlashtirilmoqda" if progress['phase'] == "merge" else "yuklanmoqda"
+        text += f"⏳ {progress['table']}: {progress['table_rows']} ({phase})\n"
+    
+    text += f"\n📋 O'qilgan yozuvlar: {progress['total_rows']}"
+    return text
+
+
+def format_broadcast_progress(job: Dict[str, Any]) -> str:
+    """
+    Ommaviy xabar yuborish holatini formatlash
+    
+    Args:
+        job: broadcast_jobs yozuvi
+    
+    Returns:
+        str: Adminga ko'rsatiladigan matn
+    """
+    
+    titles = {
+        "pending": "⏳ <b>Xabar yuborish navbatda</b>",
+        "running": "📢 <b>Xabar yuborilmoqda...</b>",
+        "completed": "✅ <b>Xabar yuborildi</b>",
+        "cancelled": "⏹ <b>Xabar yuborish to'xtatildi</b>"
+    }
+    
+    processed = job['sent'] + job['failed'] + job['blocked']
+    percent = processed / job['total'] * 100 if job['total'] else 100.0
+    
+    return (
+        f"{titles.get(job['status'], job['status'])} (#{job['id']})\n\n"
+        f"📋 {processed}/{job['total']} ({percent:.0f}%)\n"
+        f"✅ Yuborildi: {job['sent']}\n"
+        f"🚫 Bloklagan: {job['blocked']}\n"
+        f"❌ Xatolik: {job['failed']}"
+    )
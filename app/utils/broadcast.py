@@ -0,0 +1,478 @@
+"""
+Ommaviy xabar yuborish (broadcast) - tezligi cheklangan, to'xtagan joyidan davom etadi
+
+Foydalanuvchilar users.id bo'yicha keyset paketlarda o'qiladi, xabar
+copy_message orqali token bucket tezligida yuboriladi. Har paketdan keyin
+broadcast_jobs.last_user_id yoziladi - jarayon qayta ishga tushsa, vazifa
+shu joydan davom etadi (eng ko'pi bilan bitta paket qayta yuborilishi mumkin).
+DB xatolarida vazifa kutish bilan qayta uriniladi; baribir to'xtab qolganlarini
+davriy tekshiruv (sweep) heartbeat eskirgach qayta ishga tushiradi.
+
+Egallagan jarayon heartbeat ni paketlardan qat'i nazar taymer bilan yangilaydi.
+Barcha yozuvlar claimed_by bilan cheklangan: vazifani boshqa jarayon olgan
+bo'lsa, eski egasi buni birinchi yozuvdayoq sezadi va yuborishni to'xtatadi.
+Botni bloklaganlar users.blocked_at bilan belgilanadi va o'tkazib yuboriladi.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+from app.config import settings
+from app.database.connection import get_db_connection
+from app.middlewares.api_throttle_middleware import background_lane
+from app.utils.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+SENT = "sent"
+FAILED = "failed"
+BLOCKED = "blocked"
+
+# Qabul qiluvchilar guruhlari
+BROADCAST_TARGETS = {
+    "all": "",
+    "active_7d": "AND last_activity > NOW() - INTERVAL '7 days'",
+    "active_30d": "AND last_activity > NOW() - INTERVAL '30 days'",
+}
+
+# Xabarni hech qachon yetkazib bo'lmaydigan holatlar
+UNREACHABLE_ERRORS = ("chat not found", "user is deactivated", "bot was blocked")
+
+
+class BroadcastEngine:
+    """broadcast_jobs vazifalarini bajaruvchi"""
+
+    USERS_QUERY = """
+    SELECT id, tg_id FROM users
+    WHERE id > $1 AND blocked_at IS NULL {target}
+    ORDER BY id
+    LIMIT $2
+    """
+
+    COUNT_QUERY = "SELECT COUNT(*) FROM users WHERE blocked_at IS NULL {target}"
+
+    CREATE_JOB_QUERY = """
+    INSERT INTO broadcast_jobs (admin_id, from_chat_id, message_id, target, total)
+    VALUES ($1, $2, $3, $4, $5)
+    RETURNING *
+    """
+
+    # Vazifani egallash: boshqa jarayon heartbeat_timeout dan beri yangilamagan bo'lsa
+    CLAIM_QUERY = """
+    UPDATE broadcast_jobs
+    SET status = 'running',
+        heartbeat_at = CURRENT_TIMESTAMP,
+        claimed_by = $3,
+        started_at = COALESCE(started_at, CURRENT_TIMESTAMP)
+    WHERE id = $1
+      AND status IN ('pending', 'running')
+      AND (heartbeat_at IS NULL OR heartbeat_at < CURRENT_TIMESTAMP - make_interval(secs => $2))
+    RETURNING *
+    """
+
+    PROGRESS_QUERY = """
+    UPDATE broadcast_jobs
+    SET last_user_id = $2,
+        sent = sent + $3,
+        failed = failed + $4,
+        blocked = blocked + $5,
+        heartbeat_at = CURRENT_TIMESTAMP
+    WHERE id = $1 AND claimed_by = $6
+    RETURNING *
+    """
+
+    FINISH_QUERY = """
+    UPDATE broadcast_jobs
+    SET status = 'completed', finished_at = CURRENT_TIMESTAMP, heartbeat_at = NULL
+    WHERE id = $1 AND status = 'running' AND claimed_by = $2
+    RETURNING *
+    """
+
+    # Paketlardan mustaqil, taymer bilan; qator qaytmasa vazifa boshqa jarayonda yoki bekor qilingan
+    HEARTBEAT_QUERY = """
+    UPDATE broadcast_jobs
+    SET heartbeat_at = CURRENT_TIMESTAMP
+    WHERE id = $1 AND status = 'running' AND claimed_by = $2
+    RETURNING heartbeat_at
+    """
+
+    CANCEL_QUERY = """
+    UPDATE broadcast_jobs
+    SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP, heartbeat_at = NULL
+    WHERE id = $1 AND status IN ('pending', 'running')
+    RETURNING *
+    """
+
+    # Xatodan keyin davom etish: claimed_by o'zgarmagan bo'lsa vazifa hali shu jarayonniki
+    RESUME_QUERY = """
+    UPDATE broadcast_jobs
+    SET heartbeat_at = CURRENT_TIMESTAMP
+    WHERE id = $1 AND status = 'running' AND claimed_by = $2
+    RETURNING *
+    """
+
+    # To'xtashda: boshqa jarayon yoki qayta ishga tushish darhol davom ettira oladi
+    RELEASE_QUERY = """
+    UPDATE broadcast_jobs SET heartbeat_at = NULL
+    WHERE status = 'running' AND claimed_by = ANY($1::text[])
+    """
+
+    # Hech bir jarayon bajarmayotgan (heartbeat eskirgan) vazifalar
+    RESUMABLE_QUERY = """
+    SELECT id FROM broadcast_jobs
+    WHERE status IN ('pending', 'running')
+      AND (heartbeat_at IS NULL OR heartbeat_at < CURRENT_TIMESTAMP - make_interval(secs => $1))
+    ORDER BY id
+    """
+
+    MARK_BLOCKED_QUERY = "UPDATE users SET blocked_at = CURRENT_TIMESTAMP WHERE id = ANY($1::int[])"
+
+    SET_STATUS_MESSAGE_QUERY = "UPDATE broadcast_jobs SET status_message_id = $2 WHERE id = $1"
+
+    MAX_RETRY_AFTER = 5  # Bitta foydalanuvchi uchun ketma-ket RetryAfter lar
+
+    def __init__(self, rate: float = 25.0, concurrency: int = 20, batch_size: int = 200,
+                 heartbeat_timeout: float = 120.0, progress_interval: float = 10.0,
+                 max_retries: int = 5, retry_base_delay: float = 2.0, sweep_interval: float = 60.0):
+        self.rate = rate
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.heartbeat_timeout = heartbeat_timeout
+        # Bir-ikki yangilash kechiksa ham vazifa boshqa jarayonga o'tib ketmaydi
+        self.heartbeat_interval = heartbeat_timeout / 4
+        self.progress_interval = progress_interval
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.sweep_interval = sweep_interval
+        # Barcha vazifalar uchun umumiy (Telegram limiti bot bo'yicha)
+        self.bucket = TokenBucket(rate, capacity=1)
+        self.retry_after_count = 0
+        self._bot: Optional[Bot] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # job_id -> claimed_by (shu jarayon egallagan vazifalar)
+        self._claims: Dict[int, str] = {}
+        self._sweep_task: Optional[asyncio.Task] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    @property
+    def running_jobs(self) -> List[int]:
+        return [job_id for job_id, task in self._tasks.items() if not task.done()]
+
+    # ==================== VAZIFALAR ====================
+
+    async def count_targets(self, target: str) -> int:
+        """Qabul qiluvchilar soni"""
+        db = get_db_connection()
+        return await db.fetchval(self.COUNT_QUERY.format(target=BROADCAST_TARGETS[target]))
+
+    async def create_job(self, admin_id: int, from_chat_id: int, message_id: int,
+                         target: str = "all") -> Dict[str, Any]:
+        """Yangi vazifa yaratish (ishga tushirish - launch())"""
+        total = await self.count_targets(target)
+        db = get_db_connection()
+        record = await db.fetchrow(self.CREATE_JOB_QUERY, admin_id, from_chat_id, message_id, target, total)
+        return dict(record)
+
+    async def set_status_message(self, job_id: int, message_id: int) -> None:
+        await get_db_connection().execute(self.SET_STATUS_MESSAGE_QUERY, job_id, message_id)
+
+    async def cancel_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Vazifani bekor qilish (yuborish navbatdagi paketdan oldin to'xtaydi)"""
+        record = await get_db_connection().fetchrow(self.CANCEL_QUERY, job_id)
+        return dict(record) if record else None
+
+    def launch(self, job_id: int, bot: Optional[Bot] = None) -> None:
+        """Vazifani fon rejimida bajarishni boshlash"""
+        bot = bot or self._bot
+        task = self._tasks.get(job_id)
+        if bot is None or (task is not None and not task.done()):
+            return
+        self._tasks[job_id] = asyncio.create_task(self._run_job(bot, job_id))
+
+    # ==================== YUBORISH ====================
+
+    async def deliver(self, bot: Bot, chat_id: int, from_chat_id: int, message_id: int) -> str:
+        """
+        Bitta foydalanuvchiga xabar nusxasini yuborish
+
+        Tarmoq xatolari va qisqa RetryAfter lar Bot session middleware da
+        qayta uriniladi; bu yerga faqat undan o'tganlari keladi. Middleware da
+        ommaviy xabarlar foydalanuvchilarga javoblardan keyin navbatga turadi.
+        """
+        retry_afters = 0
+        lane_token = background_lane.set(True)
+
+        try:
+            async with self.semaphore:
+                while True:
+                    await self.bucket.acquire()
+                    try:
+                        await bot.copy_message(chat_id=chat_id, from_chat_id=from_chat_id, message_id=message_id)
+                        return SENT
+                    except TelegramRetryAfter as e:
+                        # Telegram aytgan vaqtgacha hamma yuborish to'xtaydi (bucket.acquire kutadi)
+                        self.retry_after_count += 1
+                        self.bucket.pause(e.retry_after)
+                        retry_afters += 1
+                        if retry_afters > self.MAX_RETRY_AFTER:
+                            return FAILED
+                    except TelegramForbiddenError:
+                        return BLOCKED
+                    except TelegramBadRequest as e:
+                        if any(error in str(e).lower() for error in UNREACHABLE_ERRORS):
+                            return BLOCKED
+                        logger.warning(f"Broadcast bad request for {chat_id}: {e}")
+                        return FAILED
+                    except (TelegramNetworkError, TelegramServerError) as e:
+                        logger.warning(f"Broadcast send to {chat_id} failed: {e}")
+                        return FAILED
+                    except TelegramAPIError as e:
+                        # Boshqa API xatolari (masalan, 409 Conflict) paketni to'xtatmasligi kerak
+                        logger.warning(f"Broadcast send to {chat_id} failed: {e}")
+                        return FAILED
+        finally:
+            background_lane.reset(lane_token)
+
+    async def send_batch(self, bot: Bot, job: Dict[str, Any], users: List[Any]) -> Dict[str, List[int]]:
+        """Paketdagi foydalanuvchilarga parallel yuborish; natija -> user id lar"""
+        results = await asyncio.gather(*(
+            self.deliver(bot, user['tg_id'], job['from_chat_id'], job['message_id'])
+            for user in users
+        ), return_exceptions=True)
+        outcome: Dict[str, List[int]] = {SENT: [], FAILED: [], BLOCKED: []}
+        for user, result in zip(users, results):
+            if isinstance(result, BaseException):
+                # Bitta foydalanuvchidagi kutilmagan xato qolganlarini yo'qotmasligi kerak
+                logger.warning(f"Broadcast send to {user['tg_id']} error: {result!r}")
+                result = FAILED
+            outcome[result].append(user['id'])
+        return outcome
+
+    @staticmethod
+    def _claim_token() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def _heartbeat(self, job: Dict[str, Any], owner: asyncio.Task) -> None:
+        """Vazifa egaligini davriy tasdiqlash; egalik yo'qolsa yuborish to'xtatiladi"""
+        db = get_db_connection()
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                record = await db.fetchrow(self.HEARTBEAT_QUERY, job['id'], job['claimed_by'])
+            except Exception as e:
+                logger.warning(f"Broadcast #{job['id']} heartbeat error: {e}")
+                continue
+            if record is None:
+                logger.warning(f"Broadcast #{job['id']} boshqa jarayonga o'tgan yoki bekor qilingan, yuborish to'xtatildi")
+                owner.cancel()
+                return
+
+    async def _run_job(self, bot: Bot, job_id: int) -> None:
+        db = get_db_connection()
+        token = self._claim_token()
+        try:
+            record = await db.fetchrow(self.CLAIM_QUERY, job_id, self.heartbeat_timeout, token)
+        except Exception as e:
+            logger.error(f"Broadcast #{job_id} claim error: {e}")
+            return
+        if record is None:
+            # Boshqa jarayon bajarmoqda yoki vazifa tugagan
+            return
+
+        job = dict(record)
+        self._claims[job_id] = token
+        logger.info(f"📢 Broadcast #{job_id} boshlandi (user id > {job['last_user_id']})")
+
+        heartbeat = asyncio.create_task(self._heartbeat(job, asyncio.current_task()))
+        try:
+            owned = await self._attempt_job(bot, job)
+        finally:
+            heartbeat.cancel()
+            self._claims.pop(job_id, None)
+
+        if not owned:
+            return
+
+        await self._report(bot, job)
+        logger.info(f"📢 Broadcast #{job_id} {job['status']}: {job['sent']} yuborildi, "
+                    f"{job['blocked']} bloklangan, {job['failed']} xato")
+
+    async def _attempt_job(self, bot: Bot, job: Dict[str, Any]) -> bool:
+        """_send_all ni DB xatolarida kutish bilan qayta urinish; False - vazifa endi shu jarayonniki emas"""
+        db = get_db_connection()
+        job_id = job['id']
+        attempt = 0
+        while True:
+            try:
+                return await self._send_all(bot, job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    # Vazifa running holida qoladi - heartbeat eskirgach sweep qayta oladi
+                    logger.error(f"Broadcast #{job_id} error, {self.max_retries} urinishdan keyin to'xtatildi: {e}")
+                    return False
+
+                delay = min(self.retry_base_delay * 2 ** (attempt - 1), self.heartbeat_timeout / 2)
+                logger.warning(f"Broadcast #{job_id} error ({attempt}/{self.max_retries}), {delay:.0f}s dan keyin davom etadi: {e}")
+                await asyncio.sleep(delay)
+
+                try:
+                    record = await db.fetchrow(self.RESUME_QUERY, job_id, job['claimed_by'])
+                except Exception as e:
+                    logger.warning(f"Broadcast #{job_id} resume error: {e}")
+                    continue
+                if record is None:
+                    # Bekor qilingan yoki boshqa jarayon egallagan
+                    return False
+                job.update(record)
+
+    async def _send_all(self, bot: Bot, job: Dict[str, Any]) -> bool:
+        """
+        last_user_id dan boshlab paketma-paket yuborish (job har paketdan keyin yangilanadi)
+
+        False - vazifa boshqa jarayonga o'tgan (yoki tugashdan oldin bekor qilingan)
+        """
+        db = get_db_connection()
+        job_id = job['id']
+        users_query = self.USERS_QUERY.format(target=BROADCAST_TARGETS[job['target']])
+        next_report = time.monotonic() + self.progress_interval
+
+        while True:
+            users = await db.fetch(users_query, job['last_user_id'], self.batch_size)
+            if not users:
+                record = await db.fetchrow(self.FINISH_QUERY, job_id, job['claimed_by'])
+                if record is None:
+                    return False
+                job.update(record)
+                return True
+
+            outcome = await self.send_batch(bot, job, users)
+            if outcome[BLOCKED]:
+                await db.execute(self.MARK_BLOCKED_QUERY, outcome[BLOCKED])
+
+            record = await db.fetchrow(
+                self.PROGRESS_QUERY, job_id, users[-1]['id'],
+                len(outcome[SENT]), len(outcome[FAILED]), len(outcome[BLOCKED]), job['claimed_by']
+            )
+            if record is None:
+                # Heartbeat eskirib, vazifani boshqa jarayon olgan - u last_user_id dan davom etadi
+                logger.warning(f"Broadcast #{job_id} boshqa jarayonga o'tgan, yuborish to'xtatildi")
+                return False
+            job.update(record)
+            if job['status'] != 'running':
+                return True
+
+            if time.monotonic() >= next_report:
+                next_report = time.monotonic() + self.progress_interval
+                await self._report(bot, job)
+
+    async def _report(self, bot: Bot, job: Dict[str, Any]) -> None:
+        """Admin chatidagi jarayon xabarini yangilash"""
+        if not job.get('status_message_id'):
+            return
+
+        from app.keyboards.inline_keyboards import get_broadcast_keyboard
+        from app.utils.admin_utils import format_broadcast_progress
+
+        try:
+            await bot.edit_message_text(
+                text=format_broadcast_progress(job),
+                chat_id=job['admin_id'],
+                message_id=job['status_message_id'],
+                reply_markup=get_broadcast_keyboard(job['id']) if job['status'] == 'running' else None,
+                parse_mode="HTML"
+            )
+        except Exception as e:
+            logger.debug(f"Broadcast progress edit error: {e}")
+
+    # ==================== ISHGA TUSHIRISH ====================
+
+    async def resume_stale_jobs(self, bot: Bot) -> None:
+        """Hech bir jarayon bajarmayotgan vazifalarni ishga tushirish"""
+        records = await get_db_connection().fetch(self.RESUMABLE_QUERY, self.heartbeat_timeout)
+        for record in records:
+            self.launch(record['id'], bot)
+
+    async def _sweep(self, bot: Bot) -> None:
+        """Davriy tekshiruv: xato bilan to'xtagan yoki o'lgan jarayondan qolgan vazifalar"""
+        while True:
+            try:
+                await self.resume_stale_jobs(bot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Broadcast resume error: {e}")
+
+            await asyncio.sleep(self.sweep_interval)
+
+    async def on_startup(self, bot: Bot) -> None:
+        """Dispatcher startup: tugallanmagan vazifalarni davom ettirish va davriy tekshiruv"""
+        self._bot = bot
+        if self._sweep_task is None or self._sweep_task.done():
+            self._sweep_task = asyncio.create_task(self._sweep(bot))
+
+    async def on_shutdown(self) -> None:
+        """Dispatcher shutdown: yuborishni to'xtatish va vazifalarni bo'shatish"""
+        if self._sweep_task:
+            self._sweep_task.cancel()
+            try:
+                await self._sweep_task
+            except asyncio.CancelledError:
+                pass
+            self._sweep_task = None
+
+        job_ids = self.running_jobs
+        tokens = [self._claims[job_id] for job_id in job_ids if job_id in self._claims]
+        for job_id in job_ids:
+            self._tasks[job_id].cancel()
+        if job_ids:
+            await asyncio.gather(*(self._tasks[job_id] for job_id in job_ids), return_exceptions=True)
+        if tokens:
+            try:
+                await get_db_connection().execute(self.RELEASE_QUERY, tokens)
+            except Exception as e:
+                logger.error(f"Broadcast release error: {e}")
+        self._tasks.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running_jobs": self.running_jobs,
+            "retry_after": self.retry_after_count,
+            "rate": self.rate
+        }
+
+
+# Global broadcast engine instance
+broadcast_engine = BroadcastEngine(
+    rate=settings.broadcast_rate,
+    concurrency=settings.broadcast_concurrency,
+    batch_size=settings.broadcast_batch_size,
+    heartbeat_timeout=settings.broadcast_heartbeat_timeout,
+    progress_interval=settings.broadcast_progress_interval,
+    max_retries=settings.broadcast_max_retries,
+    retry_base_delay=settings.broadcast_retry_base_delay,
+    sweep_interval=settings.broadcast_sweep_interval
+)
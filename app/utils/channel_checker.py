@@ -2,12 +2,26 @@
 Kanal obuna tekshirish yordamchi funksiyalar
 """
 
-from typing import List
+import asyncio
+from typing import Any, Dict, List, Set, Tuple, Union
 from aiogram import Bot
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import ChatMember
 
+from app.config import settings
+from app.database.cache import TTLCache
+from app.database.membership import membership_writer
 from app.database.models import Channel
 
+MEMBER_STATUSES = ('creator', 'administrator', 'member')
+
+
+def is_member_status(member: ChatMember) -> bool:
+    """ChatMember kanal a'zosimi (cheklangan, lekin a'zo bo'lganlar ham)"""
+    return member.status in MEMBER_STATUSES or (
+        member.status == 'restricted' and getattr(member, 'is_member', False)
+    )
+
 
 async def check_user_channel_subscription(bot: Bot, user_id: int, channel_id: int) -> bool:
     """
@@ -32,7 +46,7 @@ async def check_user_channel_subscription(bot: Bot, user_id: int, channel_id: in
         # A'zolik holatini tekshirish
         # creator, administrator, member - obuna bo'lgan
         # left, kicked - obuna bo'lmagan
-        return member.status in ['creator', 'administrator', 'member']
+        return is_member_status(member)
         
     except (TelegramBadRequest, TelegramForbiddenError) as e:
         # Kanal mavjud emas yoki bot admin emas
@@ -44,6 +58,160 @@ async def check_user_channel_subscription(bot: Bot, user_id: int, channel_id: in
         return False
 
 
+class SubscriptionService:
+    """
+    Kanallarga obunani parallel tekshirish xizmati
+    
+    Avval joineduserannel (chat_member update lar bilan yangilanib boradi)
+    tekshiriladi - u yerda bor a'zolik uchun Telegram ga so'rov yuborilmaydi.
+    Qolganlari get_chat_member bilan tekshiriladi: har bir bot uchun bir
+    vaqtdagi so'rovlar soni cheklanadi, natijalar (user, kanal) bo'yicha qisqa
+    muddat keshlanadi: obuna bo'lganlar uzoqroq, obuna bo'lmaganlar esa qisqa TTL bilan.
+    """
+    
+    def __init__(self, max_concurrency: int = 5, positive_ttl: float = 300.0,
+                 negative_ttl: float = 10.0, cache_size: int = 50000):
+        self.max_concurrency = max_concurrency
+        self.db_answers = 0
+        self._positive = TTLCache(maxsize=cache_size, ttl=positive_ttl)
+        self._negative = TTLCache(maxsize=cache_size, ttl=negative_ttl)
+        self._semaphores: Dict[int, asyncio.Semaphore] = {}
+    
+    def _get_semaphore(self, bot: Bot) -> asyncio.Semaphore:
+        """Bot uchun concurrency limiti"""
+        semaphore = self._semaphores.get(bot.id)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[bot.id] = semaphore
+        return semaphore
+    
+    @staticmethod
+    def _chat_identifier(channel: Channel) -> Union[int, str]:
+        """get_chat_member uchun kanal identifikatori"""
+        return channel.channel_id or channel.channel_username
+    
+    async def is_member(self, bot: Bot, user_id: int, channel: Channel,
+                        skip_negative_cache: bool = False) -> bool:
+        """
+        Foydalanuvchi kanalga a'zo ekanligini tekshirish (kesh orqali)
+        
+        Args:
+            bot: Bot instance
+            user_id: Telegram foydalanuvchi ID
+            channel: Kanal obyekti
+            skip_negative_cache: "Obuna bo'lmagan" natijani keshdan olmaslik
+                (foydalanuvchi hozirgina obuna bo'lgan bo'lishi mumkin)
+        
+        Returns:
+            bool: Obuna bo'lgan yoki yo'qligi
+        """
+        
+        is_subscribed, _ = await self._lookup(bot, user_id, channel, skip_negative_cache)
+        return is_subscribed
+    
+    async def _lookup(self, bot: Bot, user_id: int, channel: Channel,
+                      skip_negative_cache: bool) -> Tuple[bool, bool]:
+        """(obuna holati, javob Telegram dan keldimi) - keshdan bo'lsa ikkinchisi False"""
+        chat_id = self._chat_identifier(channel)
+        key = (user_id, chat_id)
+        
+        if self._positive.get(key):
+            return True, False
+        
+        if not skip_negative_cache and self._negative.get(key):
+            return False, False
+        
+        async with self._get_semaphore(bot):
+            is_subscribed = await check_user_channel_subscription(bot, user_id, chat_id)
+        
+        if is_subscribed:
+            self._positive.set(key, True)
+            self._negative.invalidate(key)
+        else:
+            self._negative.set(key, True)
+            self._positive.invalidate(key)
+        
+        return is_subscribed, True
+    
+    async def _joined_chat_ids(self, user_id: int) -> Set[int]:
+        """DB dagi a'zoliklar (xatolikda bo'sh - hammasi Telegram orqali tekshiriladi)"""
+        try:
+            return await membership_writer.joined_chat_ids(user_id)
+        except Exception as e:
+            print(f"Membership lookup error for {user_id}: {e}")
+            return set()
+    
+    async def _check_channel(self, bot: Bot, user_id: int, channel: Channel, joined: Set[int],
+                             skip_negative_cache: bool) -> bool:
+        if channel.channel_id and channel.channel_id in joined:
+            self.db_answers += 1
+            return True
+        
+        is_subscribed, from_api = await self._lookup(bot, user_id, channel, skip_negative_cache)
+        
+        # Keyingi safar DB dan javob berish uchun. Faqat Telegram javobi yoziladi:
+        # jarayon keshidagi eski natija boshqa jarayon o'chirgan a'zolikni qaytarmasligi kerak
+        if is_subscribed and from_api and channel.channel_id:
+            membership_writer.record(user_id, channel.channel_id, True)
+        
+        return is_subscribed
+    
+    async def check_channels(self, bot: Bot, user_id: int, channels: List[Channel],
+                             skip_negative_cache: bool = False) -> List[Tuple[Channel, bool]]:
+        """
+        Barcha kanallarni parallel tekshirish
+        
+        Returns:
+            list: (kanal, obuna_holati) juftliklari, kanallar tartibida
+        """
+        
+        joined = await self._joined_chat_ids(user_id) if channels else set()
+        results = await asyncio.gather(*[
+            self._check_channel(bot, user_id, channel, joined, skip_negative_cache)
+            for channel in channels
+        ])
+        return list(zip(channels, results))
+    
+    async def get_unsubscribed_channels(self, bot: Bot, user_id: int, channels: List[Channel],
+                                        skip_negative_cache: bool = False) -> List[Channel]:
+        """Foydalanuvchi obuna bo'lmagan kanallar ro'yxati"""
+        checked = await self.check_channels(bot, user_id, channels, skip_negative_cache)
+        return [channel for channel, is_subscribed in checked if not is_subscribed]
+    
+    def remember(self, user_id: int, chat_id: int, is_member: bool) -> None:
+        """Telegram xabar bergan a'zolik holatini keshga yozish (chat_member update)"""
+        key = (user_id, chat_id)
+        if is_member:
+            self._positive.set(key, True)
+            self._negative.invalidate(key)
+        else:
+            self._negative.set(key, True)
+            self._positive.invalidate(key)
+    
+    def invalidate(self, user_id: int, channel: Channel) -> None:
+        """(user, kanal) keshini o'chirish"""
+        key = (user_id, self._chat_identifier(channel))
+        self._positive.invalidate(key)
+        self._negative.invalidate(key)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Kesh statistikasi"""
+        return {
+            'positive': self._positive.stats(),
+            'negative': self._negative.stats(),
+            'db_answers': self.db_answers,
+            'membership': membership_writer.stats()
+        }
+
+
+# Global subscription service instance
+subscription_service = SubscriptionService(
+    max_concurrency=settings.subscription_check_concurrency,
+    positive_ttl=settings.subscription_positive_ttl,
+    negative_ttl=settings.subscription_negative_ttl
+)
+
+
 async def check_multiple_channels_subscription(bot: Bot, user_id: int, channels: List[Channel]) -> dict:
     """
     Bir nechta kanalga obuna holatini tekshirish
@@ -246,50 +414,3 @@ def get_channel_invite_text(channel: Channel) -> str:
 
 👆 Yuqoridagi havolaga bosib, "OBUNA BO'LISH" tugmasini bosing!
 """
-
-
-async def auto_check_and_update_subscriptions(bot: Bot, user_id: int, db_queries, channels: List[Channel]) -> dict:
-    """
-    Obunalarni avtomatik tekshirish va ma'lumotlar bazasini yangilash
-    
-    Args:
-        bot: Bot instance
-        user_id: Telegram foydalanuvchi ID
-        db_queries: Database queries instance
-        channels: Tekshirish uchun kanallar
-    
-    Returns:
-        dict: Yangilash natijalari
-    """
-    
-    user = await db_queries.get_user_by_tg_id(user_id)
-    if not user:
-        return {'error': 'User not found'}
-    
-    updated_channels = []
-    failed_channels = []
-    
-    for channel in channels:
-        try:
-            is_subscribed = await check_user_channel_subscription(
-                bot, user_id, channel.get_username_clean()
-            )
-            
-            if is_subscribed:
-                # Ma'lumotlar bazasiga qo'shish
-                await db_queries.add_user_to_channel(user.id, channel.id)
-                updated_channels.append(channel)
-            else:
-                # Ma'lumotlar bazasidan olib tashlash
-                await db_queries.remove_user_from_channel(user.id, channel.id)
-                
-        except Exception as e:
-            print(f"Auto check failed for {channel.title}: {e}")
-            failed_channels.append({'channel': channel, 'error': str(e)})
-    
-    return {
-        'updated': updated_channels,
-        'failed': failed_channels,
-        'success_count': len(updated_channels),
-        'error_count': len(failed_channels)
-    }
\ No newline at end of file
@@ -2,7 +2,8 @@
 Kino boshqaruvi yordamchi funksiyalar
 """
 
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Tuple
 from aiogram.types import Message, InputMediaVideo
 from aiogram.exceptions import TelegramBadRequest
 
@@ -78,10 +79,7 @@ async def send_movie_to_user_from_private(message: Message, movie, user, db_quer
             message_id=movie.private_message_id,
         )
         
-        # Ko'rishlar sonini yangilash
-        await db_queries.increment_movie_views(movie.id)
-
-        # Movie view qayd etish (mavjud metod)
+        # Movie view qayd etish (view_count ham shu navbat orqali oshiriladi)
         await db_queries.add_movie_view(user.id, movie.id)
         
         # Foydalanuvchi faoliyatini yangilash
@@ -173,7 +171,7 @@ async def check_movie_access(user_id: int, movie_code: str, db_queries: Database
             }
         
         # Obuna holatini tekshirish
-        subscription_info = await db_queries.check_user_subscription(user.id)
+        subscription_info = await db_queries.check_user_subscription(user.id, user=user)
         
         if not subscription_info.is_subscribed_to_all():
             unsubscribed_channels = subscription_info.get_unjoined_channels()
@@ -294,38 +292,22 @@ async def search_movies_advanced(search_term: str, db_queries: DatabaseQueries,
     Args:
         search_term: Qidiruv so'zi
         db_queries: Database queries instance
-        filters: Qo'shimcha filtrlar
+        filters: Qo'shimcha filtrlar (year, min_views, max_views)
     
     Returns:
         list: Topilgan kinolar
     """
     
     try:
-        # Asosiy qidirish
-        movies = await db_queries.search_movies(search_term, limit=50)
-        
-        if not filters:
-            return movies[:10]
-        
-        # Filtrlarni qo'llash
-        filtered_movies = []
-        
-        for movie in movies:
-            # Yil filtri
-            if filters.get('year') and movie.created_at.year != filters['year']:
-                continue
-            
-            # Minimal ko'rishlar filtri
-            if filters.get('min_views') and movie.view_count < filters['min_views']:
-                continue
-            
-            # Maksimal ko'rishlar filtri
-            if filters.get('max_views') and movie.view_count > filters['max_views']:
-                continue
-            
-            filtered_movies.append(movie)
-        
-        return filtered_movies[:10]
+        # Filtrlar SQL da qo'llanadi (0 yoki None - filtr yo'q)
+        filters = filters or {}
+        return await db_queries.search_movies(
+            search_term,
+            limit=10,
+            year=filters.get('year') or None,
+            min_views=filters.get('min_views') or None,
+            max_views=filters.get('max_views') or None
+        )
         
     except Exception as e:
         print(f"Advanced search error: {e}")
@@ -411,4 +393,53 @@ def validate_movie_data(title: str, code: str, description: str = "") -> dict:
             'code': code.strip().upper(),
             'description': description.strip() if description else ""
         }
-    }
\ No newline at end of file
+    }
+
+
+# Kursordagi created_at callback_data da mikrosekundlar bilan yoziladi
+EPOCH = datetime(1970, 1, 1)
+
+
+def encode_page_callback(order: str, page: int, cursor: Optional[Tuple[Any, int]] = None,
+                         before: bool = False) -> str:
+    """
+    Sahifa tugmasi callback_data si
+    
+    page:{tartib}:{sahifa} - birinchi sahifa va qidiruv (natijalar FSM da);
+    page:{tartib}:{sahifa}:{n|p}:{kalit}:{id} - keyset kursor bilan (n - keyingi, p - oldingi)
+    """
+    if cursor is None:
+        return f"page:{order}:{page}"
+    
+    value, movie_id = cursor
+    if isinstance(value, datetime):
+        value = (value - EPOCH) // timedelta(microseconds=1)
+    return f"page:{order}:{page}:{'p' if before else 'n'}:{value}:{movie_id}"
+
+
+def decode_page_callback(data: str) -> Tuple[str, int, Optional[Tuple[Any, int]], bool]:
+    """callback_data dan (tartib, sahifa, kursor, orqagami)"""
+    parts = data.split(":")
+    order, page = parts[1], int(parts[2])
+    if len(parts) < 6:
+        return order, page, None, False
+    
+    value = int(parts[4])
+    if order == "recent":
+        value = EPOCH + timedelta(microseconds=value)
+    return order, page, (value, int(parts[5])), parts[3] == "p"
+
+
+def format_movie_list(header: str, movies: List[Movie], start: int = 1, show_date: bool = False) -> str:
+    """Kinolar ro'yxati matni (sahifa uchun)"""
+    text = f"{header}\n\n"
+    
+    for i, movie in enumerate(movies, start):
+        text += f"{i}. <b>{movie.title}</b>\n"
+        text += f"   📝 Kod: <code>{movie.code}</code>\n"
+        if show_date:
+            text += f"   📅 Qo'shilgan: {movie.created_at.strftime('%Y-%m-%d')}\n\n"
+        else:
+            text += f"   👁 Ko'rishlar: {movie.view_count}\n\n"
+    
+    return text
@@ -0,0 +1,98 @@
+"""
+Token bucket tezlik cheklagichlari (Telegram API limitlari uchun)
+"""
+
+import asyncio
+import time
+from typing import Hashable, Optional
+
+from app.database.cache import TTLCache
+
+
+class TokenBucket:
+    """
+    O'rtacha soniyasiga `rate` ta, bir zumda `capacity` tagacha ruxsat
+
+    acquire() navbat bilan (FIFO) kutadi. pause() - Telegram RetryAfter
+    qaytarganda barcha so'rovlarni ko'rsatilgan vaqtgacha to'xtatish.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = max(capacity if capacity is not None else rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        """Keyingi ruxsatgacha qancha kutish kerak (soniya)"""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def try_acquire(self) -> bool:
+        """Kutmasdan ruxsat olish (bo'lmasa False)"""
+        if self.lock.locked() or self.delay() > 0:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def acquire(self) -> float:
+        """Ruxsat olish; kutilgan vaqtni qaytaradi"""
+        waited = 0.0
+        async with self.lock:
+            while True:
+                delay = self.delay()
+                if delay <= 0:
+                    self._tokens -= 1
+                    return waited
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def pause(self, seconds: float) -> None:
+        """Barcha so'rovlarni `seconds` soniyaga to'xtatish"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+
+class KeyedRateLimiter:
+    """Har bir kalit (masalan, chat_id) uchun alohida token bucket"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None,
+                 max_keys: int = 100000, idle_ttl: float = 60.0):
+        self.rate = rate
+        self.capacity = capacity
+        # Uzoq vaqt ishlatilmagan bucket lar o'chadi - yangisi baribir to'la bo'ladi
+        self._buckets = TTLCache(maxsize=max_keys, ttl=idle_ttl)
+
+    def bucket(self, key: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.capacity)
+        # Har bir murojaatda TTL yangilanadi
+        self._buckets.set(key, bucket)
+        return bucket
+
+    async def acquire(self, key: Hashable) -> float:
+        return await self.bucket(key).acquire()
+
+    def pause(self, key: Hashable, seconds: float) -> None:
+        self.bucket(key).pause(seconds)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
@@ -299,13 +299,11 @@ async def generate_daily_report(db_queries: DatabaseQueries, date: Optional[date
         date = datetime.now()
     
     try:
-        # Bugungi statistika
-        daily_stats = await db_queries.get_daily_statistics(days=1)
-        today_data = daily_stats[0] if daily_stats else {}
-        
-        # Kechagi statistika bilan taqqoslash
-        yesterday_stats = await db_queries.get_daily_statistics(days=2)
-        yesterday_data = yesterday_stats[1] if len(yesterday_stats) > 1 else {}
+        # Bugungi va kechagi statistika (bitta so'rovda)
+        daily_stats = await db_queries.get_daily_statistics(days=2)
+        stats_by_date = {row['date']: row for row in daily_stats}
+        today_data = stats_by_date.get(date.date(), {})
+        yesterday_data = stats_by_date.get((date - timedelta(days=1)).date(), {})
         
         # Platform umumiy statistika
         platform_stats = await db_queries.get_platform_statistics()
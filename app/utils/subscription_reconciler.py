@@ -0,0 +1,284 @@
+"""
+Obunalarni fon rejimida qayta tekshirish (joineduserannel ni Telegram bilan moslash)
+
+Oxirgi reconcile_active_days ichida faol bo'lgan foydalanuvchilar
+last_activity bo'yicha kamayish tartibida (eng faollari birinchi) keyset
+paketlarda o'qiladi. Har bir (foydalanuvchi, kanal) get_chat_member bilan
+cheklangan tezlik va parallellikda tekshiriladi, farqlar esa bitta
+tranzaksiyada yoziladi: a'zolar upsert (verified_at yangilanadi), chiqib
+ketganlar o'chiriladi. Bir nechta jarayon bo'lsa, job_leases jadvalidagi
+muddatli ijara (lease) tufayli faqat bittasi tekshiradi. Lease har paketdan
+keyin uzaytiriladi; jarayon o'lsa, muddati tugagach boshqasi oladi. Session
+lock dan farqli, tranzaksiya pooler (PgBouncer) orqasida ham ishlaydi.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from app.config import settings
+from app.database.channel_registry import channel_registry
+from app.database.connection import get_db_connection
+from app.database.membership import membership_writer
+from app.database.models import Channel
+from app.utils.channel_checker import is_member_status, subscription_service
+from app.utils.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Foydalanuvchi kanalga hech qachon kirmagan - a'zo emas degani
+NOT_MEMBER_ERRORS = ("user not found", "participant_id_invalid")
+
+
+class SubscriptionReconciler:
+    """joineduserannel dagi eskirgan yozuvlarni tuzatuvchi fon vazifasi"""
+
+    LEASE_NAME = "subscription_reconciler"
+
+    # Bo'sh yoki muddati o'tgan lease ni olish, o'zimizniki bo'lsa uzaytirish
+    ACQUIRE_LEASE_QUERY = """
+    INSERT INTO job_leases (name, holder, expires_at)
+    VALUES ($1, $2, CURRENT_TIMESTAMP + make_interval(secs => $3::double precision))
+    ON CONFLICT (name) DO UPDATE
+    SET holder = EXCLUDED.holder, expires_at = EXCLUDED.expires_at
+    WHERE job_leases.holder = EXCLUDED.holder OR job_leases.expires_at < CURRENT_TIMESTAMP
+    RETURNING holder
+    """
+
+    RELEASE_LEASE_QUERY = "DELETE FROM job_leases WHERE name = $1 AND holder = $2"
+
+    USERS_QUERY = """
+    SELECT id, tg_id, last_activity FROM users
+    WHERE last_activity > NOW() - make_interval(days => $1::integer)
+      AND blocked_at IS NULL
+      AND (last_activity, id) < ($2, $3)
+    ORDER BY last_activity DESC, id DESC
+    LIMIT $4
+    """
+
+    MEMBERS_QUERY = "SELECT user_id, channel_id FROM joineduserannel WHERE user_id = ANY($1::int[])"
+
+    UPSERT_QUERY = """
+    INSERT INTO joineduserannel (user_id, channel_id)
+    SELECT * FROM unnest($1::int[], $2::int[])
+    ON CONFLICT (user_id, channel_id) DO UPDATE SET verified_at = CURRENT_TIMESTAMP
+    """
+
+    DELETE_QUERY = """
+    DELETE FROM joineduserannel AS j
+    USING unnest($1::int[], $2::int[]) AS r(user_id, channel_id)
+    WHERE j.user_id = r.user_id AND j.channel_id = r.channel_id
+    """
+
+    def __init__(self, interval: float = 600.0, active_days: int = 7, batch_size: int = 100,
+                 concurrency: int = 5, rate: float = 10.0, lease_ttl: float = 300.0):
+        self.interval = interval
+        self.active_days = active_days
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.lease_ttl = lease_ttl
+        self._holder_suffix = uuid.uuid4().hex[:8]
+        self.bucket = TokenBucket(rate)
+        self.passes = 0
+        self.checked = 0
+        self.joins = 0
+        self.leaves = 0
+        self.errors = 0
+        self.last_pass: Optional[Dict[str, Any]] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def holder(self) -> str:
+        """Lease egasi: host, jarayon (fork dan keyin ham o'zgaradi) va tasodifiy qo'shimcha"""
+        return f"{socket.gethostname()}:{os.getpid()}:{self._holder_suffix}"
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def _check(self, bot: Bot, tg_id: int, channel: Channel, broken: Set[int]) -> Optional[bool]:
+        """A'zolik holati; aniqlab bo'lmasa None (yozuv o'zgartirilmaydi)"""
+        if channel.id in broken:
+            return None
+
+        async with self.semaphore:
+            await self.bucket.acquire()
+            try:
+                member = await bot.get_chat_member(chat_id=channel.channel_id, user_id=tg_id)
+                return is_member_status(member)
+            except (TelegramBadRequest, TelegramForbiddenError) as e:
+                if isinstance(e, TelegramBadRequest) and any(error in str(e).lower() for error in NOT_MEMBER_ERRORS):
+                    return False
+                # Kanal topilmadi yoki bot admin emas - bu o'tishda kanal tashlab ketiladi
+                if channel.id not in broken:
+                    broken.add(channel.id)
+                    logger.warning(f"Reconcile: {channel.title} tekshirib bo'lmadi: {e}")
+            except Exception as e:
+                logger.debug(f"Reconcile check error for {tg_id}: {e}")
+
+            self.errors += 1
+            return None
+
+    async def reconcile_batch(self, bot: Bot, users: List[Any], channels: List[Channel],
+                              broken: Set[int]) -> Dict[str, int]:
+        """Paketni tekshirish va farqlarni yozish"""
+        pairs = [(user, channel) for user in users for channel in channels]
+        results = await asyncio.gather(*(
+            self._check(bot, user['tg_id'], channel, broken) for user, channel in pairs
+        ))
+
+        db = get_db_connection()
+        existing = {
+            (record['user_id'], record['channel_id'])
+            for record in await db.fetch(self.MEMBERS_QUERY, [user['id'] for user in users])
+        }
+
+        members = ([], [])
+        removed = ([], [])
+        joins = 0
+        for (user, channel), is_member in zip(pairs, results):
+            # Tekshirish davomida kelgan chat_member hodisasi yangiroq
+            if is_member is None or membership_writer.pending_status(user['tg_id'], channel.channel_id) is not None:
+                continue
+
+            key = (user['id'], channel.id)
+            if is_member:
+                members[0].append(user['id'])
+                members[1].append(channel.id)
+                if key not in existing:
+                    joins += 1
+                    subscription_service.remember(user['tg_id'], channel.channel_id, True)
+            elif key in existing:
+                removed[0].append(user['id'])
+                removed[1].append(channel.id)
+                subscription_service.remember(user['tg_id'], channel.channel_id, False)
+
+        if members[0] or removed[0]:
+            async with db.get_connection() as conn:
+                async with conn.transaction():
+                    if removed[0]:
+                        await conn.execute(self.DELETE_QUERY, *removed)
+                    if members[0]:
+                        await conn.execute(self.UPSERT_QUERY, *members)
+
+        self.checked += len(users)
+        self.joins += joins
+        self.leaves += len(removed[0])
+        return {"users": len(users), "joins": joins, "leaves": len(removed[0])}
+
+    async def _acquire_lease(self, db) -> bool:
+        """Lease ni olish yoki uzaytirish (boshqa jarayonda bo'lsa False)"""
+        holder = await db.fetchval(self.ACQUIRE_LEASE_QUERY, self.LEASE_NAME, self.holder, self.lease_ttl)
+        return holder is not None
+
+    async def run_pass(self, bot: Bot) -> Optional[Dict[str, Any]]:
+        """Faol foydalanuvchilarni bir marta aylanib chiqish (lease band bo'lsa None)"""
+        channels = [
+            channel for channel in await channel_registry.get_active_channels()
+            if channel.channel_id
+        ]
+        if not channels:
+            return None
+
+        db = get_db_connection()
+        started = time.monotonic()
+        totals = {"users": 0, "joins": 0, "leaves": 0}
+        broken: Set[int] = set()
+
+        if not await self._acquire_lease(db):
+            return None
+
+        try:
+            cursor = (datetime.max, 0)
+            while True:
+                users = await db.fetch(self.USERS_QUERY, self.active_days, *cursor, self.batch_size)
+                if not users:
+                    break
+
+                batch = await self.reconcile_batch(bot, users, channels, broken)
+                for key, value in batch.items():
+                    totals[key] += value
+
+                cursor = (users[-1]['last_activity'], users[-1]['id'])
+                if len(broken) == len(channels):
+                    break
+
+                if not await self._acquire_lease(db):
+                    # Lease muddati o'tib, boshqa jarayon olgan - u davom ettiradi
+                    logger.warning("⚠️ Obunalarni tekshirish lease i yo'qotildi, o'tish to'xtatildi")
+                    return None
+        finally:
+            try:
+                await db.execute(self.RELEASE_LEASE_QUERY, self.LEASE_NAME, self.holder)
+            except Exception as e:
+                logger.error(f"Subscription reconcile lease release error: {e}")
+
+        self.passes += 1
+        self.last_pass = {
+            **totals,
+            "skipped_channels": len(broken),
+            "duration": round(time.monotonic() - started, 1),
+            "finished_at": datetime.now()
+        }
+        logger.info(f"✅ Obunalar tekshirildi: {totals['users']} foydalanuvchi, "
+                    f"+{totals['joins']} / -{totals['leaves']} ({self.last_pass['duration']} s)")
+        return self.last_pass
+
+    async def _run(self, bot: Bot) -> None:
+        """Davriy tekshirish sikli"""
+        while True:
+            try:
+                await self.run_pass(bot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Subscription reconcile error: {e}")
+
+            await asyncio.sleep(self.interval)
+
+    async def on_startup(self, bot: Bot) -> None:
+        """Fon vazifasini ishga tushirish"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(bot))
+
+    async def on_shutdown(self) -> None:
+        """Fon vazifasini to'xtatish"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "passes": self.passes,
+            "checked": self.checked,
+            "joins": self.joins,
+            "leaves": self.leaves,
+            "errors": self.errors,
+            "last_pass": self.last_pass
+        }
+
+
+# Global subscription reconciler instance
+subscription_reconciler = SubscriptionReconciler(
+    interval=settings.reconcile_interval,
+    active_days=settings.reconcile_active_days,
+    batch_size=settings.reconcile_batch_size,
+    concurrency=settings.reconcile_concurrency,
+    rate=settings.reconcile_rate,
+    lease_ttl=settings.reconcile_lease_ttl
+)
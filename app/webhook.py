@@ -0,0 +1,182 @@
+"""
+Webhook rejimi - aiohttp server orqali update larni qabul qilish
+
+Mahalliy sinash uchun WEBHOOK_URL bo'sh qoldiriladi (Telegram ga webhook
+o'rnatilmaydi) va yozib olingan Update JSON qo'lda yuboriladi:
+
+    curl -X POST http://127.0.0.1:8080/webhook \\
+         -H "Content-Type: application/json" \\
+         -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \\
+         -d @update.json
+
+WEBHOOK_WORKERS > 1 bo'lsa, SO_REUSEPORT bitta foydalanuvchining update larini
+turli jarayonlarga tarqatadi. Shuning uchun FSM_STORAGE=postgres talab qilinadi
+(aks holda ko'p bosqichli dialoglar va qidiruv natijalarini sahifalash buziladi). Quyidagilar esa har bir jarayonda
+alohida va faqat TTL tugagach yoki davriy yangilanishda moslashadi:
+    - user_cache (foydalanuvchilar, admin huquqlari DB dan qayta tekshiriladi)
+    - SubscriptionService musbat/manfiy keshlari (kanal obunasi)
+    - movie_index va channel_registry (davriy qayta yuklanadi)
+    - API rate limiter bucket lari (Telegram limitlari jarayonlar soniga bo'linmaydi)
+Foydalanuvchini bitta jarayonga bog'lash kerak bo'lsa, SHARD_WORKERS (app/sharding.py)
+ishlatiladi.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+from typing import List
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from app.bot import create_bot
+from app.config import settings
+from app.database.connection import init_db, close_db
+from app.utils.broadcast import broadcast_engine
+from app.utils.subscription_reconciler import subscription_reconciler
+
+logger = logging.getLogger(__name__)
+
+
+class GracefulRequestHandler(SimpleRequestHandler):
+    """To'xtashda ishlanayotgan update lar tugashini kutadigan handler"""
+
+    def __init__(self, *args, shutdown_timeout: float = 30.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shutdown_timeout = shutdown_timeout
+
+    async def close(self) -> None:
+        """Fondagi update larni kutish, keyin bot sessiyasini yopish"""
+        pending = set(self._background_feed_update_tasks)
+        if pending:
+            logger.info(f"⏳ {len(pending)} ta update tugashi kutilmoqda...")
+            _, not_done = await asyncio.wait(pending, timeout=self.shutdown_timeout)
+            for task in not_done:
+                task.cancel()
+
+        await super().close()
+
+
+async def on_startup(bot: Bot, dispatcher: Dispatcher, worker_index: int) -> None:
+    """Worker ishga tushganda: DB pool ochish va webhook o'rnatish"""
+    await init_db()
+
+    # Webhook ni faqat birinchi worker o'rnatadi
+    if worker_index == 0 and settings.webhook_url:
+        await bot.set_webhook(
+            url=settings.webhook_url.rstrip('/') + settings.webhook_path,
+            secret_token=settings.webhook_secret or None,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+            max_connections=settings.webhook_max_connections,
+            drop_pending_updates=False
+        )
+        logger.info(f"✅ Webhook o'rnatildi: {settings.webhook_url}{settings.webhook_path}")
+
+    # Tugallanmagan ommaviy xabarlar va obunalarni tekshirish (ikkalasini ham faqat bitta worker bajaradi)
+    await broadcast_engine.on_startup(bot)
+    await subscription_reconciler.on_startup(bot)
+
+
+async def on_shutdown() -> None:
+    """Worker to'xtaganda: buferlarni yozish va DB poolni yopish"""
+    await subscription_reconciler.on_shutdown()
+    await broadcast_engine.on_shutdown()
+    await close_db()
+
+
+def create_webhook_app(worker_index: int = 0) -> web.Application:
+    """Bitta worker uchun aiohttp ilovasini yaratish"""
+    bot, dp = create_bot()
+
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+
+    app = web.Application()
+    GracefulRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=settings.webhook_secret or None,
+        shutdown_timeout=settings.webhook_shutdown_timeout
+    ).register(app, path=settings.webhook_path)
+
+    # aiohttp startup/shutdown -> dp.startup/dp.shutdown
+    setup_application(app, dp, bot=bot, worker_index=worker_index)
+
+    return app
+
+
+def run_webhook_worker(worker_index: int = 0) -> None:
+    """Bitta worker jarayoni (bir portni SO_REUSEPORT bilan bo'lishadi)"""
+    logging.basicConfig(level=getattr(logging, settings.log_level.upper(), logging.INFO))
+
+    if not settings.webhook_secret:
+        logger.warning("⚠️ WEBHOOK_SECRET o'rnatilmagan - so'rovlar tekshirilmaydi")
+
+    web.run_app(
+        create_webhook_app(worker_index),
+        host=settings.webapp_host,
+        port=settings.webapp_port,
+        reuse_port=settings.webhook_workers > 1,
+        shutdown_timeout=settings.webhook_shutdown_timeout,
+        print=None
+    )
+
+
+def run_webhook() -> None:
+    """Webhook rejimini ishga tushirish (kerak bo'lsa bir nechta worker bilan)"""
+    workers = max(1, settings.webhook_workers)
+    if workers > 1 and settings.fsm_storage != "postgres":
+        # memory storage da holat faqat update ni qabul qilgan jarayonda qoladi
+        raise RuntimeError(
+            f"WEBHOOK_WORKERS={workers} uchun FSM_STORAGE=postgres kerak "
+            f"(hozir: {settings.fsm_storage}) - yoki SHARD_WORKERS ishlating"
+        )
+
+    if workers == 1:
+        run_webhook_worker(0)
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    processes: List[multiprocessing.Process] = [None] * workers
+    stopping = False
+
+    def start_worker(index: int) -> None:
+        process = ctx.Process(target=run_webhook_worker, args=(index,), name=f"webhook-worker-{index}")
+        process.start()
+        processes[index] = process
+
+    def stop_workers(*_) -> None:
+        nonlocal stopping
+        stopping = True
+        for process in processes:
+            if process and process.is_alive():
+                process.terminate()  # SIGTERM - worker graceful to'xtaydi
+
+    for index in range(workers):
+        start_worker(index)
+
+    # Ctrl+C butun guruhga yuboriladi - workerlar o'zlari to'xtaydi
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, stop_workers)
+
+    logger.info(f"✅ {workers} ta webhook worker ishga tushdi: {settings.webapp_host}:{settings.webapp_port}")
+
+    # Kutilmaganda to'xtagan workerlarni qayta ishga tushirish
+    while True:
+        alive = [process for process in processes if process.is_alive()]
+        if not alive and (stopping or all(process.exitcode == 0 for process in processes)):
+            break
+
+        if not stopping:
+            for index, process in enumerate(processes):
+                if not process.is_alive() and process.exitcode != 0:
+                    logger.error(f"❌ {process.name} to'xtadi (exitcode={process.exitcode}), qayta ishga tushirilmoqda")
+                    start_worker(index)
+
+        time.sleep(1)
+
+    for process in processes:
+        process.join()
@@ -0,0 +1,93 @@
+"""
+Ommaviy xabar yuborish tezligi (soxta Bot bilan, Telegram va DB kerak emas)
+
+FakeBot har bir copy_message ni `--latency` soniya kutadi, foydalanuvchilarning
+`--blocked` qismi uchun Forbidden qaytaradi va Telegram kabi soniyasiga
+`--flood-limit` tadan ortiq so'rovga RetryAfter beradi. BroadcastEngine.send_batch
+paketlarni xuddi haqiqiy vazifadagidek yuboradi.
+
+Ishlatish (repo ildizidan):
+    python benchmarks/broadcast.py --users 2000
+    python benchmarks/broadcast.py --users 2000 --rate 25 --rate 40
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter  # noqa: E402
+from aiogram.methods import CopyMessage  # noqa: E402
+
+from app.utils.broadcast import BLOCKED, FAILED, SENT, BroadcastEngine  # noqa: E402
+
+
+class FakeBot:
+    """Telegram ning global limitini taqlid qiluvchi Bot"""
+
+    def __init__(self, latency: float, blocked: float, flood_limit: int, seed: int = 1):
+        self.latency = latency
+        self.blocked = blocked
+        self.flood_limit = flood_limit
+        self.random = random.Random(seed)
+        self.recent = deque()
+        self.retry_after = 0
+
+    async def copy_message(self, chat_id: int, from_chat_id: int, message_id: int):
+        method = CopyMessage(chat_id=chat_id, from_chat_id=from_chat_id, message_id=message_id)
+        now = time.monotonic()
+        while self.recent and now - self.recent[0] > 1.0:
+            self.recent.popleft()
+
+        if len(self.recent) >= self.flood_limit:
+            self.retry_after += 1
+            raise TelegramRetryAfter(method=method, message="Flood control exceeded", retry_after=1)
+        self.recent.append(now)
+
+        await asyncio.sleep(self.latency * self.random.uniform(0.5, 1.5))
+        if self.random.random() < self.blocked:
+            raise TelegramForbiddenError(method=method, message="Forbidden: bot was blocked by the user")
+
+
+async def run(rate: float, args: argparse.Namespace) -> None:
+    engine = BroadcastEngine(rate=rate, concurrency=args.concurrency, batch_size=args.batch_size)
+    bot = FakeBot(args.latency, args.blocked, args.flood_limit)
+    job = {"from_chat_id": 1, "message_id": 1}
+    totals = {SENT: 0, FAILED: 0, BLOCKED: 0}
+
+    started = time.perf_counter()
+    for offset in range(0, args.users, args.batch_size):
+        users = [{"id": i, "tg_id": 1000000 + i} for i in range(offset, min(offset + args.batch_size, args.users))]
+        outcome = await engine.send_batch(bot, job, users)
+        for result, ids in outcome.items():
+            totals[result] += len(ids)
+    elapsed = time.perf_counter() - started
+
+    print(f"rate {rate:6.1f}/s   {elapsed:6.1f} s   {args.users / elapsed:6.1f} xabar/s   "
+          f"sent {totals[SENT]}  blocked {totals[BLOCKED]}  failed {totals[FAILED]}  "
+          f"RetryAfter {bot.retry_after}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--rate", type=float, action="append", help="Bir necha marta berish mumkin")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.08, help="copy_message o'rtacha kechikishi (s)")
+    parser.add_argument("--blocked", type=float, default=0.05, help="Botni bloklaganlar ulushi")
+    parser.add_argument("--flood-limit", type=int, default=30, help="Soniyasiga ruxsat etilgan so'rovlar")
+    args = parser.parse_args()
+
+    print(f"users: {args.users}, latency: {args.latency * 1000:.0f} ms, flood limit: {args.flood_limit}/s\n")
+    for rate in args.rate or [25.0, 40.0]:
+        await run(rate, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
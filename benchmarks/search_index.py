@@ -0,0 +1,141 @@
+"""
+Xotiradagi kino qidiruv indeksi tezligi (sintetik katalog, DB kerak emas)
+
+`--movies` ta tasodifiy nom yaratiladi (bir qismi kirillda), view_count
+Zipf taqsimotida. Har bir so'rov turi uchun MovieSearchIndex.search
+kechikishi (o'rtacha, p50, p99) o'lchanadi:
+    word    - to'liq so'z
+    prefix  - so'z boshi (2-4 harf)
+    multi   - ikki so'z
+    typo    - bitta harfi o'zgartirilgan so'z (imlo xatosi)
+    script  - lotincha nom kirillda yoki aksincha
+
+Ishlatish (repo ildizidan):
+    python benchmarks/search_index.py
+    python benchmarks/search_index.py --movies 100000 --queries 2000
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database.models import Movie  # noqa: E402
+from app.database.search_index import MovieSearchIndex, tokenize  # noqa: E402
+
+SYLLABLES = ["ka", "ra", "mo", "sh", "ta", "li", "no", "qu", "va", "zi", "be", "dor", "ch", "gu", "an",
+             "er", "os", "ul", "yo", "xa", "ho", "fi", "ja", "ne", "sa", "to", "ri", "mi", "lo", "da"]
+LATIN_TO_CYRILLIC = {
+    "sh": "ш", "ch": "ч", "yo": "ё", "a": "а", "b": "б", "d": "д", "e": "е", "f": "ф", "g": "г",
+    "h": "ҳ", "i": "и", "j": "ж", "k": "к", "l": "л", "m": "м", "n": "н", "o": "о", "p": "п",
+    "q": "қ", "r": "р", "s": "с", "t": "т", "u": "у", "v": "в", "x": "х", "y": "й", "z": "з",
+}
+
+
+def to_cyrillic(text: str) -> str:
+    result, i = [], 0
+    while i < len(text):
+        pair = text[i:i + 2]
+        if pair in LATIN_TO_CYRILLIC:
+            result.append(LATIN_TO_CYRILLIC[pair])
+            i += 2
+        else:
+            result.append(LATIN_TO_CYRILLIC.get(text[i], text[i]))
+            i += 1
+    return "".join(result)
+
+
+def make_catalog(count: int, vocabulary: int, rng: random.Random):
+    words = list({
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        for _ in range(vocabulary)
+    })
+    # Mashhur so'zlar tez-tez uchraydi
+    weights = list(itertools.accumulate(1 / (rank + 1) ** 0.8 for rank in range(len(words))))
+    created_at = datetime(2024, 1, 1)
+
+    movies = []
+    for movie_id in range(1, count + 1):
+        title = " ".join(rng.choices(words, cum_weights=weights, k=rng.randint(1, 4))).capitalize()
+        if rng.random() < 0.3:
+            title = to_cyrillic(title.lower()).capitalize()
+        if rng.random() < 0.2:
+            title += f" {rng.randint(1, 5)}"
+        movies.append(Movie(
+            id=movie_id, file_id="", code=str(movie_id), title=title, description="",
+            private_message_id=0, view_count=int(100000 / rng.paretovariate(1.2)), created_at=created_at
+        ))
+    return movies
+
+
+def make_queries(movies, count: int, rng: random.Random):
+    def title_words():
+        return tokenize(rng.choice(movies).title)
+
+    def typo(word: str) -> str:
+        position = rng.randrange(1, len(word))
+        return word[:position] + rng.choice("aeiouktr") + word[position + 1:]
+
+    kinds = {
+        "word": lambda words: words[0],
+        "prefix": lambda words: words[0][:rng.randint(2, 4)],
+        "multi": lambda words: " ".join(words[:2]),
+        "typo": lambda words: typo(words[0]),
+        "script": lambda words: to_cyrillic(words[0]) if rng.random() < 0.5 else words[0],
+    }
+    queries = {}
+    for kind, build in kinds.items():
+        queries[kind] = []
+        while len(queries[kind]) < count:
+            words = [word for word in title_words() if len(word) >= 4]
+            if words:
+                queries[kind].append(build(words))
+    return queries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--movies", type=int, default=100000)
+    parser.add_argument("--vocabulary", type=int, default=20000, help="Nomlardagi turli so'zlar")
+    parser.add_argument("--queries", type=int, default=2000, help="Har bir tur uchun so'rovlar")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    movies = make_catalog(args.movies, args.vocabulary, rng)
+
+    index = MovieSearchIndex()
+    started = time.perf_counter()
+    index.sync(movies)
+    build = time.perf_counter() - started
+    stats = index.stats()
+    print(f"movies: {stats['movies']}, so'zlar: {stats['tokens']}, prefikslar: {stats['prefixes']}, "
+          f"trigramlar: {stats['trigrams']}, qurish: {build:.2f} s\n")
+
+    print(f"{'tur':8} {'o`rtacha':>10} {'p50':>10} {'p99':>10} {'topildi':>9}")
+    for kind, queries in make_queries(movies, args.queries, rng).items():
+        timings, found = [], 0
+        for query in queries:
+            started = time.perf_counter()
+            results = index.search(query, args.limit)
+            timings.append((time.perf_counter() - started) * 1000)
+            found += bool(results)
+        timings.sort()
+        print(f"{kind:8} {statistics.mean(timings):8.3f}ms {timings[len(timings) // 2]:8.3f}ms "
+              f"{timings[int(len(timings) * 0.99)]:8.3f}ms {found / len(queries):8.0%}")
+
+    # Qayta yuklashdan keyingi sync: nomlar o'zgarmagan - qayta indekslanmaydi
+    started = time.perf_counter()
+    index.sync(movies)
+    print(f"\nsync (o'zgarishsiz): {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Supervisor rejimining workerlar soni bo'yicha masshtablanishi
+
+Haqiqiy Telegram/DB o'rniga har bir update uchun CPU ishi bajariladi:
+Update modelini qurish, Movie/User obyektlari va caption formatlash.
+
+Ishlatish (repo ildizidan):
+    python benchmarks/shard_scaling.py --updates 20000 --workers 1 2 4
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.sharding import ShardSupervisor  # noqa: E402
+
+CHATS = 5000
+
+
+def make_update(update_id: int) -> dict:
+    chat_id = 100000 + update_id % CHATS
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": chat_id, "type": "private", "first_name": "Test"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Test", "language_code": "uz"},
+            "text": str(update_id % 1000)
+        }
+    }
+
+
+async def cpu_bound_processor(worker_index: int):
+    """Bot handleriga o'xshash CPU ishi (tarmoq va DB siz)"""
+    from aiogram.types import Update
+    from app.database.models import Movie, User
+    from app.utils.movie_manager import format_movie_caption
+
+    record = {
+        "id": 1, "file_id": "BAACAgIAAxkBAAI" * 4, "code": "123", "title": "Test kino",
+        "description": "Tavsif " * 20, "private_message_id": 10, "view_count": 1000,
+        "created_at": datetime.now()
+    }
+
+    async def process(update: dict) -> None:
+        parsed = Update.model_validate(update)
+        user = User(tg_id=parsed.message.from_user.id, full_name=parsed.message.from_user.full_name)
+        movie = Movie.from_record(record)
+        format_movie_caption(movie, user)
+
+    async def cleanup() -> None:
+        pass
+
+    return process, cleanup
+
+
+async def run(workers: int, updates: int) -> float:
+    supervisor = ShardSupervisor(workers=workers, factory=cpu_bound_processor, queue_size=5000)
+    supervisor.start()
+    await supervisor.wait_ready()
+
+    started = time.perf_counter()
+    for update_id in range(updates):
+        await supervisor.route(make_update(update_id))
+    await supervisor.stop()
+    elapsed = time.perf_counter() - started
+
+    stats = supervisor.stats()
+    assert stats["processed"] == updates, stats
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    print(f"CPU: {os.cpu_count()}, updates: {args.updates}")
+    baseline = None
+    for workers in args.workers:
+        elapsed = asyncio.run(run(workers, args.updates))
+        throughput = args.updates / elapsed
+        baseline = baseline or throughput
+        print(f"workers={workers:<3} {elapsed:7.2f}s  {throughput:9.0f} upd/s  x{throughput / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 import asyncio
 import logging
 from app.bot import create_bot
-from app.database.connection import init_db
+from app.config import settings
+from app.database.connection import init_db, close_db
+from app.utils.broadcast import broadcast_engine
+from app.utils.subscription_reconciler import subscription_reconciler
 
 async def main():
     """Asosiy funksiya"""
@@ -11,11 +14,27 @@ async def main():
     # Bot yaratish va ishga tushirish
     bot, dp = create_bot()
     
+    # Tugallanmagan ommaviy xabarlarni davom ettirish va obunalarni tekshirish
+    await broadcast_engine.on_startup(bot)
+    await subscription_reconciler.on_startup(bot)
+    
     try:
         await dp.start_polling(bot)
     finally:
+        await subscription_reconciler.on_shutdown()
+        await broadcast_engine.on_shutdown()
         await bot.session.close()
+        # Buferlangan yozuvlarni saqlash va poolni yopish
+        await close_db()
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    asyncio.run(main())
\ No newline at end of file
+
+    if settings.shard_workers > 0:
+        from app.sharding import run_supervisor
+        run_supervisor()
+    elif settings.run_mode == "webhook":
+        from app.webhook import run_webhook
+        run_webhook()
+    else:
+        asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,35 @@
+"""
+Testlar uchun umumiy sozlamalar
+
+app.config import qilinganda BOT_TOKEN va DATABASE_URL talab qilinadi -
+.env bo'lmagan muhitda ham testlar ishlashi uchun soxta qiymatlar beriladi.
+Testlar haqiqiy bazaga ulanmaydi.
+"""
+
+import os
+
+import pytest
+
+os.environ.setdefault("BOT_TOKEN", "123456:test-token")
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test")
+
+
+class FakeClock:
+    """Boshqariladigan soat: time.monotonic va asyncio.sleep o'rniga"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_clock():
+    """Har bir test moduli o'z modullaridagi time/asyncio ni shu soatga almashtiradi"""
+    return FakeClock()
@@ -0,0 +1,675 @@
+"""
+Ma'lumotlar bazasi qatlami yordamchilari testlari (haqiqiy baza kerak emas)
+"""
+
+import asyncio
+import io
+import json
+import re
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import asyncpg
+import pytest
+
+from app.database import cache as cache_module
+from app.database import view_writer as view_writer_module
+from app.config import settings
+from app.database.cache import TTLCache
+from app.database.connection import DatabaseConnection, PoolMetrics
+from app.database.export import EXPORT_FORMAT
+from app.database.models import Movie
+from app.database.queries import escape_like
+from app.database.search_index import MovieSearchIndex, normalize, tokenize
+from app.database.restore import DataRestorer
+from app.database.view_writer import MovieViewWriter
+
+
+@pytest.fixture
+def clock(fake_clock, monkeypatch):
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(monotonic=fake_clock.monotonic))
+    return fake_clock
+
+
+# ==================== TTLCache ====================
+
+def test_ttl_cache_hit_and_miss(clock):
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_cache_entry_expires(clock):
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+
+    clock.now += 61
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "a" endi eng yangi
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_invalidate_and_purge(clock):
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.invalidate("a")
+    assert cache.get("a") is None
+
+    clock.now += 30
+    cache.set("c", 3)
+    clock.now += 31
+    assert cache.purge_expired() == 1
+    assert cache.get("c") == 3
+
+
+
+# ==================== PoolMetrics ====================
+
+def test_pool_metrics_tracks_waiting_and_in_use():
+    metrics = PoolMetrics()
+    metrics.on_request(max_size=2)
+    metrics.on_request(max_size=2)
+    assert metrics.waiting == 2
+
+    metrics.on_acquired(0.002)
+    metrics.on_acquired(0.004)
+    assert (metrics.waiting, metrics.in_use) == (0, 2)
+
+    metrics.on_released()
+    stats = metrics.stats()
+    assert stats["in_use"] == 1
+    assert stats["in_use_high_water"] == 2
+    assert stats["waiting_high_water"] == 2
+    assert stats["acquired"] == 2
+    assert stats["wait_avg_ms"] == 3.0
+    assert stats["wait_max_ms"] == 4.0
+
+
+def test_pool_metrics_counts_exhaustion_and_timeouts():
+    metrics = PoolMetrics()
+    metrics.on_request(max_size=1)
+    metrics.on_acquired(0.0)
+    assert metrics.exhausted == 0
+
+    # Yagona ulanish band - navbatda kutiladi
+    metrics.on_request(max_size=1)
+    assert metrics.exhausted == 1
+    metrics.on_timeout()
+
+    metrics.on_request(max_size=1)
+    metrics.on_abandoned()
+
+    stats = metrics.stats()
+    assert stats["timeouts"] == 1
+    assert stats["exhausted"] == 2
+    assert stats["waiting"] == 0
+    assert stats["acquired"] == 1
+
+
+def test_pool_metrics_wait_histogram_buckets():
+    metrics = PoolMetrics()
+    for wait in (0.0005, 0.001, 0.003, 0.2, 10.0):
+        metrics.on_request(max_size=10)
+        metrics.on_acquired(wait)
+
+    histogram = metrics.stats()["wait_histogram"]
+    assert histogram["<=1ms"] == 2
+    assert histogram["<=5ms"] == 1
+    assert histogram["<=250ms"] == 1
+    assert histogram[">5000ms"] == 1
+    assert sum(histogram.values()) == 5
+
+
+# ==================== DatabaseConnection._coalesce ====================
+
+class FakeQuery:
+    """DatabaseConnection._fetch o'rnini bosuvchi: chaqiruvlarni sanaydi, release gacha kutadi"""
+
+    def __init__(self, result=None, error: Exception = None):
+        self.calls = []
+        self.release = asyncio.Event()
+        self.result = [1, 2, 3] if result is None else result
+        self.error = error
+
+    async def _fetch(self, query, *args, analytics=False):
+        self.calls.append((query, args, analytics))
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return list(self.result)
+
+
+def make_db(fake: FakeQuery) -> DatabaseConnection:
+    db = DatabaseConnection()
+    db._fetch = fake._fetch
+    return db
+
+
+def test_coalesce_shares_concurrent_identical_selects():
+    async def scenario():
+        fake = FakeQuery()
+        db = make_db(fake)
+        tasks = [asyncio.create_task(db.fetch("SELECT * FROM movie WHERE id = $1", 7)) for _ in range(3)]
+        await asyncio.sleep(0)
+        fake.release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert len(fake.calls) == 1
+        assert db.coalesced_queries == 2
+        assert results == [[1, 2, 3]] * 3
+        # Har bir chaqiruvchi o'z ro'yxatini oladi
+        results[0].append(4)
+        assert results[1] == [1, 2, 3]
+        assert db._inflight == {}
+
+    asyncio.run(scenario())
+
+
+def test_coalesce_does_not_share_different_args_or_writes():
+    async def scenario():
+        fake = FakeQuery()
+        db = make_db(fake)
+        tasks = [
+            asyncio.create_task(db.fetch("SELECT * FROM movie WHERE id = $1", 1)),
+            asyncio.create_task(db.fetch("SELECT * FROM movie WHERE id = $1", 2)),
+            asyncio.create_task(db.fetch("UPDATE movie SET view_count = 0 RETURNING id")),
+            asyncio.create_task(db.fetch("UPDATE movie SET view_count = 0 RETURNING id")),
+        ]
+        await asyncio.sleep(0)
+        fake.release.set()
+        await asyncio.gather(*tasks)
+
+        assert len(fake.calls) == 4
+        assert db.coalesced_queries == 0
+
+    asyncio.run(scenario())
+
+
+def test_coalesce_does_not_cache_finished_results():
+    async def scenario():
+        fake = FakeQuery()
+        fake.release.set()
+        db = make_db(fake)
+        await db.fetch("SELECT 1")
+        await db.fetch("SELECT 1")
+
+        assert len(fake.calls) == 2
+        assert db._inflight == {}
+
+    asyncio.run(scenario())
+
+
+def test_coalesce_runs_unhashable_args_directly():
+    async def scenario():
+        fake = FakeQuery()
+        fake.release.set()
+        db = make_db(fake)
+        await asyncio.gather(db.fetch("SELECT unnest($1::int[])", [1, 2]),
+                             db.fetch("SELECT unnest($1::int[])", [1, 2]))
+
+        assert len(fake.calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_coalesce_propagates_errors_to_every_waiter():
+    async def scenario():
+        fake = FakeQuery(error=ValueError("boom"))
+        db = make_db(fake)
+        tasks = [asyncio.create_task(db.fetch("SELECT 1")) for _ in range(2)]
+        await asyncio.sleep(0)
+        fake.release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert len(fake.calls) == 1
+        assert all(isinstance(result, ValueError) for result in results)
+        assert db._inflight == {}
+
+    asyncio.run(scenario())
+
+
+def test_coalesce_survives_cancelled_leader():
+    async def scenario():
+        fake = FakeQuery()
+        db = make_db(fake)
+        leader = asyncio.create_task(db.fetch("SELECT 1"))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(db.fetch("SELECT 1"))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        fake.release.set()
+
+        assert await follower == [1, 2, 3]
+        assert leader.cancelled()
+        assert len(fake.calls) == 1
+
+    asyncio.run(scenario())
+
+
+# ==================== get_connection(analytics=True) ====================
+
+class FakePool:
+    def __init__(self, name: str, error: BaseException = None):
+        self.name = name
+        self.error = error
+        self.acquired = 0
+        self.released = []
+
+    def get_max_size(self) -> int:
+        return 5
+
+    async def acquire(self, timeout=None):
+        if self.error:
+            raise self.error
+        self.acquired += 1
+        return f"{self.name}-conn"
+
+    async def release(self, connection) -> None:
+        self.released.append(connection)
+
+
+def connected_db(read_pool=None) -> DatabaseConnection:
+    db = DatabaseConnection()
+    db.pool = FakePool("primary")
+    db.read_pool = read_pool
+    db._is_connected = True
+    return db
+
+
+async def use_analytics_connection(db: DatabaseConnection) -> str:
+    async with db.get_connection(analytics=True) as conn:
+        return conn
+
+
+def test_analytics_uses_read_pool(monkeypatch):
+    monkeypatch.setattr(settings, "database_read_url", "postgresql://replica/test")
+    db = connected_db(FakePool("replica"))
+
+    assert asyncio.run(use_analytics_connection(db)) == "replica-conn"
+    assert db.read_pool.released == ["replica-conn"]
+    assert db.pool.acquired == 0
+    assert db.read_metrics.stats()["acquired"] == 1
+
+
+@pytest.mark.parametrize("error", [OSError("connection refused"), asyncpg.CannotConnectNowError("starting up")])
+def test_analytics_falls_back_when_read_pool_fails(monkeypatch, error):
+    monkeypatch.setattr(settings, "database_read_url", "postgresql://replica/test")
+    db = connected_db(FakePool("replica", error=error))
+
+    assert asyncio.run(use_analytics_connection(db)) == "primary-conn"
+    assert db.read_fallbacks == 1
+    assert db.pool.released == ["primary-conn"]
+    assert db.read_metrics.stats()["waiting"] == 0
+
+
+def test_analytics_timeout_does_not_fall_back(monkeypatch):
+    monkeypatch.setattr(settings, "database_read_url", "postgresql://replica/test")
+    db = connected_db(FakePool("replica", error=asyncio.TimeoutError()))
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(use_analytics_connection(db))
+    assert db.read_fallbacks == 0
+    assert db.pool.acquired == 0
+    assert db.read_metrics.stats()["timeouts"] == 1
+
+
+def test_missing_read_pool_is_counted_and_recreated(monkeypatch):
+    monkeypatch.setattr(settings, "database_read_url", "postgresql://replica/test")
+    monkeypatch.setattr(settings, "db_read_pool_retry_interval", 30.0)
+    attempts = []
+
+    async def create_pool(dsn, min_size, max_size):
+        attempts.append(dsn)
+        if len(attempts) == 1:
+            raise OSError("replica down")
+        return FakePool("replica")
+
+    async def scenario():
+        db = connected_db()
+        db._create_pool = create_pool
+
+        # Birinchi urinish muvaffaqiyatsiz - asosiy pool ishlatiladi
+        assert await use_analytics_connection(db) == "primary-conn"
+        await db._read_pool_task
+        assert db.read_pool is None
+
+        # Oraliq tugamaguncha qayta urinilmaydi
+        assert await use_analytics_connection(db) == "primary-conn"
+        assert len(attempts) == 1
+
+        db._read_pool_failed_at -= 31
+        await use_analytics_connection(db)
+        await db._read_pool_task
+        assert len(attempts) == 2
+        assert await use_analytics_connection(db) == "replica-conn"
+        assert db.read_fallbacks == 3
+
+    asyncio.run(scenario())
+
+
+# ==================== Tiklash: NDJSON o'qish ====================
+
+USER_COLUMNS = ["id", "tg_id", "full_name", "created_at", "legacy_column"]
+USER_TYPES = ["int4", "int8", "varchar", "timestamp", "text"]
+
+
+class FakeRestoreConnection:
+    """COPY va staging jadval so'rovlarini yozib oladi"""
+
+    def __init__(self):
+        self.copied = []
+        self.executed = []
+
+    async def fetch(self, query, table):
+        return [{"column_name": column} for column in ("id", "tg_id", "full_name", "created_at", "is_admin")]
+
+    async def execute(self, query, *args, **kwargs):
+        self.executed.append(query)
+
+    async def copy_records_to_table(self, table, records, columns, timeout=None):
+        self.copied.append((table, list(columns), list(records)))
+
+
+def ndjson(*lines) -> io.StringIO:
+    return io.StringIO("".join(json.dumps(line) + "\n" for line in lines))
+
+
+def run_restore_stream(file, batch_size: int = 10000):
+    restorer = DataRestorer(batch_size=batch_size)
+    merged = []
+
+    async def fake_merge(conn, table, columns):
+        merged.append((table, columns))
+        return {"inserted": 0, "updated": 0}
+
+    restorer._merge = fake_merge
+    conn = FakeRestoreConnection()
+    state = {"table": None, "table_rows": 0, "phase": None, "total_rows": 0, "completed": {}}
+    asyncio.run(restorer._restore_stream(conn, file, state, None))
+    return conn, state, merged
+
+
+def users_file(rows, declared=None):
+    return ndjson(
+        {"format": EXPORT_FORMAT, "version": 1},
+        {"table": "users", "columns": USER_COLUMNS, "types": USER_TYPES},
+        *rows,
+        {"table": "users", "rows": len(rows) if declared is None else declared},
+    )
+
+
+def test_restore_stream_converts_rows_and_drops_unknown_columns():
+    rows = [[1, 100, "Ali", "2024-01-02T03:04:05", "x"], [2, 200, None, None, "y"]]
+    conn, state, merged = run_restore_stream(users_file(rows), batch_size=2)
+
+    copied_rows = [row for _, _, batch in conn.copied for row in batch]
+    assert copied_rows == [(1, 100, "Ali", datetime(2024, 1, 2, 3, 4, 5)), (2, 200, None, None)]
+    assert conn.copied[0][0] == "restore_users"
+    assert conn.copied[0][1] == ["id", "tg_id", "full_name", "created_at"]
+    assert merged == [("users", ["id", "tg_id", "full_name", "created_at"])]
+    assert state["completed"]["users"]["rows"] == 2
+    assert state["total_rows"] == 2
+
+
+@pytest.mark.parametrize("lines, message", [
+    ([{"format": "something-else"}], "eksport formatida emas"),
+    ([{"format": EXPORT_FORMAT}, [1, 2, 3]], "sarlavhasisiz"),
+    ([{"format": EXPORT_FORMAT}, {"table": "secrets", "columns": ["id"], "types": ["int4"]}], "Noma'lum jadval"),
+])
+def test_restore_stream_rejects_malformed_files(lines, message):
+    with pytest.raises(ValueError, match=message):
+        run_restore_stream(ndjson(*lines))
+
+
+def test_restore_stream_rejects_row_count_mismatch():
+    with pytest.raises(ValueError, match="to'liq emas"):
+        run_restore_stream(users_file([[1, 100, "Ali", None, None]], declared=2))
+
+
+def test_restore_stream_rejects_truncated_file():
+    truncated = ndjson(
+        {"format": EXPORT_FORMAT},
+        {"table": "users", "columns": USER_COLUMNS, "types": USER_TYPES},
+        [1, 100, "Ali", None, None],
+    )
+    with pytest.raises(ValueError, match="to'liq emas"):
+        run_restore_stream(truncated)
+
+
+# ==================== escape_like ====================
+
+def ilike(pattern: str, text: str) -> bool:
+    """PostgreSQL ILIKE (standart ESCAPE '\\') ning soddalashtirilgan modeli"""
+    regex, i = [], 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern):
+            regex.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        regex.append(".*" if char == "%" else "." if char == "_" else re.escape(char))
+        i += 1
+    return re.fullmatch("".join(regex), text, re.IGNORECASE | re.DOTALL) is not None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Avatar", "Avatar"),
+    ("100%", "100\\%"),
+    ("my_movie", "my\\_movie"),
+    ("C:\\films", "C:\\\\films"),
+    ("\\%", "\\\\\\%"),
+])
+def test_escape_like_escapes_wildcards(text, expected):
+    assert escape_like(text) == expected
+
+
+@pytest.mark.parametrize("term, title, matches", [
+    ("100%", "Top 100% kino", True),
+    ("100%", "Top 1000 kino", False),
+    ("a_b", "qism a_b", True),
+    ("a_b", "qism axb", False),
+    ("\\", "back\\slash", True),
+    ("\\", "slash", False),
+    ("avatar", "AVATAR 2", True),
+])
+def test_escape_like_matches_literally(term, title, matches):
+    assert ilike(f"%{escape_like(term)}%", title) is matches
+
+
+# ==================== MovieSearchIndex ====================
+
+def make_movie(movie_id: int, title: str, views: int = 0, year: int = 2024) -> Movie:
+    return Movie(
+        id=movie_id, file_id="", code=str(movie_id), title=title, description="",
+        private_message_id=0, view_count=views, created_at=datetime(year, 1, 1)
+    )
+
+
+@pytest.fixture
+def search_index():
+    index = MovieSearchIndex()
+    index.sync([
+        make_movie(1, "O'tgan kunlar", views=50, year=2020),
+        make_movie(2, "Mehrobdan chayon", views=10),
+        make_movie(3, "Avatar", views=500),
+        make_movie(4, "Avatar: Suv yo'li", views=300),
+        make_movie(5, "Шум бола", views=80),
+    ])
+    return index
+
+
+def ids(movies):
+    return [movie.id for movie in movies]
+
+
+def test_normalize_transliterates_and_drops_apostrophes():
+    assert normalize("Ўтган кунлар") == normalize("O'tgan kunlar") == "otgan kunlar"
+    assert tokenize("Avatar: Suv yo'li (2022)") == ["avatar", "suv", "yoli", "2022"]
+
+
+def test_search_by_prefix_ranked_by_views(search_index):
+    assert ids(search_index.search("ava")) == [3, 4]
+    assert ids(search_index.search("avatar suv")) == [4]
+    assert ids(search_index.search("ava", limit=1)) == [3]
+
+
+def test_search_across_scripts(search_index):
+    assert ids(search_index.search("ўтган")) == [1]
+    assert ids(search_index.search("shum bola")) == [5]
+
+
+def test_search_tolerates_typos(search_index):
+    assert ids(search_index.search("mehrobdan chayin")) == [2]
+    assert search_index.search("zzzz") == []
+
+
+def test_search_filters(search_index):
+    assert ids(search_index.search("avatar", min_views=400)) == [3]
+    assert ids(search_index.search("avatar", max_views=400)) == [4]
+    assert ids(search_index.search("kunlar", year=2024)) == []
+    assert ids(search_index.search("kunlar", year=2020)) == [1]
+
+
+def test_add_rename_and_remove_update_the_index(search_index):
+    search_index.add(make_movie(2, "Sarob", views=10))
+    assert search_index.search("mehrobdan") == []
+    assert ids(search_index.search("sarob")) == [2]
+
+    search_index.remove(3)
+    assert ids(search_index.search("avatar")) == [4]
+    assert len(search_index) == 4
+
+    search_index.sync([make_movie(4, "Avatar: Suv yo'li", views=300)])
+    assert len(search_index) == 1
+    assert search_index.stats()["tokens"] == 3
+
+
+def test_large_candidate_sets_walk_popularity_order():
+    index = MovieSearchIndex(scan_threshold=2)
+    index.sync([make_movie(movie_id, f"Kino {movie_id}", views=movie_id) for movie_id in range(1, 11)])
+
+    assert ids(index.search("kino", limit=3)) == [10, 9, 8]
+    assert ids(index.search("kino", limit=2, max_views=5)) == [5, 4]
+
+
+# ==================== MovieViewWriter ====================
+
+class FakeViewDb:
+    """WRITE_QUERY o'rniga: bad_users dagi foydalanuvchi bor paket DataError beradi"""
+
+    def __init__(self, bad_users=(), error=None):
+        self.bad_users = set(bad_users)
+        self.error = error
+        self.written = []
+
+    async def fetch(self, query, user_ids, movie_ids, viewed_at):
+        if self.error is not None:
+            raise self.error
+        if self.bad_users & set(user_ids):
+            raise asyncpg.DataError("invalid input")
+
+        self.written += list(zip(user_ids, movie_ids))
+        views = {}
+        for movie_id in movie_ids:
+            views[movie_id] = views.get(movie_id, 0) + 1
+        return [{"id": movie_id, "views": count} for movie_id, count in views.items()]
+
+
+def view_events(count: int):
+    return [(user_id, 100 + user_id % 3, datetime(2024, 1, 1)) for user_id in range(1, count + 1)]
+
+
+@pytest.fixture
+def view_db(monkeypatch):
+    fake = FakeViewDb()
+    monkeypatch.setattr(view_writer_module, "get_db_connection", lambda: fake)
+    return fake
+
+
+def test_view_writer_isolates_bad_rows(view_db, tmp_path):
+    view_db.bad_users = {3, 7}
+    writer = MovieViewWriter(dead_letter_path=str(tmp_path / "failed.jsonl"))
+
+    asyncio.run(writer._write_checked(view_events(10)))
+
+    assert sorted(user_id for user_id, _ in view_db.written) == [1, 2, 4, 5, 6, 8, 9, 10]
+    assert writer.dead_lettered == 2
+    assert writer._buffer == []
+    failed = [json.loads(line)[0] for line in (tmp_path / "failed.jsonl").read_text().splitlines()]
+    assert sorted(failed) == [3, 7]
+
+
+@pytest.mark.parametrize("error", [
+    asyncpg.ConnectionDoesNotExistError("connection lost"),
+    ConnectionRefusedError("refused"),
+    asyncio.TimeoutError(),
+])
+def test_view_writer_requeues_batch_on_connection_errors(view_db, error):
+    view_db.error = error
+    writer = MovieViewWriter()
+    events = view_events(5)
+
+    with pytest.raises(type(error)):
+        asyncio.run(writer._write_checked(events))
+
+    assert writer._buffer == events
+    assert writer.dead_lettered == 0
+
+
+def test_view_writer_requeues_only_unwritten_parts(view_db):
+    view_db.bad_users = {2}
+    writer = MovieViewWriter()
+    events = view_events(8)
+    fetch = view_db.fetch
+
+    async def fail_after_split(query, user_ids, *args):
+        # Bo'lingan birinchi yarmi yozilgach baza uziladi
+        if len(view_db.written) >= 3:
+            raise ConnectionResetError("reset")
+        return await fetch(query, user_ids, *args)
+
+    view_db.fetch = fail_after_split
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(writer._write_checked(events))
+
+    # 2 - buzuq, 1, 3, 4 yozildi; 5..8 navbatga qaytdi
+    assert [user_id for user_id, _ in view_db.written] == [1, 3, 4]
+    assert [user_id for user_id, _, _ in writer._buffer] == [5, 6, 7, 8]
+    assert writer.dead_lettered == 1
+
+
+def test_view_writer_reloads_spilled_events_in_utc(tmp_path):
+    path = tmp_path / "pending.jsonl"
+    naive = datetime(2024, 5, 1, 12, 0)
+    path.write_text(
+        json.dumps([1, 10, "2024-05-01T12:00:00+00:00"]) + "\n"
+        # Oldingi versiya vaqt zonasiz mahalliy vaqt yozgan
+        + json.dumps([2, 10, naive.isoformat()]) + "\n"
+    )
+    writer = MovieViewWriter(spill_path=str(path))
+
+    writer._load_spilled()
+
+    assert writer._buffer == [
+        (1, 10, datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)),
+        (2, 10, naive.astimezone(timezone.utc)),
+    ]
+    assert not path.exists()
@@ -0,0 +1,271 @@
+"""
+Yordamchi modullar (app/utils) testlari
+"""
+
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+)
+
+from app.database import cache as cache_module
+from app.utils import broadcast as broadcast_module
+from app.utils import rate_limiter
+from app.utils.broadcast import BLOCKED, FAILED, SENT, BroadcastEngine
+from app.utils.movie_manager import decode_page_callback, encode_page_callback
+from app.utils.rate_limiter import KeyedRateLimiter, TokenBucket
+
+
+@pytest.fixture
+def clock(fake_clock, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(monotonic=fake_clock.monotonic))
+    monkeypatch.setattr(rate_limiter, "asyncio", SimpleNamespace(sleep=fake_clock.sleep, Lock=asyncio.Lock))
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(monotonic=fake_clock.monotonic))
+    return fake_clock
+
+
+# ==================== TokenBucket ====================
+
+def test_token_bucket_allows_burst_then_limits(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert bucket.delay() == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_token_bucket_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(rate=10, capacity=2)
+    bucket.try_acquire()
+    bucket.try_acquire()
+
+    clock.now += 60
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+
+
+def test_token_bucket_acquire_waits_for_tokens(clock):
+    bucket = TokenBucket(rate=4, capacity=1)
+
+    async def scenario():
+        return [await bucket.acquire() for _ in range(3)]
+
+    waited = asyncio.run(scenario())
+    assert waited[0] == 0.0
+    assert waited[1:] == [pytest.approx(0.25), pytest.approx(0.25)]
+    assert clock.now == pytest.approx(1000.5)
+
+
+def test_token_bucket_pause_blocks_until_deadline(clock):
+    bucket = TokenBucket(rate=100, capacity=100)
+    bucket.pause(5)
+
+    assert not bucket.try_acquire()
+    assert bucket.delay() == pytest.approx(5)
+
+    # Qisqaroq pause oldingisini qisqartirmaydi
+    bucket.pause(1)
+    assert bucket.delay() == pytest.approx(5)
+
+    assert asyncio.run(bucket.acquire()) >= 5
+    assert clock.now >= 1005
+
+
+# ==================== KeyedRateLimiter ====================
+
+def test_keyed_limiter_buckets_are_independent(clock):
+    limiter = KeyedRateLimiter(rate=1, capacity=1)
+
+    assert limiter.bucket(1).try_acquire()
+    assert not limiter.bucket(1).try_acquire()
+    assert limiter.bucket(2).try_acquire()
+    assert len(limiter) == 2
+
+
+def test_keyed_limiter_pause_affects_only_its_key(clock):
+    limiter = KeyedRateLimiter(rate=10, capacity=5)
+    limiter.pause("a", 3)
+
+    assert limiter.bucket("a").delay() == pytest.approx(3)
+    assert limiter.bucket("b").delay() == 0.0
+
+
+def test_keyed_limiter_drops_idle_buckets(clock):
+    limiter = KeyedRateLimiter(rate=1, capacity=1, idle_ttl=60)
+    limiter.bucket("a").try_acquire()
+    first = limiter.bucket("a")
+
+    # Ishlatilib turgan bucket saqlanadi
+    clock.now += 50
+    assert limiter.bucket("a") is first
+
+    clock.now += 61
+    assert limiter.bucket("a") is not first
+    assert limiter.bucket("a").try_acquire()
+
+
+# ==================== Sahifa callback_data ====================
+
+def test_page_callback_without_cursor():
+    data = encode_page_callback("search", 3)
+
+    assert data == "page:search:3"
+    assert decode_page_callback(data) == ("search", 3, None, False)
+
+
+def test_page_callback_popular_cursor_roundtrip():
+    data = encode_page_callback("popular", 2, (1500, 42))
+
+    assert data == "page:popular:2:n:1500:42"
+    assert decode_page_callback(data) == ("popular", 2, (1500, 42), False)
+
+
+def test_page_callback_recent_cursor_keeps_microseconds():
+    created_at = datetime(2024, 5, 17, 13, 45, 12, 123456)
+    data = encode_page_callback("recent", 4, (created_at, 7), before=True)
+
+    assert data.startswith("page:recent:4:p:")
+    assert decode_page_callback(data) == ("recent", 4, (created_at, 7), True)
+
+
+def test_page_callback_fits_telegram_limit():
+    # Telegram callback_data 64 baytdan oshmasligi kerak
+    data = encode_page_callback("recent", 99999, (datetime(2099, 12, 31, 23, 59, 59, 999999), 2 ** 31 - 1))
+
+    assert len(data.encode()) <= 64
+
+
+# ==================== BroadcastEngine ====================
+
+class FakeBroadcastBot:
+    """copy_message: errors dagi tg_id lar uchun xato, qolganlari yuboriladi"""
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = []
+
+    async def copy_message(self, chat_id, from_chat_id, message_id):
+        error = self.errors.get(chat_id)
+        if isinstance(error, list):
+            error = error.pop(0) if error else None
+        if error is not None:
+            raise error
+        self.sent.append(chat_id)
+
+
+class FakeBroadcastDb:
+    """broadcast_jobs qatori va users jadvali xotirada"""
+
+    def __init__(self, user_count: int, token: str = "me"):
+        self.users = [{"id": user_id, "tg_id": 1000 + user_id} for user_id in range(1, user_count + 1)]
+        self.job = {
+            "id": 1, "from_chat_id": 5, "message_id": 7, "target": "all", "status": "running",
+            "last_user_id": 0, "sent": 0, "failed": 0, "blocked": 0, "claimed_by": token
+        }
+        self.marked_blocked = []
+        self.on_progress = None
+
+    async def fetch(self, query, last_user_id, limit):
+        return [user for user in self.users if user["id"] > last_user_id][:limit]
+
+    async def fetchrow(self, query, *args):
+        job = self.job
+        if query == BroadcastEngine.PROGRESS_QUERY:
+            _, last_user_id, sent, failed, blocked, token = args
+            if token != job["claimed_by"]:
+                return None
+            job.update(last_user_id=last_user_id, sent=job["sent"] + sent,
+                       failed=job["failed"] + failed, blocked=job["blocked"] + blocked)
+            row = dict(job)
+            if self.on_progress:
+                self.on_progress(job)
+            return row
+        elif query in (BroadcastEngine.FINISH_QUERY, BroadcastEngine.HEARTBEAT_QUERY):
+            if args[1] != job["claimed_by"] or job["status"] != "running":
+                return None
+            if query == BroadcastEngine.FINISH_QUERY:
+                job["status"] = "completed"
+        return dict(job)
+
+    async def execute(self, query, user_ids):
+        self.marked_blocked += user_ids
+
+
+def make_engine(db, monkeypatch, batch_size: int = 3) -> BroadcastEngine:
+    monkeypatch.setattr(broadcast_module, "get_db_connection", lambda: db)
+    engine = BroadcastEngine(rate=1_000_000, batch_size=batch_size, progress_interval=3600)
+    engine.bucket.pause = lambda seconds: None
+    return engine
+
+
+def test_broadcast_classifies_delivery_outcomes(monkeypatch):
+    db = FakeBroadcastDb(user_count=6)
+    bot = FakeBroadcastBot({
+        1002: TelegramForbiddenError(None, "Forbidden: bot was blocked by the user"),
+        1003: TelegramBadRequest(None, "Bad Request: chat not found"),
+        1004: TelegramBadRequest(None, "Bad Request: message to copy not found"),
+        1005: TelegramNetworkError(None, "timeout"),
+        1006: [TelegramRetryAfter(None, "Too Many Requests", retry_after=1)],
+    })
+    engine = make_engine(db, monkeypatch)
+    job = dict(db.job)
+
+    assert asyncio.run(engine._send_all(bot, job))
+
+    assert bot.sent == [1001, 1006]
+    assert sorted(db.marked_blocked) == [2, 3]
+    assert (job["status"], job["sent"], job["blocked"], job["failed"]) == ("completed", 2, 2, 2)
+    assert engine.retry_after_count == 1
+
+
+def test_broadcast_send_batch_turns_unexpected_errors_into_failed(monkeypatch):
+    engine = make_engine(FakeBroadcastDb(user_count=0), monkeypatch)
+    bot = FakeBroadcastBot({1002: RuntimeError("boom")})
+    users = [{"id": 1, "tg_id": 1001}, {"id": 2, "tg_id": 1002}]
+
+    outcome = asyncio.run(engine.send_batch(bot, {"from_chat_id": 5, "message_id": 7}, users))
+
+    assert outcome == {SENT: [1], FAILED: [2], BLOCKED: []}
+
+
+def test_broadcast_stops_when_job_is_claimed_elsewhere(monkeypatch):
+    db = FakeBroadcastDb(user_count=9)
+    # Birinchi paketdan keyin vazifani boshqa jarayon egallaydi
+    db.on_progress = lambda job: job.update(claimed_by="other")
+    bot = FakeBroadcastBot()
+    engine = make_engine(db, monkeypatch)
+    job = dict(db.job)
+
+    assert not asyncio.run(engine._send_all(bot, job))
+
+    # Ikkinchi paket yuborildi, lekin hisobi yangi egasiga tegishli emas - u 3 dan davom etadi
+    assert bot.sent == [1001, 1002, 1003, 1004, 1005, 1006]
+    assert db.job["last_user_id"] == 3
+    assert db.job["status"] == "running"
+
+
+def test_broadcast_heartbeat_cancels_sender_on_lost_ownership(monkeypatch):
+    db = FakeBroadcastDb(user_count=0)
+    engine = make_engine(db, monkeypatch)
+    engine.heartbeat_interval = 0
+
+    async def scenario():
+        sender = asyncio.create_task(asyncio.sleep(3600))
+        heartbeat = asyncio.create_task(engine._heartbeat(dict(db.job), sender))
+        await asyncio.sleep(0.01)
+        assert not sender.done()
+
+        db.job["claimed_by"] = "other"
+        await asyncio.wait_for(heartbeat, timeout=1)
+        with pytest.raises(asyncio.CancelledError):
+            await sender
+
+    asyncio.run(scenario())